@@ -0,0 +1,357 @@
+"""KRIS - Indice delle applicazioni installate per "apri ...".
+
+Invece di una lista fissa di eseguibili Windows, l'indice raccoglie le
+applicazioni del sistema:
+- i collegamenti del menu Start (.lnk, .url) su Windows
+- i file .desktop (XDG_DATA_HOME, XDG_DATA_DIRS) su Linux
+- gli eseguibili nelle cartelle del PATH
+
+L'indice è salvato in logs/app_indice.json, una voce per cartella con la sua
+data di modifica. L'aggiornamento fa solo uno stat per cartella e rilegge le
+cartelle cambiate (un programma installato o tolto cambia la data della
+cartella; un .desktop modificato sul posto no, finché non si tocca la cartella).
+
+La ricerca è senza accenti e tollera errori di trascrizione ("calcolatrise",
+"tunderbird") sulle voci del menu e sui .desktop; i nomi detti in italiano
+("blocco note", "esplora file") passano dagli alias. Gli eseguibili del PATH
+(dove ci sono anche reboot, logoff, rm...) si aprono solo se il nome detto è un
+alias o la destinazione di un alias (ALIAS e config "app_alias"), e solo se il
+nome coincide esattamente. Il programma è lanciato staccato: chi chiama non
+aspetta che si chiuda.
+
+    python kris_app.py "blocco note" [--indice file.json] [--apri]
+    python kris_app.py "calcolatrice" --desktop prove/applications --path prove/bin    # cartelle di prova
+"""
+import os
+import sys
+import json
+import time
+import shlex
+import threading
+import subprocess
+
+from kris_testo import parole, distanza
+
+INDICE_DEFAULT = "logs/app_indice.json"
+INTERVALLO_CONTROLLO = 60.0   # secondi tra due controlli delle cartelle durante l'uso
+SOGLIA = 0.5
+
+# Nomi detti -> nome dell'applicazione da cercare (più config "app_alias" e "browser")
+ALIAS = {
+    "blocco note": "notepad",
+    "calcolatrice": "calc",
+    "esplora file": "explorer",
+    "cartella": "explorer",
+    "prompt": "cmd",
+    "prompt dei comandi": "cmd",
+}
+
+# Codici di campo di Exec nei .desktop (file, url, icona...): tolti all'avvio senza argomenti
+CODICI_EXEC = {"%f", "%F", "%u", "%U", "%d", "%D", "%n", "%N", "%i", "%c", "%k", "%v", "%m"}
+
+def sorgenti_sistema():
+    """[(tipo, cartella, ricorsiva)] delle cartelle di applicazioni di questo sistema"""
+    sorgenti = []
+    if os.name == "nt":
+        for variabile in ("APPDATA", "PROGRAMDATA"):
+            base = os.environ.get(variabile)
+            if base:
+                sorgenti.append(("menu", os.path.join(base, "Microsoft", "Windows", "Start Menu", "Programs"), True))
+    else:
+        dati_utente = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+        dati = os.environ.get("XDG_DATA_DIRS") or "/usr/local/share:/usr/share"
+        for base in [dati_utente] + dati.split(":"):
+            if base:
+                sorgenti.append(("desktop", os.path.join(base, "applications"), True))
+    for cartella in os.environ.get("PATH", "").split(os.pathsep):
+        if cartella:
+            sorgenti.append(("eseguibili", cartella, False))
+    return sorgenti
+
+# --- LETTURA DELLE CARTELLE ---
+def _leggi_desktop(path, lingua="it"):
+    """Voce di un file .desktop, None se non è un'applicazione da mostrare"""
+    valori = {}
+    sezione = None
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            for riga in f:
+                riga = riga.strip()
+                if riga.startswith("["):
+                    sezione = riga
+                elif sezione == "[Desktop Entry]" and "=" in riga:
+                    chiave, valore = riga.split("=", 1)
+                    valori.setdefault(chiave.strip(), valore.strip())
+    except OSError:
+        return None
+    if valori.get("Type") != "Application" or valori.get("NoDisplay") == "true" or \
+            valori.get("Hidden") == "true" or not valori.get("Exec"):
+        return None
+    try:
+        comando = [a.replace("%%", "%") for a in shlex.split(valori["Exec"]) if a not in CODICI_EXEC]
+    except ValueError:
+        return None
+    nome = valori.get(f"Name[{lingua}]") or valori.get("Name") or os.path.basename(path)[:-8]
+    nomi = [nome, valori.get("Name", ""), valori.get(f"GenericName[{lingua}]", ""), valori.get("GenericName", ""),
+            os.path.basename(path)[:-8].split(".")[-1]]
+    nomi += valori.get(f"Keywords[{lingua}]", "").split(";")
+    return {"nome": nome, "chiavi": _chiavi(nomi), "tipo": "desktop", "avvio": comando}
+
+def _chiavi(nomi):
+    """Nomi normalizzati senza doppioni, nell'ordine dato"""
+    chiavi = []
+    for n in nomi:
+        n = " ".join(parole(n))
+        if n and n not in chiavi:
+            chiavi.append(n)
+    return chiavi
+
+def _leggi_voce(tipo, voce):
+    """Voce dell'indice per un file di una cartella sorgente (None se non è un'applicazione)"""
+    nome, estensione = os.path.splitext(voce.name)
+    estensione = estensione.lower()
+    if tipo == "desktop":
+        return _leggi_desktop(voce.path) if estensione == ".desktop" else None
+    if tipo == "menu":
+        if estensione not in (".lnk", ".url", ".appref-ms") or "uninstall" in nome.lower() or "disinstalla" in nome.lower():
+            return None
+        return {"nome": nome, "chiavi": _chiavi([nome]), "tipo": "file", "avvio": voce.path}
+    # Eseguibili del PATH (su Linux il nome resta intero: "python3.12")
+    if os.name == "nt":
+        if estensione not in os.environ.get("PATHEXT", ".COM;.EXE;.BAT;.CMD").lower().split(";"):
+            return None
+    elif os.access(voce.path, os.X_OK):
+        nome = voce.name
+    else:
+        return None
+    return {"nome": nome, "chiavi": _chiavi([nome]), "tipo": "eseguibile", "avvio": [voce.path]}
+
+def _leggi_cartella(tipo, cartella):
+    """(applicazioni, sottocartelle) di una cartella"""
+    app, sotto = [], []
+    with os.scandir(cartella) as voci:
+        for voce in voci:
+            try:
+                if voce.is_dir():
+                    sotto.append(voce.name)
+                elif voce.is_file():
+                    trovata = _leggi_voce(tipo, voce)
+                    if trovata is not None:
+                        app.append(trovata)
+            except OSError:
+                continue
+    return app, sotto
+
+# --- INDICE ---
+class IndiceApp:
+    VERSIONE = 1
+
+    def __init__(self, path=INDICE_DEFAULT, sorgenti=None, alias=None):
+        """`sorgenti`: [(tipo, cartella, ricorsiva)] con tipo "desktop", "menu" o "eseguibili"
+        (default: quelle del sistema)"""
+        self.path = path
+        self.sorgenti = sorgenti if sorgenti is not None else sorgenti_sistema()
+        self.alias = {}
+        self.imposta_alias(alias or {})
+        self.cartelle = {}     # cartella -> {"tipo", "mtime", "app", "sotto"}
+        self.app = []          # [(voce, priorità della sorgente)] nell'ordine delle sorgenti
+        self.pronto = threading.Event()
+        self.ultimo_controllo = 0.0
+        self._lock = threading.Lock()
+        self._carica()
+
+    def imposta_alias(self, alias):
+        self.alias = {" ".join(parole(k)): v for k, v in {**ALIAS, **alias}.items()}
+        # Eseguibili del PATH ammessi: solo quelli nominati da un alias
+        self.eseguibili = {" ".join(parole(v)) for v in self.alias.values()}
+
+    def avvia(self):
+        """Primo aggiornamento in background (all'avvio dell'assistente)"""
+        threading.Thread(target=self.aggiorna, daemon=True).start()
+        return self
+
+    def aggiorna(self):
+        """Riallinea l'indice alle cartelle: uno stat per cartella, rilette solo quelle cambiate.
+        Ritorna il numero di cartelle rilette."""
+        with self._lock:
+            try:
+                rilette = 0
+                viste = {}
+                for tipo, radice, ricorsiva in self.sorgenti:
+                    da_vedere = [radice]
+                    while da_vedere:
+                        cartella = da_vedere.pop()
+                        if cartella in viste:
+                            continue
+                        try:
+                            mtime = os.stat(cartella).st_mtime
+                        except OSError:
+                            continue
+                        voce = self.cartelle.get(cartella)
+                        if voce is None or voce["mtime"] != mtime or voce["tipo"] != tipo:
+                            try:
+                                app, sotto = _leggi_cartella(tipo, cartella)
+                            except OSError:
+                                continue
+                            voce = {"tipo": tipo, "mtime": mtime, "app": app, "sotto": sotto}
+                            rilette += 1
+                        viste[cartella] = voce
+                        if ricorsiva:
+                            da_vedere += [os.path.join(cartella, s) for s in voce["sotto"]]
+                cambiato = rilette or set(viste) != set(self.cartelle)
+                self.cartelle = viste
+                self.app = _elenco(viste)
+                self.ultimo_controllo = time.monotonic()
+                if cambiato:
+                    self._salva()
+                return rilette
+            finally:
+                self.pronto.set()
+
+    # --- RICERCA ---
+    def trova(self, nome, n=3):
+        """[(punteggio, voce)] delle applicazioni più simili a `nome`, migliori prima"""
+        chiave = " ".join(parole(nome))
+        if not chiave:
+            return []
+        risultati = self._cerca(chiave, chiave in self.eseguibili)
+        alias = self.alias.get(chiave)
+        if alias is not None and (not risultati or risultati[0][0] < 1.0):
+            risultati = self._cerca(" ".join(parole(alias)), True) + risultati
+        visti, unici = set(), []
+        for punteggio, app in sorted(risultati, key=lambda x: -x[0]):
+            if id(app) not in visti:
+                visti.add(id(app))
+                unici.append((punteggio, app))
+        return unici[:n]
+
+    def _cerca(self, chiave, eseguibili=False):
+        """`eseguibili`: ammette gli eseguibili del PATH, col nome esatto"""
+        token = chiave.split()
+        risultati = []
+        for app, priorita in self.app:
+            if app["tipo"] == "eseguibile":
+                migliore = 1.0 if eseguibili and chiave in app["chiavi"] else 0.0
+            else:
+                migliore = max(_somiglianza(chiave, token, k) for k in app["chiavi"]) if app["chiavi"] else 0.0
+            if migliore >= SOGLIA:
+                # A parità di nome vince il menu o il .desktop sull'eseguibile nudo del PATH
+                risultati.append((round(migliore - 0.01 * priorita, 3), app))
+        return risultati
+
+    def apri(self, nome):
+        """Lancia l'applicazione più simile a `nome` senza aspettarla -> frase per l'utente"""
+        self.pronto.wait(timeout=10)
+        if time.monotonic() - self.ultimo_controllo > INTERVALLO_CONTROLLO:
+            self.aggiorna()
+        trovate = self.trova(nome, 1)
+        if not trovate and time.monotonic() - self.ultimo_controllo > 1.0:
+            self.aggiorna()  # forse appena installata
+            trovate = self.trova(nome, 1)
+        if not trovate:
+            return "Applicazione non riconosciuta."
+        app = trovate[0][1]
+        try:
+            lancia(app)
+        except OSError as e:
+            return f"[Errore avvio {app['nome']}: {e}]"
+        return f"Apro {app['nome']}."
+
+    # --- FILE DELL'INDICE ---
+    def _carica(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                dati = json.load(f)
+        except (OSError, ValueError):
+            return
+        if dati.get("versione") != self.VERSIONE:
+            return
+        self.cartelle = dati.get("cartelle", {})
+        self.app = _elenco(self.cartelle)
+        if self.app:
+            self.pronto.set()  # l'indice su disco basta per rispondere, l'aggiornamento arriva dopo
+
+    def _salva(self):
+        tmp = self.path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"versione": self.VERSIONE, "cartelle": self.cartelle}, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print("Errore salvataggio indice applicazioni:", e)
+
+def _elenco(cartelle):
+    """[(voce, priorità)] da cercare; un eseguibile presente in più cartelle del PATH conta solo
+    la prima volta, come per la shell"""
+    elenco, eseguibili = [], set()
+    for v in cartelle.values():
+        for app in v["app"]:
+            if v["tipo"] == "eseguibili":
+                if app["nome"] in eseguibili:
+                    continue
+                eseguibili.add(app["nome"])
+            elenco.append((app, 1 if v["tipo"] == "eseguibili" else 0))
+    return elenco
+
+def _somiglianza(chiave, token, nome):
+    """1.0 nome identico, 0.9 il nome inizia con la richiesta, fino a 0.8 se ogni parola detta
+    corrisponde (anche con uno o due errori) a una parola del nome"""
+    if nome == chiave:
+        return 1.0
+    if nome.startswith(chiave + " "):
+        return 0.9
+    parole_nome = nome.split()
+    errori = 0
+    for t in token:
+        massimo = 0 if len(t) <= 3 else 1 if len(t) <= 6 else 2
+        migliore = min((distanza(t, p, massimo) for p in parole_nome), default=massimo + 1)
+        if migliore > massimo:
+            return 0.0
+        errori += migliore
+    # Parole del nome non dette ("mozilla thunderbird" per "thunderbird") pesano poco
+    mancanti = max(0, len(parole_nome) - len(token))
+    return max(0.0, 0.8 - 0.1 * errori - 0.05 * mancanti)
+
+def lancia(app):
+    """Avvia l'applicazione staccata dal processo di KRIS"""
+    if app["tipo"] == "file":
+        os.startfile(app["avvio"])  # collegamento del menu Start: lo risolve Windows
+        return
+    opzioni = {"stdin": subprocess.DEVNULL, "stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL}
+    if os.name == "nt":
+        opzioni["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        opzioni["start_new_session"] = True
+    processo = subprocess.Popen(app["avvio"], **opzioni)
+    # Chi raccoglie il processo alla chiusura (niente zombie), senza far aspettare il comando
+    threading.Thread(target=processo.wait, daemon=True).start()
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    sorgenti = []
+    for opzione, tipo, ricorsiva in (("--desktop", "desktop", True), ("--menu", "menu", True), ("--path", "eseguibili", False)):
+        while opzione in args:
+            i = args.index(opzione)
+            sorgenti.append((tipo, args[i + 1], ricorsiva))
+            del args[i:i + 2]
+    path = INDICE_DEFAULT
+    if "--indice" in args:
+        i = args.index("--indice")
+        path = args[i + 1]
+        del args[i:i + 2]
+    apri = "--apri" in args
+    args = [a for a in args if a != "--apri"]
+    indice = IndiceApp(path, sorgenti or None)
+    t0 = time.perf_counter()
+    rilette = indice.aggiorna()
+    t_aggiorna = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    risultati = indice.trova(" ".join(args), 5)
+    t_cerca = time.perf_counter() - t0
+    print(f"{len(indice.app)} applicazioni, {rilette}/{len(indice.cartelle)} cartelle rilette "
+          f"in {t_aggiorna * 1000:.1f} ms, ricerca in {t_cerca * 1000:.1f} ms")
+    for punteggio, app in risultati:
+        print(f"{punteggio:5.2f}  {app['nome']}  ({app['tipo']}: {app['avvio']})")
+    if apri:
+        print(indice.apri(" ".join(args)))
@@ -1,29 +1,32 @@
+import time
+T_AVVIO = time.perf_counter()  # riferimento per --tempo-avvio
 import tkinter as tk
-from tkinter import messagebox, filedialog
+from tkinter import messagebox
 import os
 import json
 import threading
-import time
 import random
-from datetime import datetime
-import pyttsx3
-import whisper
-import torch
-import subprocess
 import sys
-import sounddevice as sd
-import pyaudio
-import wave
-import tempfile
-import queue
-import numpy as np
-import scipy.io.wavfile
-import pyautogui
+import atexit
+import kris_voce
+import kris_log
+import kris_motore
+import kris_risorse
+import kris_metriche
+import kris_config
+import kris_ui
+import kris_pipeline
+# whisper/torch e sounddevice sono importati solo quando servono (avvio rapido)
 
 # === CONFIGURAZIONE GLOBALE ===
 CONFIG_FILE = "config.json"
 NOTE_DIR = "note"
-LOG_FILE = "logs/kris_log.txt"
+LOG_FILE = "logs/kris_log.jsonl"
+METRICHE_FILE = "logs/metriche.json"
+ATTESA_VOCE_S = 10  # al massimo, prima di aprire il microfono mentre la voce parla
+
+# Tempi per fase (microfono, modello, comando, voce...), salvati in METRICHE_FILE all'uscita
+metriche = kris_metriche.Metriche()
 
 # Saluti personalizzati KIT
 SALUTI_KIT = [
@@ -43,7 +46,7 @@ def gestisci_errore(messaggio, livello="warning"):
     """Sistema errori: prima vocale, poi popup se fallisce"""
     try:
         # Tentativo notifica vocale
-        speak(f"Attenzione Kris: {messaggio}")
+        speak(f"Attenzione Kris: {messaggio}", kris_voce.PRIORITA_ERRORE)
     except Exception as e:
         # Fallback popup se sintesi vocale fallisce
         messagebox.showerror("KIT - Errore", f"{messaggio}\n\nErrore vocale: {str(e)}")
@@ -51,7 +54,7 @@ def gestisci_errore(messaggio, livello="warning"):
 def gestisci_avviso(messaggio):
     """Avvisi meno critici"""
     try:
-        speak(f"KIT informa: {messaggio}")
+        speak(f"KIT informa: {messaggio}", kris_voce.PRIORITA_ERRORE)
     except:
         messagebox.showinfo("KIT - Avviso", messaggio)
         
@@ -64,65 +67,25 @@ def gestisci_avviso(messaggio):
  #   "note_dir": NOTE_DIR}
  
  
-# === CONFIGURAZIONE ===
-default_config = {
-    "voice_settings": {
-        "voice_index": 0,
-        "rate": 150,
-        "volume": 1.0
-    },
-    "response_timing": {
-        "listen_timeout": 5,
-        "processing_delay": 0.5,
-        "voice_pause": 1.0
-    },
-    "whisper_model": "base",
-    "language": "it",
-    "directories": {
-        "notes_dir": NOTE_DIR
-    },
-    "blacklist_commands": [
-        "elimina sistema",
-        "formatta disco",
-        "shutdown"
-    ]
-}
-
+# === CONFIGURAZIONE (schema unico, migrazione dal formato vecchio e validazione: kris_config.py) ===
 def load_config():
-    if os.path.exists(CONFIG_FILE):
-        try:
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                loaded = json.load(f)
-                # Merge con default per nuovi campi
-                config = default_config.copy()
-                config.update(loaded)
-                return config
-        except:
-            return default_config.copy()
-    return default_config.copy()
-
-def save_config(config):
     try:
-        with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        gestisci_errore(f"Errore salvataggio configurazione: {str(e)}")
-
-config = load_config()
-
-# --- CARICAMENTO/CREAZIONE CONFIGURAZIONE ---
-def load_config():
-    if not os.path.exists(CONFIG_FILE):
-        save_config(default_config)
-        return default_config.copy()
-    with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+        config, avvisi = kris_config.carica(CONFIG_FILE)
+    except (OSError, ValueError) as e:
+        print(f"config.json illeggibile ({e}): uso i valori predefiniti")
+        return kris_config.predefinita()
+    for avviso in avvisi:
+        print("Config:", avviso)
+    return config
 
 def save_config(cfg):
-    with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-        json.dump(cfg, f, indent=2)
+    try:
+        kris_config.salva(CONFIG_FILE, cfg)
+    except Exception as e:
+        gestisci_errore(f"Errore salvataggio configurazione: {str(e)}")
 
-config = load_config()
+with metriche.fase("config"):
+    config = load_config()
 
 # --- CREA CARTELLA NOTE ---
 if not os.path.exists(config["note_dir"]):
@@ -130,119 +93,78 @@ if not os.path.exists(config["note_dir"]):
 if not os.path.exists("logs"):
     os.makedirs("logs")
 
-# --- INIZIALIZZA SINTESI VOCALE ---
-engine = pyttsx3.init()
-voices = engine.getProperty('voices')
-if config["voice"]:
-    engine.setProperty('voice', config["voice"])
-else:
-    # Seleziona voce italiana se disponibile
-    for v in voices:
-        if 'it' in v.id or 'italian' in v.name.lower():
-            engine.setProperty('voice', v.id)
-            found_voice = True
-            break
-    if not found_voice:
-        print("⚠️ Nessuna voce italiana trovata. Verrà usata la voce predefinita.")
-engine.setProperty('rate', config["rate"])
-engine.setProperty('volume', config["volume"])
-
-lock = threading.Lock()
-current_text = ""
-reading_emails = True
-last_command = ""
+# --- INIZIALIZZA SINTESI VOCALE (un solo worker possiede il motore pyttsx3) ---
+voce = kris_voce.VoceWorker(kris_voce.SinkPyttsx3(config.get("voice"), config.get("rate", 150), config.get("volume", 1.0)),
+                            kris_voce.CacheFrasi(config.get("cache_voce", "cache_voce")), metriche)
+
+# Risposte fisse: sintetizzate una volta in background, poi riprodotte dalla cache
+FRASI_FISSE = SALUTI_KIT + [
+    "Dimmi Kris", "Testo aggiunto.", "[Comando non riconosciuto]", "[Nessun comando rilevato]",
+    "[Comando bloccato]", "Nessun testo da salvare.", "Nessun testo da leggere.",
+    "[Sintesi vocale avviata]", "Lettura email disattivata.", "Arrivederci!", "[Nessun testo dettato]",
+    "Niente da annullare.", "Applicazione non riconosciuta.", "Sto cercando...", "Cosa cerco?"
+]
 
 # --- PARLA ---
-def speak(text):
-    def _speak():
-        engine.say(text)
-        engine.runAndWait()
-    threading.Thread(target=_speak, daemon=True).start()
-
-# --- INIZIALIZZA WHISPER (modello base) ---
-try:
-    model = whisper.load_model("base")
-except Exception as e:
-    print("Errore nel caricamento di Whisper:", e)
-    sys.exit(1)
-
-# --- FUNZIONI DI COMANDO e trascrizione audio---
-current_text = ""
-reading_emails = True
-
-def trascrivi_audio():
-    import sounddevice as sd
-    import numpy as np
-    samplerate = 16000
-    duration = 5  # secondi di ascolto per comando
-    try:
-        speak("Dimmi Kris")
-        audio = sd.rec(int(samplerate * duration), samplerate=samplerate, channels=1, dtype='float32')
-        sd.wait()
-        audio = np.squeeze(audio)
-        audio_path = "temp.wav"
-        import scipy.io.wavfile
-        scipy.io.wavfile.write(audio_path, samplerate, audio)
-        result = model.transcribe(audio_path, language='it')
-        os.remove(audio_path)
-        return result["text"]
-    except Exception as e:
-        return f"[Errore acquisizione audio: {e}]"
-
-# --- SALVA NOTA ---
-def salva_nota(text):
-    fname = time.strftime("%Y%m%d_%H%M%S.txt")
-    fpath = os.path.join(config["note_dir"], fname)
-    with open(fpath, "w", encoding="utf-8") as f:
-        f.write(text)
-    return fpath
-    
-# --- APRI APP ---
-def apri_app(nome):
-    nome = nome.lower()
-    if "notepad" in nome or "blocco" in nome:
-        subprocess.Popen(["notepad.exe"])
-        return "Blocco note aperto."
-    elif "calcolatrice" in nome:
-        subprocess.Popen(["calc.exe"])
-        return "Calcolatrice aperta."
-    elif "word" in nome:
-        subprocess.Popen(["winword.exe"])
-        return "Microsoft Word aperto."
-    elif "brave" in nome:
-        subprocess.Popen(["C:\\Program Files\\BraveSoftware\\Brave-Browser\\Application\\brave.exe"])
-        return "Brave avviato."
-    elif text.startswith("kit cerca"):
-        query = text.split("kit cerca", 1)[-1].strip()
-        url = f"https://duckduckgo.com/?q={query.replace(' ', '+')}"
-        subprocess.Popen(["C:\\Program Files\\BraveSoftware\\Brave-Browser\\Application\\brave.exe", url])
-    return f"Sto cercando: {query}"
-
-    elif "thunderbird" in nome:
-        subprocess.Popen(["C:\\Program Files\\Mozilla Thunderbird\\thunderbird.exe"])
-        return "Thunderbird avviato."
-    elif "excel" in nome:
-        subprocess.Popen(["excel.exe"])
-        return "Microsoft Excel aperto."
-    elif "explorer" in nome or "cartella" in nome:
-        subprocess.Popen(["explorer.exe"])
-        return "Esplora file aperto."
-    elif "prompt" in nome or "cmd" in nome:
-        subprocess.Popen(["cmd.exe"])
-        return "Prompt dei comandi aperto."
-    elif "browser" in nome:
-        subprocess.Popen(["start", "https://duckduckgo.com/"], shell=True)
-        return "Browser."
-
-    else:
-        return "Applicazione non riconosciuta."
-        
-# --- LOG ---
-def log_command(cmd):
-    with open(LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(f"[{time.strftime('%H:%M:%S')}] {cmd}\n")
+def speak(text, priorita=kris_voce.PRIORITA_CONFERMA, interrompi=False):
+    """Accoda il testo al worker vocale: errori prima delle conferme, conferme prima delle letture"""
+    voce.parla(text, priorita, interrompi)
+
+# --- LOG (JSONL, scritto in background con rotazione; consultabile con kris_log.py) ---
+eventi = kris_log.crea_registro({"log_file": LOG_FILE, **config})
+
+def log_command(cmd, intento=None, latenze=None, esito=None):
+    eventi.registra(testo=cmd, intento=intento, latenze=latenze or {}, esito=esito)
+
+# --- MOTORE (modello Whisper, comandi, note e stato della sessione: kris_motore.py) ---
+# Con "motore_remoto" in config (es. "http://127.0.0.1:8765") la GUI è solo un client di
+# kris_daemon.py: il modello resta caricato nel demone invece di ricaricarsi a ogni avvio.
+MOTORE_REMOTO = bool(config.get("motore_remoto"))
+if MOTORE_REMOTO:
+    import kris_daemon
+    motore = kris_daemon.ClienteKris(config["motore_remoto"], config.get("daemon_token"))
+else:
+    motore = kris_motore.MotoreKris(config, parla=speak, metriche=metriche)
+
+# --- PIPELINE DEI COMANDI VOCALI: cattura -> trascrizione -> comando -> voce (kris_pipeline.py) ---
+# Un solo lettore del microfono e una sola decodifica alla volta; "Parla" mentre è occupata
+# annulla, accoda o unisce secondo config["pipeline_politica"]
+def interrompi_voce():
+    # Barge-in: ferma anche la risposta che il motore sta ancora generando
+    voce.interrompi()
+    if not MOTORE_REMOTO:
+        motore.interrompi_risposta()
+
+# "Dimmi Kris" detto all'inizio dell'ascolto finisce prima che si apra il microfono
+pipeline = kris_pipeline.PipelineKris(motore, config, metriche, interrompi_voce=interrompi_voce,
+                                      attendi_voce=lambda annulla: voce.attendi_silenzio(ATTESA_VOCE_S, annulla))
+
+# --- MEMORIA DA INATTIVO: Whisper, risposte e TTS rilasciati dopo "inattivita_minuti" (kris_risorse.py) ---
+risorse = kris_risorse.GestoreRisorse(config, metriche)
+risorse.registra("voce", lambda: voce.ultimo_uso, voce.rilascia)
+if not MOTORE_REMOTO:
+    risorse.registra("whisper", lambda: motore.ultimo_uso, motore.rilascia_modello)
+    risorse.registra("risposte", lambda: motore.risposte.ultimo_uso, motore.risposte.rilascia)
+
+# --- RICARICA A CALDO: config.json modificato dal pannello, da un editor o da un altro processo ---
+def applica_config(nuova, cambiate):
+    """Voce, blacklist, comandi e note cambiano subito; un altro modello Whisper si carica in background"""
+    config.update(nuova)
+    if cambiate & {"voice", "rate", "volume"}:
+        voce.imposta(config["voice"], config["rate"], config["volume"])
+    motore.aggiorna_config(config)
+    risorse.imposta_config(config)
+    riavvio = cambiate & kris_config.RICHIEDONO_RIAVVIO
+    if riavvio:
+        print("Config: effetto al prossimo avvio per", ", ".join(sorted(riavvio)))
+
+osservatore = kris_config.OsservatoreConfig(CONFIG_FILE, dict(config), applica_config)
 
 # --- INTERFACCIA GRAFICA STILE KITT ---
+LED_PRONTO = "#39ff14"
+LED_CARICAMENTO = "#ffbf00"
+LED_ERRORE = "#ff3131"
+
 class KITTUI(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -255,92 +177,167 @@ class KITTUI(tk.Tk):
         self.display.pack(fill="both", padx=10, pady=10)
         self.display.insert("end", ">>> KRIS ASSISTANT ALPHA <<<\n")
         self.display.configure(state="disabled")
+        self.trascritto = kris_ui.Trascritto(self.display, config.get("display_max_righe", kris_ui.MAX_RIGHE))
         # Barra "in ascolto" LED
         self.led_canvas = tk.Canvas(self, width=400, height=30, bg="#111", highlightthickness=0)
         self.led_canvas.pack(pady=5)
         self.leds = [self.led_canvas.create_oval(10+40*i,5,40+40*i,25,fill="#222",outline="#39ff14",width=2) for i in range(10)]
+        self.barra_led = kris_ui.BarraLED(self.led_canvas, self.leds)
         # Pulsanti
         btn_frame = tk.Frame(self, bg="#111")
         btn_frame.pack()
         tk.Button(btn_frame, text="Parla", font=("Consolas", 12), command=self.comando_vocale).pack(side="left", padx=7)
+        tk.Button(btn_frame, text="Detta", font=("Consolas", 12), command=self.dettatura).pack(side="left", padx=7)
         tk.Button(btn_frame, text="Leggi tutto", font=("Consolas", 12), command=self.leggi_tutto).pack(side="left", padx=7)
         tk.Button(btn_frame, text="Salva nota", font=("Consolas", 12), command=self.salva_nota).pack(side="left", padx=7)
         tk.Button(btn_frame, text="Config", font=("Consolas", 12), command=self.apri_config).pack(side="left", padx=7)
         tk.Button(btn_frame, text="Esci", font=("Consolas", 12), command=self.destroy).pack(side="left", padx=7)
-        self.after(100, self.anim_led)
-        self.anim_idx = 0
-
-    def anim_led(self):
-        for i, led in enumerate(self.leds):
-            color = "#39ff14" if i == self.anim_idx else "#222"
-            self.led_canvas.itemconfig(led, fill=color)
-        self.anim_idx = (self.anim_idx + 1) % len(self.leds)
-        self.after(120, self.anim_led)
-
-    def comando_vocale(self):
-        self.display.configure(state="normal")
-        self.display.insert("end", "\n[KRIS] In ascolto...\n")
-        self.display.see("end")
-        self.display.configure(state="disabled")
-        threading.Thread(target=self._process_comando, daemon=True).start()
+        # I thread di lavoro non toccano i widget: mandano eventi che il loop di Tk applica a lotti
+        self.fase = None          # "ascolto" / "trascrizione" mentre un comando è in corso
+        self.parlando = False
+        self.modello_ok = None    # None finché il modello non è pronto
+        self.eventi_ui = kris_ui.CodaUI(self, {
+            "riga": self.mostra,
+            "provvisoria": self.trascritto.provvisoria,
+            "fase": self.imposta_fase,
+            "voce": self.imposta_voce,
+            "modello": self.modello_pronto,
+            "avviso": lambda testo: messagebox.showinfo("KRIS", testo),
+            "esci": self.quit
+        }).avvia()
+        voce.al_cambio_voce = lambda parlando: self.eventi_ui.posta("voce", parlando)
+        if not MOTORE_REMOTO:
+            motore.al_risposta = lambda frase: self.eventi_ui.posta("riga", frase)
+        risorse.al_rilascio = lambda nomi, prima, dopo: self.eventi_ui.posta(
+            "riga", f"[KRIS] Inattivo, rilasciati {', '.join(nomi)}: memoria "
+                    f"{kris_risorse.mb(prima)} -> {kris_risorse.mb(dopo)} MB")
+        pipeline.notifica = self.evento_pipeline
+        # Esc: annulla il comando in corso (ascolto, trascrizione e lettura)
+        self.bind("<Escape>", self.annulla_comando)
+        # F2: mostra/nasconde i tempi per fase dopo ogni comando
+        self.mostra_latenze = bool(config.get("mostra_latenze", False))
+        self.bind("<F2>", self.commuta_latenze)
+        self.mostra("[KRIS] Caricamento modello vocale...")
+        if not MOTORE_REMOTO and motore.dettato.recuperati:
+            self.mostra(f"[KRIS] Ripresa la dettatura interrotta ({motore.dettato.recuperati} frasi): "
+                        "\"salva nota\" per salvarla, \"leggi tutto\" per ascoltarla.")
+        self.aggiorna_led()
+        threading.Thread(target=self._attendi_modello, daemon=True).start()
+
+    def mostra(self, riga):
+        self.trascritto.aggiungi(riga)
 
-    def _process_comando(self):
-        text = trascrivi_audio().strip().lower()
-        if not text:
-            r = "[Nessun comando rilevato]"
+    def commuta_latenze(self, event=None):
+        self.mostra_latenze = not self.mostra_latenze
+        self.mostra(f"[KRIS] Tempi per fase {'visibili' if self.mostra_latenze else 'nascosti'} (F2)")
+
+    # --- LED: animati solo durante ascolto, trascrizione, voce e caricamento del modello ---
+    def aggiorna_led(self):
+        if self.fase == "ascolto":
+            self.barra_led.imposta(LED_PRONTO, "scansione")
+        elif self.fase == "trascrizione":
+            self.barra_led.imposta(LED_CARICAMENTO, "scansione")
+        elif self.parlando:
+            self.barra_led.imposta(LED_PRONTO, "lampeggio")
+        elif self.modello_ok is None:
+            self.barra_led.imposta(LED_CARICAMENTO, "lampeggio")
+        elif not self.modello_ok:
+            self.barra_led.imposta(LED_ERRORE)
         else:
-            r = self.processa_comando(text)
-        self.display.configure(state="normal")
-        self.display.insert("end", f"> {text}\n{r}\n")
-        self.display.see("end")
-        self.display.configure(state="disabled")
-        speak(r)
-
-    def processa_comando(self, text):
-        global current_text, reading_emails
-        if any(b in text for b in config["blacklist"]):
-            return "[Comando bloccato]"
-        if text.startswith("scrivi "):
-            current_text += text[7:] + " "
-            return "Testo aggiunto."
-        elif text.startswith("salva nota"):
-            if not current_text.strip():
-                return "Nessun testo da salvare."
-            path = salva_nota(current_text)
-            current_text = ""
-            return f"Nota salvata in {path}"
-        elif text.startswith("apri "):
-            app = text[5:]
-            return apri_app(app)
-        elif "non leggere le email" in text:
-            reading_emails = False
-            return "Lettura email disattivata."
-        elif "leggi tutto" in text:
-            if not current_text.strip():
-                return "Nessun testo da leggere."
-            speak(current_text)
-            return "[Sintesi vocale avviata]"
-        elif "esci" in text:
-            self.quit()
-            return "Arrivederci!"
+            self.barra_led.imposta(None)  # a riposo: LED spenti, nessun timer
+
+    def imposta_fase(self, fase):
+        self.fase = fase
+        self.aggiorna_led()
+
+    def imposta_voce(self, parlando):
+        self.parlando = parlando
+        self.aggiorna_led()
+
+    def _attendi_modello(self):
+        # Col motore remoto lo stato si chiede al demone una volta al secondo, solo fino a quando è pronto
+        if not MOTORE_REMOTO:
+            motore.model_pronto.wait()
+        stato = motore.stato()
+        while not stato["pronto"]:
+            time.sleep(1)
+            stato = motore.stato()
+        self.eventi_ui.posta("modello", stato)
+
+    def modello_pronto(self, stato):
+        self.modello_ok = stato["modello"] is not None
+        if self.modello_ok:
+            self.mostra(f"[KRIS] Modello vocale pronto: {stato['modello']} ({stato['caricamento_s'] or 0:.1f}s)")
         else:
-            return "[Comando non riconosciuto]"
+            self.mostra(f"[KRIS] Modello vocale non disponibile: {stato['errore']}")
+        self.aggiorna_led()
 
-    def leggi_tutto(self):
-        global current_text
-        if not current_text.strip():
-            speak("Nessun testo da leggere.")
+    def comando_vocale(self, dettatura=False):
+        occupata = pipeline.occupata()
+        richiesta = pipeline.invia(dettatura=dettatura)
+        self.eventi_ui.sveglia()
+        if richiesta is None:
+            self.mostra("[KRIS] Troppi comandi in attesa: premi di nuovo tra poco.")
+        elif occupata and pipeline.politica != "annulla":
+            self.mostra("[KRIS] Comando in attesa...")
+
+    def dettatura(self):
+        # Dettatura in tempo reale: il testo compare mentre si parla e finisce nel testo corrente
+        self.comando_vocale(dettatura=True)
+
+    def annulla_comando(self, event=None):
+        if pipeline.occupata():
+            pipeline.annulla_tutto()
         else:
-            speak(current_text)
+            interrompi_voce()
+
+    def evento_pipeline(self, evento, richiesta):
+        # Chiamata dai thread della pipeline: solo voce (thread-safe) ed eventi per la finestra
+        if evento == "ascolto":
+            speak("Dimmi Kris", interrompi=True)
+            self.eventi_ui.posta("riga", "\n[KRIS] " + ("Dettatura..." if richiesta.dettatura else "In ascolto..."))
+        elif evento == "parziale":
+            confermato, provvisorio = richiesta.parziale
+            self.eventi_ui.posta("provvisoria", f"~ {confermato} {provvisorio}…" if provvisorio else f"~ {confermato}")
+        elif evento == "annullata":
+            self.eventi_ui.posta("provvisoria", None)
+            self.eventi_ui.posta("riga", "[KRIS] Comando annullato.")
+        elif evento == "risultato":
+            self.eventi_ui.posta("provvisoria", None)
+            risultato, latenze = richiesta.risultato, richiesta.latenze
+            text, r = risultato["trascrizione"], risultato["risposta"]
+            if not MOTORE_REMOTO:
+                log_command(text, risultato["intento"], latenze, r)  # il demone registra da sé
+            self.eventi_ui.posta("riga", f"> {text}\n{r}")
+            if self.mostra_latenze:
+                self.eventi_ui.posta("riga", f"[ms] {kris_metriche.riga_latenze(latenze)}")
+            if not richiesta.annulla.is_set():
+                speak(r)
+            if risultato["intento"] == "esci":
+                self.eventi_ui.posta("esci")
+        self.eventi_ui.posta("fase", pipeline.fase_attuale())
+
+    # I pulsanti mandano gli stessi comandi della voce, così funzionano anche col demone. In un thread:
+    # col motore remoto è una chiamata HTTP che non deve bloccare la finestra
+    def leggi_tutto(self):
+        self._in_background(self._leggi_tutto)
 
     def salva_nota(self):
-        global current_text
-        if not current_text.strip():
-            messagebox.showinfo("KRIS", "Nessun testo da salvare.")
-        else:
-            path = salva_nota(current_text)
-            messagebox.showinfo("KRIS", f"Nota salvata in\n{path}")
-            current_text = ""
+        self._in_background(lambda: self.eventi_ui.posta("avviso", motore.gestisci(testo="salva nota")["risposta"]))
+
+    def _leggi_tutto(self):
+        r = motore.gestisci(testo="leggi tutto")["risposta"]
+        if r != "[Sintesi vocale avviata]":
+            speak(r, kris_voce.PRIORITA_LETTURA)
+
+    def _in_background(self, funzione):
+        def _esegui():
+            try:
+                funzione()
+            except Exception as e:
+                self.eventi_ui.posta("riga", f"[KRIS] Errore: {e}")
+        self.eventi_ui.sveglia()
+        threading.Thread(target=_esegui, daemon=True).start()
 
     def apri_config(self):
         ConfigDialog(self)
@@ -376,15 +373,56 @@ class ConfigDialog(tk.Toplevel):
         tk.Button(self, text="Salva", command=self.salva).pack(pady=10)
 
     def salva(self):
-        config["voice"] = self.voice_var.get() or None
-        config["rate"] = int(self.rate_var.get())
-        config["volume"] = float(self.volume_var.get())
-        config["blacklist"] = [x.strip() for x in self.bl_var.get().split(",") if x.strip()]
-        config["note_dir"] = self.dir_var.get() or NOTE_DIR
-        save_config(config)
-        messagebox.showinfo("KRIS", "Configurazione salvata. Riavvia per applicare i cambiamenti.")
+        nuova = dict(config)
+        nuova["voice"] = self.voice_var.get() or None
+        nuova["rate"] = int(self.rate_var.get())
+        nuova["volume"] = float(self.volume_var.get())
+        nuova["blacklist"] = [x.strip() for x in self.bl_var.get().split(",") if x.strip()]
+        nuova["note_dir"] = self.dir_var.get() or NOTE_DIR
+        _, avvisi = kris_config.valida(nuova)
+        if avvisi:
+            messagebox.showwarning("KRIS", "Configurazione non salvata:\n" + "\n".join(avvisi))
+            return
+        save_config(nuova)
+        osservatore.controlla()  # applica subito, senza aspettare il prossimo giro dell'osservatore
+        messagebox.showinfo("KRIS", "Configurazione salvata e applicata.")
         self.destroy()
 
+# --- MISURA TEMPI DI AVVIO ---
+def misura_avvio(app, soglia_ms=None):
+    """--tempo-avvio: stampa in JSON quando la GUI è visibile e quando il modello è pronto, poi esce.
+    Con --soglia-ms N il codice di uscita è 1 se la GUI ci mette più di N ms (regressioni)."""
+    gui_ms = (time.perf_counter() - T_AVVIO) * 1000
+
+    def _attendi_modello():
+        stato = motore.stato()
+        if not stato["pronto"]:
+            app.after(50, _attendi_modello)
+            return
+        print(json.dumps({
+            "gui_ms": round(gui_ms, 1),
+            "modello_ms": round((time.perf_counter() - T_AVVIO) * 1000, 1),
+            "modello_ok": stato["modello"] is not None,
+            "backend": stato["modello"],
+            "motore_remoto": MOTORE_REMOTO
+        }))
+        app.codice_uscita = 1 if soglia_ms and gui_ms > soglia_ms else 0
+        app.destroy()
+    _attendi_modello()
+
 if __name__ == "__main__":
+    atexit.register(metriche.salva, METRICHE_FILE)
+    if not MOTORE_REMOTO:
+        motore.avvia_caricamento()
+    osservatore.avvia()
+    risorse.avvia()
+    voce.prepara(FRASI_FISSE)
     app = KITTUI()
-    app.mainloop()
\ No newline at end of file
+    app.codice_uscita = 0
+    if "--tempo-avvio" in sys.argv:
+        soglia = None
+        if "--soglia-ms" in sys.argv:
+            soglia = float(sys.argv[sys.argv.index("--soglia-ms") + 1])
+        app.after_idle(misura_avvio, app, soglia)
+    app.mainloop()
+    sys.exit(app.codice_uscita)
\ No newline at end of file
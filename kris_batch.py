@@ -0,0 +1,259 @@
+"""KRIS - Trascrizione in blocco delle dettature registrate (telefono, registratore).
+
+Tutti i file audio di una cartella diventano note in note_dir. I file lunghi
+sono divisi in pezzi di ~28 s (tagliati nel punto più silenzioso, con un
+secondo di sovrapposizione) e i pezzi vanno a un pool di processi, ognuno con
+il suo modello caricato una volta sola, a lotti di "lotto_dimensione" pezzi
+decodificati in un solo passaggio (kris_trascrizione.trascrivi_lotto). Ogni
+file è salvato come nota appena tutti i suoi pezzi sono pronti.
+
+Il manifesto (.kris_batch.json nella cartella) ricorda i file già fatti
+(nome, dimensione, data di modifica): rilanciando dopo un'interruzione si
+riparte dai file mancanti. Se il modello non si carica (o un processo muore)
+il lavoro si ferma subito, con i file già fatti segnati nel manifesto.
+
+    python kris_batch.py registrazioni/ [--processi 4] [--lotto 4] [--modello base] [--note note]
+
+I .wav si leggono direttamente; mp3, m4a, ogg... richiedono ffmpeg nel PATH.
+"""
+import os
+import sys
+import json
+import time
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+import kris_vad
+import kris_note
+import kris_config
+import kris_trascrizione
+from kris_testo import normalizza
+
+SAMPLERATE = 16000
+ESTENSIONI = (".wav", ".mp3", ".m4a", ".aac", ".ogg", ".opus", ".flac", ".amr", ".3gp", ".webm")
+PEZZO_S = 28            # sotto la finestra di 30 s di Whisper: un pezzo = una decodifica
+SOVRAPPOSIZIONE_S = 1.0
+RICERCA_TAGLIO_S = 4    # il taglio cade nel frame più silenzioso degli ultimi secondi del pezzo
+MANIFESTO = ".kris_batch.json"
+
+# --- AUDIO ---
+def carica_audio(path):
+    """Qualsiasi file audio -> float32 mono 16 kHz (ffmpeg per tutto ciò che non è WAV)"""
+    if path.lower().endswith(".wav"):
+        return kris_vad.leggi_wav(path, SAMPLERATE)
+    comando = ["ffmpeg", "-nostdin", "-v", "error", "-i", path, "-f", "s16le", "-ac", "1", "-ar", str(SAMPLERATE), "-"]
+    try:
+        uscita = subprocess.run(comando, capture_output=True, check=True).stdout
+    except FileNotFoundError:
+        raise RuntimeError("ffmpeg non trovato: serve per i file non WAV")
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(e.stderr.decode("utf-8", "replace").strip() or "ffmpeg ha restituito un errore")
+    return np.frombuffer(uscita, dtype="<i2").astype(np.float32) / 32768
+
+def dividi(audio, samplerate=SAMPLERATE, pezzo_s=PEZZO_S, sovrapposizione_s=SOVRAPPOSIZIONE_S):
+    """[(inizio, fine)] in campioni; i tagli cadono nelle pause per non spezzare le parole"""
+    n = len(audio)
+    lunghezza = int(pezzo_s * samplerate)
+    if n <= lunghezza:
+        return [(0, n)]
+    frame = int(0.03 * samplerate)
+    ricerca = int(RICERCA_TAGLIO_S * samplerate) // frame * frame
+    pezzi = []
+    inizio = 0
+    while True:
+        fine = inizio + lunghezza
+        if fine >= n:
+            pezzi.append((inizio, n))
+            return pezzi
+        energia = np.square(audio[fine - ricerca:fine], dtype=np.float64).reshape(-1, frame).mean(axis=1)
+        fine = fine - ricerca + int(np.argmin(energia)) * frame + frame // 2
+        pezzi.append((inizio, fine))
+        inizio = fine - int(sovrapposizione_s * samplerate)
+
+def unisci(testi, massimo_parole=12):
+    """Testi dei pezzi consecutivi -> testo unico, senza ripetere le parole della sovrapposizione"""
+    parole = []
+    for testo in testi:
+        nuove = testo.split()
+        chiavi_prec = [normalizza(p).strip(".,;:!?") for p in parole[-massimo_parole:]]
+        chiavi_nuove = [normalizza(p).strip(".,;:!?") for p in nuove[:massimo_parole]]
+        comuni = 0
+        for k in range(min(len(chiavi_prec), len(chiavi_nuove)), 0, -1):
+            if chiavi_prec[-k:] == chiavi_nuove[:k]:
+                comuni = k
+                break
+        parole.extend(nuove[comuni:])
+    return " ".join(parole)
+
+# --- MANIFESTO ---
+class Manifesto:
+    """File già trascritti; un file modificato (dimensione o data) viene rifatto"""
+
+    def __init__(self, cartella):
+        self.path = os.path.join(cartella, MANIFESTO)
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.voci = json.load(f)
+        except (OSError, ValueError):
+            self.voci = {}
+
+    @staticmethod
+    def _firma(path):
+        st = os.stat(path)
+        return {"dimensione": st.st_size, "mtime": st.st_mtime}
+
+    def fatto(self, path):
+        voce = self.voci.get(os.path.basename(path))
+        return voce is not None and all(voce.get(k) == v for k, v in self._firma(path).items())
+
+    def segna(self, path, nota, secondi_audio):
+        self.voci[os.path.basename(path)] = {**self._firma(path), "nota": nota, "secondi": round(secondi_audio, 1),
+                                             "ts": time.strftime("%Y-%m-%d %H:%M:%S")}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.voci, f, indent=1, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+# --- PROCESSI DI TRASCRIZIONE (un modello per processo) ---
+class ModelloNonCaricato(RuntimeError):
+    """Il modello non si è caricato nel processo: nessun lotto può riuscire"""
+
+_backend = None
+_lingua = "it"
+_errore_avvio = None
+
+def _inizializza(opzioni, lingua):
+    global _backend, _lingua, _errore_avvio
+    _lingua = lingua
+    try:
+        _backend = kris_trascrizione.crea_backend(opzioni)
+    except Exception as e:  # sollevata qui romperebbe il pool senza dire perché: arriva col primo lotto
+        _errore_avvio = f"{type(e).__name__}: {e}"
+
+def _trascrivi_pezzi(audios):
+    if _backend is None:
+        raise ModelloNonCaricato(_errore_avvio)
+    return [r["text"].strip() for r in _backend.trascrivi_lotto(audios, language=_lingua)]
+
+def _pezzi(da_fare):
+    """Genera (path, indice, numero pezzi, audio del pezzo, secondi del file) decodificando un file alla volta"""
+    for path in da_fare:
+        try:
+            audio = carica_audio(path)
+        except Exception as e:  # file illeggibile o troncato: si segnala e si va avanti
+            yield path, -1, 0, e, 0.0
+            continue
+        if not len(audio):
+            yield path, -1, 0, None, 0.0  # file vuoto: fatto, senza nota
+            continue
+        tagli = dividi(audio)
+        for i, (inizio, fine) in enumerate(tagli):
+            yield path, i, len(tagli), audio[inizio:fine], len(audio) / SAMPLERATE
+
+def trascrivi_cartella(cartella, config, processi=None, estensioni=ESTENSIONI, lotto=None):
+    """False se il lavoro si è fermato prima della fine (modello non caricato, processo morto)"""
+    manifesto = Manifesto(cartella)
+    tutti = sorted(os.path.join(cartella, nome) for nome in os.listdir(cartella)
+                   if nome.lower().endswith(estensioni))
+    da_fare = [p for p in tutti if not manifesto.fatto(p)]
+    print(f"{len(tutti)} file audio, {len(tutti) - len(da_fare)} già trascritti, {len(da_fare)} da fare")
+    if not da_fare:
+        return True
+    cpu = os.cpu_count() or 1
+    processi = max(1, processi or cpu // 2)
+    lotto = max(1, lotto or config.get("lotto_dimensione", 4))
+    opzioni = {**{k: config.get(k, v) for k, v in kris_trascrizione.BACKEND_DEFAULT.items()},
+               "torch_threads": max(1, cpu // processi)}  # niente sovrascrittura dei core tra processi
+    archivio = kris_note.ArchivioNote(config.get("note_dir", "note"))
+    t_inizio = time.perf_counter()
+    secondi_totali = 0.0
+    fatti = 0
+    pezzi = _pezzi(da_fare)
+    in_corso = {}   # future -> [(path, indice)] del lotto
+    risultati = {}  # path -> {"testi": {indice: testo}, "n", "secondi", "errore"}
+    interrotto = None
+    with ProcessPoolExecutor(processi, initializer=_inizializza, initargs=(opzioni, config.get("language", "it"))) as pool:
+        esauriti = False
+        while (in_corso or not esauriti) and interrotto is None:
+            # Pochi lotti in volo: la memoria resta limitata anche con centinaia di file
+            while not esauriti and len(in_corso) < processi * 2:
+                chiavi, audios = [], []
+                while len(audios) < lotto:
+                    voce = next(pezzi, None)
+                    if voce is None:
+                        esauriti = True
+                        break
+                    path, indice, n, audio, secondi = voce
+                    stato = risultati.setdefault(path, {"testi": {}, "n": n, "secondi": secondi, "errore": None})
+                    if indice < 0:
+                        stato["errore"] = audio
+                        continue
+                    chiavi.append((path, indice))
+                    audios.append(audio)
+                if audios:
+                    try:
+                        in_corso[pool.submit(_trascrivi_pezzi, audios)] = chiavi
+                    except BrokenProcessPool as e:
+                        interrotto = e
+                        break
+            finiti, _ = wait(in_corso, return_when=FIRST_COMPLETED) if in_corso else ((), ())
+            for futuro in finiti:
+                chiavi = in_corso.pop(futuro)
+                try:
+                    testi = futuro.result()
+                except (ModelloNonCaricato, BrokenProcessPool) as e:
+                    interrotto = e
+                    continue
+                except Exception as e:
+                    testi = [""] * len(chiavi)
+                    for path, _ in chiavi:
+                        risultati[path]["errore"] = e
+                for (path, indice), testo in zip(chiavi, testi):
+                    risultati[path]["testi"][indice] = testo
+            # Ogni file completo (tutti i pezzi tornati, anche con errore) diventa subito una nota
+            for path in [p for p, s in risultati.items() if len(s["testi"]) == s["n"]]:
+                stato = risultati.pop(path)
+                fatti += 1
+                nome = os.path.basename(path)
+                if stato["errore"] is not None:
+                    print(f"[{fatti}/{len(da_fare)}] {nome}: errore, da rifare: {stato['errore']}")
+                    continue
+                testo = unisci(stato["testi"][i] for i in range(stato["n"]))
+                nota = archivio.salva(f"[Dettatura: {nome}]\n{testo}\n") if testo else None
+                manifesto.segna(path, nota, stato["secondi"])
+                secondi_totali += stato["secondi"]
+                print(f"[{fatti}/{len(da_fare)}] {nome}: {stato['secondi']:.0f}s -> {nota or '(nessun parlato)'}")
+        if interrotto is not None:
+            for futuro in in_corso:
+                futuro.cancel()
+    if interrotto is not None:
+        motivo = interrotto if isinstance(interrotto, ModelloNonCaricato) else "un processo di trascrizione è terminato"
+        print(f"Interrotto: {motivo}. {len(manifesto.voci)} file nel manifesto, "
+              f"gli altri alla prossima esecuzione")
+        return False
+    durata = time.perf_counter() - t_inizio
+    print(f"Trascritti {secondi_totali / 60:.1f} minuti di audio in {durata:.0f}s con {processi} processi, "
+          f"lotti di {lotto} ({secondi_totali / max(durata, 1e-9):.1f}x tempo reale)")
+    return True
+
+def _opzione(args, nome, default):
+    if nome in args:
+        return args[args.index(nome) + 1]
+    return default
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if not args or args[0].startswith("--"):
+        print(__doc__)
+        sys.exit(2)
+    config, _ = kris_config.carica("config.json", crea=False)
+    config["whisper_model"] = _opzione(args, "--modello", config.get("whisper_model", "base"))
+    config["note_dir"] = _opzione(args, "--note", config.get("note_dir", "note"))
+    processi = _opzione(args, "--processi", None)
+    lotto = _opzione(args, "--lotto", None)
+    if not trascrivi_cartella(args[0], config, int(processi) if processi else None,
+                              lotto=int(lotto) if lotto else None):
+        sys.exit(1)
@@ -0,0 +1,206 @@
+"""KRIS - Benchmark end-to-end: registrazione WAV -> trascrizione -> comando -> risposta.
+
+Ogni .wav del corpus ha accanto un .txt con la trascrizione di riferimento
+("apri_blocco_note.wav" + "apri_blocco_note.txt"). L'audio passa dallo stesso
+VAD del microfono e dallo stesso MotoreKris della GUI e del demone (trascrizione
+e comando), la risposta dal worker vocale; sintesi vocale, apertura app e note sono
+sostituite da sink finti, quindi non parte nessun programma e non si sporca
+la cartella note.
+
+Per ogni combinazione modello/backend/precisione/modalità di trascrizione
+(kris_modalita.py: "auto", "comando", "dettatura") riporta p50/p95 per fase,
+WER sulle trascrizioni e intenti riconosciuti; il risultato completo è JSON,
+così due esecuzioni si confrontano con un diff.
+
+    python kris_bench.py corpus/ --modelli tiny,base --backend whisper,faster-whisper --precisione int8,fp32 --out bench.json
+    python kris_bench.py corpus/ --modalita auto,dettatura [--modello-comandi tiny]
+"""
+import os
+import sys
+import glob
+import json
+import time
+import platform
+import tempfile
+import itertools
+from datetime import datetime
+
+import numpy as np
+
+import kris_vad
+import kris_voce
+import kris_motore
+import kris_metriche
+import kris_config
+from kris_testo import parole
+
+CONFIG_FILE = "config.json"
+FASI = ("acquisizione", "trascrizione", "trascrizione_comando", "trascrizione_dettatura", "comando", "voce", "totale",
+        "risposta")
+
+# --- CORPUS ---
+def carica_corpus(cartella):
+    """[(path wav, trascrizione di riferimento)]; i .wav senza .txt sono ignorati"""
+    corpus = []
+    for wav in sorted(glob.glob(os.path.join(cartella, "*.wav"))):
+        try:
+            with open(os.path.splitext(wav)[0] + ".txt", "r", encoding="utf-8") as f:
+                corpus.append((wav, f.read().strip()))
+        except OSError:
+            print(f"Senza trascrizione di riferimento, ignorato: {wav}", file=sys.stderr)
+    return corpus
+
+def leggi_config(path=CONFIG_FILE):
+    """config.json dell'assistente (soglie VAD, lingua, comandi personalizzati), validata"""
+    config, avvisi = kris_config.carica(path, crea=False)
+    for avviso in avvisi:
+        print("Config:", avviso, file=sys.stderr)
+    return config
+
+# --- METRICHE ---
+def errori_parole(riferimento, ipotesi):
+    """(sostituzioni + inserimenti + cancellazioni, parole del riferimento) a livello di parola"""
+    rif, ipo = parole(riferimento), parole(ipotesi)
+    prec = list(range(len(ipo) + 1))
+    for i, r in enumerate(rif, 1):
+        riga = [i] + [0] * len(ipo)
+        for j, h in enumerate(ipo, 1):
+            riga[j] = min(prec[j] + 1, riga[j - 1] + 1, prec[j - 1] + (r != h))
+        prec = riga
+    return prec[-1], len(rif)
+
+def statistiche(valori):
+    if not valori:
+        return None
+    v = np.asarray(valori) * 1000
+    return {"p50_ms": round(float(np.percentile(v, 50)), 1), "p95_ms": round(float(np.percentile(v, 95)), 1),
+            "media_ms": round(float(v.mean()), 1), "n": len(valori)}
+
+# --- AMBIENTE FINTO ---
+def prepara_motore(config):
+    """Motore con voce muta, apertura app finta e note in una cartella temporanea"""
+    voce = kris_voce.VoceWorker(kris_voce.SinkNullo()).avvia()
+    cartella = tempfile.mkdtemp(prefix="kris_bench_note_")
+    motore = kris_motore.MotoreKris({**config, "note_dir": cartella,
+                                     "dettatura_diario": os.path.join(cartella, ".dettatura.journal"),
+                                     "app_indice": os.path.join(cartella, ".app_indice.json")},
+                                    parla=voce.parla)
+    motore.app_aperte = []
+
+    def _apri_finta(nome):
+        motore.app_aperte.append(nome)
+        return f"[bench] apri {nome}"
+    motore.apri_app = _apri_finta
+    return motore, voce
+
+def esegui_frase(motore, voce, wav, riferimento):
+    motore.dettato.svuota()
+    latenze = {}
+    t_inizio = time.perf_counter()
+    audio = motore.ascolta(kris_vad.blocchi_da_wav(wav), latenze)
+    risultato = motore.gestisci(audio=audio, latenze=latenze)
+    t0 = time.perf_counter()
+    voce.parla(risultato["risposta"])
+    voce.attendi()
+    latenze["voce"] = time.perf_counter() - t0
+    latenze["totale"] = time.perf_counter() - t_inizio
+    # In diretta l'ascolto si chiude dopo vad_silenzio secondi di silenzio: da lì parte l'attesa dell'utente
+    silenzio = kris_vad.parametri_da_config(motore.config)["vad_silenzio"]
+    latenze["risposta"] = silenzio + sum(latenze.get(f, 0.0) for f in ("attesa_modello", "trascrizione", "comando", "voce"))
+    atteso = motore.registro.riconosci(riferimento.lower())
+    errori, n_parole = errori_parole(riferimento, risultato["trascrizione"])
+    return {
+        "file": os.path.basename(wav),
+        "riferimento": riferimento,
+        "trascrizione": risultato["trascrizione"],
+        "esito": risultato["risposta"],
+        "intento": risultato["intento"],
+        "intento_atteso": atteso.nome if atteso else None,
+        "errori_parole": errori,
+        "parole": n_parole,
+        "latenze": {k: round(v, 4) for k, v in latenze.items()}
+    }
+
+def esegui_configurazione(motore, voce, corpus, modello, backend, precisione, threads=0, ripetizioni=1,
+                          modalita="auto", modello_comandi=None):
+    risultato = {"modello": modello, "backend": backend, "precisione": precisione, "modalita": modalita}
+    opz = {"whisper_model": modello, "whisper_backend": backend, "whisper_precisione": precisione,
+           "torch_threads": threads}
+    if modello_comandi is not None:
+        opz["whisper_model_comandi"] = modello_comandi
+    motore.config = {**motore.config, "trascrizione_modalita": modalita}
+    if not motore.carica_modello(opz):
+        risultato["errore"] = f"{type(motore.model_errore).__name__}: {motore.model_errore}"
+        return risultato
+    risultato["descrizione"] = motore.model.descrizione()
+    risultato["descrizione_comandi"] = motore.model_comandi.descrizione()
+    risultato["caricamento_s"] = round(motore.tempo_caricamento_modello, 2)
+    # Riscaldamento: la prima inferenza paga allocazioni e cache, non va nelle statistiche
+    esegui_frase(motore, voce, *corpus[0])
+    motore.metriche = voce.metriche = kris_metriche.Metriche()
+    frasi = [esegui_frase(motore, voce, wav, rif) for _ in range(ripetizioni) for wav, rif in corpus]
+    errori = sum(f["errori_parole"] for f in frasi)
+    totale_parole = sum(f["parole"] for f in frasi)
+    risultato["wer"] = round(errori / max(totale_parole, 1), 4)
+    risultato["intenti_ok"] = round(sum(f["intento"] == f["intento_atteso"] for f in frasi) / len(frasi), 4)
+    risultato["fasi"] = {fase: statistiche([f["latenze"][fase] for f in frasi if fase in f["latenze"]]) for fase in FASI}
+    risultato["metriche"] = motore.metriche.riepilogo()  # microfono, attesa voce, apertura app...
+    risultato["frasi"] = frasi
+    motore.model = motore.model_comandi = None
+    return risultato
+
+def benchmark(cartella, modelli=("base",), backend=("auto",), precisioni=("int8",), threads=0, ripetizioni=1,
+              modalita=("auto",), modello_comandi=None):
+    corpus = carica_corpus(cartella)
+    if not corpus:
+        raise SystemExit(f"Nessuna registrazione con trascrizione in {cartella}")
+    motore, voce = prepara_motore(leggi_config())
+    risultati = [esegui_configurazione(motore, voce, corpus, m, b, p, threads, ripetizioni, mod, modello_comandi)
+                 for m, b, p, mod in itertools.product(modelli, backend, precisioni, modalita)]
+    return {
+        "data": datetime.now().astimezone().isoformat(timespec="seconds"),
+        "corpus": os.path.abspath(cartella),
+        "registrazioni": len(corpus),
+        "ripetizioni": ripetizioni,
+        "sistema": {"python": platform.python_version(), "piattaforma": platform.platform(),
+                    "cpu": os.cpu_count()},
+        "risultati": risultati
+    }
+
+def _stampa(report):
+    for r in report["risultati"]:
+        titolo = f"{r.get('descrizione') or r['backend'] + ' ' + r['modello'] + ' ' + r['precisione']} [{r['modalita']}]"
+        if "errore" in r:
+            print(f"{titolo}: {r['errore']}", file=sys.stderr)
+            continue
+        print(f"{titolo} (caricamento {r['caricamento_s']}s) WER {r['wer']:.1%}, intenti {r['intenti_ok']:.0%}",
+              file=sys.stderr)
+        for fase, s in r["fasi"].items():
+            if s:
+                print(f"  {fase:22s} p50 {s['p50_ms']:8.1f} ms  p95 {s['p95_ms']:8.1f} ms", file=sys.stderr)
+
+def _opzione(args, nome, default):
+    if nome in args:
+        return args[args.index(nome) + 1]
+    return default
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if not args or args[0].startswith("--"):
+        print(__doc__)
+        sys.exit(2)
+    report = benchmark(args[0],
+                       _opzione(args, "--modelli", "base").split(","),
+                       _opzione(args, "--backend", "auto").split(","),
+                       _opzione(args, "--precisione", "int8").split(","),
+                       int(_opzione(args, "--threads", 0)),
+                       int(_opzione(args, "--ripetizioni", 1)),
+                       _opzione(args, "--modalita", "auto").split(","),
+                       _opzione(args, "--modello-comandi", None))
+    _stampa(report)
+    out = _opzione(args, "--out", None)
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    else:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
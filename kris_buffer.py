@@ -0,0 +1,222 @@
+"""KRIS - Testo dettato a segmenti, con un diario su disco che sopravvive ai crash.
+
+Ogni "scrivi ..." è un segmento: in memoria l'aggiunta è O(1) e "annulla
+ultima frase" toglie l'ultimo. Una dettatura in tempo reale arriva a pezzi ma
+resta un segmento solo: il primo pezzo lo apre, i successivi lo allungano,
+`chiudi_segmento()` lo chiude. Il diario (logs/dettatura.journal) è il testo
+stesso, un segmento per riga; la riga di un segmento aperto non ha ancora il
+"\n" finale. Un thread lo aggiorna nell'ordine delle
+operazioni: aggiunge in coda, per annullare tronca il file all'inizio
+dell'ultimo segmento, e fa fsync a gruppi (al massimo ogni INTERVALLO_FSYNC
+secondi), così chi detta non aspetta mai il disco.
+
+Al riavvio una sessione interrotta viene ripresa dal diario. "salva nota"
+chiude il diario e lo sposta fra le note così com'è, senza riscrivere il testo.
+
+    python kris_buffer.py [logs/dettatura.journal]    # mostra la sessione in sospeso
+"""
+import os
+import sys
+import time
+import queue
+import atexit
+import threading
+
+DIARIO_DEFAULT = "logs/dettatura.journal"
+INTERVALLO_FSYNC = 0.5
+
+class BufferDettatura:
+    def __init__(self, path=DIARIO_DEFAULT, intervallo_fsync=INTERVALLO_FSYNC):
+        self.path = path
+        self.intervallo_fsync = intervallo_fsync
+        self.segmenti = []
+        self._inizi = []          # byte d'inizio di ogni segmento nel diario
+        self._byte = 0            # lunghezza del diario dopo le operazioni accodate
+        self._parti = None        # pezzi del segmento aperto (dettatura in corso), uniti quando si chiude
+        self._lock = threading.Lock()
+        self.coda = queue.Queue()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.recuperati = self._recupera()
+        self._thread = threading.Thread(target=self._ciclo, daemon=True)
+        self._thread.start()
+        atexit.register(self.chiudi)
+
+    # --- MEMORIA (qualsiasi thread) ---
+    def aggiungi(self, testo, continua=False):
+        """Nuovo segmento in coda; il diario è aggiornato in background.
+        Con `continua` il segmento resta aperto e le aggiunte successive con `continua` lo allungano."""
+        testo = " ".join(testo.split())  # un segmento = una riga del diario
+        if not testo:
+            return
+        with self._lock:
+            if continua and self._parti is not None:
+                self._parti.append(testo)   # O(1) anche dopo migliaia di parole
+                self._scrivi(" " + testo)
+                return
+            self._chiudi_aperto()
+            self._inizi.append(self._byte)
+            if continua:
+                self._parti = [testo]
+                self._scrivi(testo)
+            else:
+                self.segmenti.append(testo)
+                self._scrivi(testo + "\n")
+
+    def chiudi_segmento(self):
+        """Fine della dettatura: la prossima aggiunta è un segmento nuovo"""
+        with self._lock:
+            self._chiudi_aperto()
+
+    def _chiudi_aperto(self):
+        if self._parti is not None:
+            self.segmenti.append(" ".join(self._parti))
+            self._parti = None
+            self._scrivi("\n")
+
+    def _tutti(self):
+        return self.segmenti if self._parti is None else self.segmenti + [" ".join(self._parti)]
+
+    def _scrivi(self, testo):
+        dati = testo.encode("utf-8")
+        self._byte += len(dati)
+        self.coda.put(("+", dati))
+
+    def annulla_ultimo(self):
+        """Toglie l'ultimo segmento e lo ritorna (None se il buffer è vuoto)"""
+        with self._lock:
+            if self._parti is not None:
+                tolto, self._parti = " ".join(self._parti), None
+            elif self.segmenti:
+                tolto = self.segmenti.pop()
+            else:
+                return None
+            self._byte = self._inizi.pop()
+            self.coda.put(("-", self._byte))
+            return tolto
+
+    def svuota(self):
+        with self._lock:
+            self.segmenti.clear()
+            self._inizi.clear()
+            self._byte = 0
+            self._parti = None
+            self.coda.put(("-", 0))
+
+    def testo(self, separatore=" "):
+        with self._lock:
+            return separatore.join(self._tutti())
+
+    def vuoto(self):
+        with self._lock:
+            return not self.segmenti and self._parti is None
+
+    def finalizza(self, archivio):
+        """Chiude il diario e lo sposta in `archivio` (kris_note.ArchivioNote) come nuova nota.
+        Ritorna il path della nota, None se non c'è niente da salvare."""
+        fatto = threading.Event()
+        esito = {}
+        with self._lock:
+            self._chiudi_aperto()   # il diario diventa la nota: righe complete
+            if not self.segmenti:
+                return None
+            testo = "\n".join(self.segmenti) + "\n"
+            self.segmenti.clear()
+            self._inizi.clear()
+            self._byte = 0
+            self.coda.put(("fine", (archivio, testo, esito, fatto)))
+        fatto.wait()
+        if "errore" in esito:
+            raise esito["errore"]
+        return esito["path"]
+
+    def chiudi(self):
+        """Scrive e sincronizza ciò che è in sospeso e ferma il thread (il diario resta per la ripresa)"""
+        if self._thread.is_alive():
+            self.coda.put(None)
+            self._thread.join(timeout=5)
+
+    # --- DIARIO (thread di scrittura) ---
+    def _recupera(self):
+        """Sessione interrotta: segmenti dal diario; una riga scritta a metà viene completata"""
+        try:
+            with open(self.path, "rb") as f:
+                dati = f.read()
+        except OSError:
+            return 0
+        fine = dati.rfind(b"\n") + 1
+        pos = 0
+        for riga in dati[:fine].split(b"\n")[:-1]:
+            self.segmenti.append(riga.decode("utf-8", "replace"))
+            self._inizi.append(pos)
+            pos += len(riga) + 1
+        self._byte = fine
+        if fine < len(dati):
+            os.truncate(self.path, fine)
+            self.aggiungi(dati[fine:].decode("utf-8", "replace"))
+        return len(self.segmenti)
+
+    def _ciclo(self):
+        f = None
+        da_sincronizzare = False
+        ultimo_fsync = time.monotonic()
+        while True:
+            try:
+                attesa = max(0.0, ultimo_fsync + self.intervallo_fsync - time.monotonic()) if da_sincronizzare else None
+                operazione = self.coda.get(timeout=attesa)
+            except queue.Empty:
+                operazione = ()
+            try:
+                if operazione is None or (operazione and operazione[0] == "fine"):
+                    if f is not None:
+                        self._chiudi_file(f)
+                        f = None
+                    da_sincronizzare = False
+                    if operazione is None:
+                        return
+                    self._finalizza(*operazione[1])
+                    continue
+                if operazione:
+                    tipo, valore = operazione
+                    if f is None:
+                        f = open(self.path, "ab", buffering=0)  # ogni riga arriva subito al sistema operativo
+                    if tipo == "+":
+                        f.write(valore)
+                    else:
+                        f.truncate(valore)
+                    da_sincronizzare = True
+                if da_sincronizzare and time.monotonic() - ultimo_fsync >= self.intervallo_fsync:
+                    os.fsync(f.fileno())
+                    da_sincronizzare = False
+                    ultimo_fsync = time.monotonic()
+            except OSError as e:
+                print("Errore diario dettatura:", e)
+
+    @staticmethod
+    def _chiudi_file(f):
+        try:
+            os.fsync(f.fileno())
+        except OSError as e:
+            print("Errore diario dettatura:", e)
+        finally:
+            f.close()
+
+    def _finalizza(self, archivio, testo, esito, fatto):
+        try:
+            if os.path.exists(self.path):
+                esito["path"] = archivio.importa(self.path, testo)
+            else:
+                esito["path"] = archivio.salva(testo)  # diario non scritto (disco pieno?): il testo è in memoria
+        except Exception as e:
+            esito["errore"] = e
+        finally:
+            fatto.set()
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else DIARIO_DEFAULT
+    if not os.path.exists(path):
+        print("Nessuna dettatura in sospeso")
+        sys.exit(0)
+    buffer = BufferDettatura(path)
+    print(f"{buffer.recuperati} segmenti in sospeso in {path}:")
+    print(buffer.testo("\n"))
+    buffer.chiudi()
@@ -0,0 +1,265 @@
+"""KRIS - Grammatica dei comandi compilata una volta sola.
+
+Comandi predefiniti, comandi personalizzati (config["custom_commands"]) e
+blacklist finiscono in due automi di Aho-Corasick (uno sui token, uno sui
+caratteri per la blacklist). Ogni frase viene analizzata in una sola passata
+e restituisce intento più argomenti. I token sono corretti in modo tollerante
+(distanza di edit 1-2 dal vocabolario dei comandi), così "apre blocco note" o
+"cerca nele note" vengono comunque riconosciuti. Niente correzioni per le
+frasi che valgono in qualsiasi punto (nel parlato normale "esce", "esco" sono
+a un errore da "esci") e per i comandi in SENZA_CORREZIONE; "esci" vale solo
+da solo.
+
+    python kris_comandi.py --bench [numero_comandi]
+"""
+import sys
+import time
+import random
+from collections import namedtuple, deque
+
+from kris_testo import normalizza, tokenizza, distanza, cancellazioni
+
+INIZIO = "inizio"      # la frase apre il comando, il resto sono argomenti ("scrivi ...")
+OVUNQUE = "ovunque"    # la frase può comparire in qualsiasi punto ("leggi tutto")
+ESATTO = "esatto"      # l'intero comando coincide con la frase (comandi personalizzati)
+
+# Comandi che chiudono o salvano: solo con le parole esatte
+SENZA_CORREZIONE = {"esci", "salva_nota"}
+
+BLOCCATO = "bloccato"
+PERSONALIZZATO = "personalizzato"
+
+# Parole di attivazione ignorate a inizio comando: "kit apri blocco note"
+PAROLE_ATTIVAZIONE = ("kit", "kitt", "kris")
+
+Intento = namedtuple("Intento", "nome argomenti frase punteggio")
+
+class AhoCorasick:
+    """Automa su sequenze (stringhe o liste di token): trova tutte le chiavi in una passata"""
+
+    def __init__(self, chiavi):
+        self.figli = [{}]
+        self.fallimento = [0]
+        self.uscite = [[]]
+        for sequenza, valore in chiavi:
+            nodo = 0
+            for simbolo in sequenza:
+                if simbolo not in self.figli[nodo]:
+                    self.figli.append({})
+                    self.fallimento.append(0)
+                    self.uscite.append([])
+                    self.figli[nodo][simbolo] = len(self.figli) - 1
+                nodo = self.figli[nodo][simbolo]
+            self.uscite[nodo].append((len(sequenza), valore))
+        # Collegamenti di fallimento in ampiezza
+        coda = deque(self.figli[0].values())
+        while coda:
+            nodo = coda.popleft()
+            for simbolo, figlio in self.figli[nodo].items():
+                coda.append(figlio)
+                f = self.fallimento[nodo]
+                while f and simbolo not in self.figli[f]:
+                    f = self.fallimento[f]
+                if nodo:
+                    self.fallimento[figlio] = self.figli[f].get(simbolo, 0)
+                self.uscite[figlio] = self.uscite[figlio] + self.uscite[self.fallimento[figlio]]
+
+    def cerca(self, sequenza):
+        """Genera (inizio, fine, valore) per ogni occorrenza"""
+        nodo = 0
+        for i, simbolo in enumerate(sequenza):
+            while nodo and simbolo not in self.figli[nodo]:
+                nodo = self.fallimento[nodo]
+            nodo = self.figli[nodo].get(simbolo, 0)
+            for lunghezza, valore in self.uscite[nodo]:
+                yield i + 1 - lunghezza, i + 1, valore
+
+    def contiene(self, sequenza):
+        return next(self.cerca(sequenza), None) is not None
+
+class RegistroComandi:
+    """Registro dei comandi: si registra tutto, poi `compila()`; `riconosci()` è l'unico punto di ingresso"""
+
+    def __init__(self):
+        self.comandi = []          # (nome, token frase, modo)
+        self.personalizzati = {}
+        self.blacklist = []
+        self._automa = None
+        self._blocchi = None
+        self._vocabolario = {}
+        self._parole = set()
+        self._correzioni = {}
+
+    def registra(self, nome, frasi, modo=INIZIO):
+        for frase in frasi:
+            self.comandi.append((nome, tuple(t for t, _, _ in tokenizza(frase)), modo))
+        self._automa = None
+
+    def imposta_personalizzati(self, comandi):
+        self.personalizzati = dict(comandi)
+        self._automa = None
+
+    def imposta_blacklist(self, voci):
+        self.blacklist = [v for v in voci if v.strip()]
+        self._blocchi = None
+
+    def vocabolario(self):
+        """Tutte le parole dei comandi registrati (anche per il prompt di Whisper)"""
+        self._compila_se_serve()
+        return sorted(self._parole)
+
+    def frasi(self):
+        """Frasi dei comandi registrati e personalizzati, senza doppioni (prompt di Whisper per i comandi)"""
+        frasi = [" ".join(frase) for _, frase, _ in self.comandi] + [t.strip() for t in self.personalizzati]
+        return list(dict.fromkeys(f for f in frasi if f))
+
+    def compila(self):
+        chiavi = [(frase, (nome, modo)) for nome, frase, modo in self.comandi]
+        for testo, risposta in self.personalizzati.items():
+            frase = tuple(t for t, _, _ in _senza_attivazione(tokenizza(testo)))
+            if frase:
+                chiavi.append((frase, (PERSONALIZZATO, ESATTO, risposta)))
+        self._automa = AhoCorasick(chiavi)
+        self._vocabolario = {}
+        self._parole = {parola for frase, _ in chiavi for parola in frase}
+        for parola in self._parole:
+            for variante in cancellazioni(parola) | {parola}:
+                self._vocabolario.setdefault(variante, set()).add(parola)
+        self._correzioni = {}
+        self._blocchi = AhoCorasick((normalizza(v), v) for v in self.blacklist)
+
+    def _compila_se_serve(self):
+        if self._automa is None or self._blocchi is None:
+            self.compila()
+
+    def _correggi(self, token):
+        """Parola del vocabolario più vicina (0 correzioni se identica); None se troppo lontana"""
+        if token in self._correzioni:
+            return self._correzioni[token]
+        risultato = (token, 0) if token in self._vocabolario.get(token, ()) else None
+        if risultato is None and len(token) >= 4:
+            massimo = 1 if len(token) < 8 else 2
+            candidati = set()
+            for variante in cancellazioni(token) | {token}:
+                candidati |= self._vocabolario.get(variante, set())
+            migliori = sorted((distanza(token, c, massimo), c) for c in candidati)
+            if migliori and migliori[0][0] <= massimo:
+                risultato = (migliori[0][1], migliori[0][0])
+        if len(self._correzioni) > 10000:
+            self._correzioni.clear()
+        self._correzioni[token] = risultato
+        return risultato
+
+    def riconosci(self, testo):
+        """Testo trascritto -> Intento (nome, argomenti, frase, punteggio 0-1), oppure None"""
+        self._compila_se_serve()
+        if self.blacklist and self._blocchi.contiene(normalizza(testo)):
+            return Intento(BLOCCATO, "", "", 1.0)
+        token = _senza_attivazione(tokenizza(testo))
+        if not token:
+            return None
+        corretti, errori = [], []
+        for t, _, _ in token:
+            c = self._correggi(t)
+            corretti.append(c[0] if c else t)
+            errori.append(c[1] if c else 0)
+        migliore = None
+        for inizio, fine, valore in self._automa.cerca(corretti):
+            nome, modo = valore[0], valore[1]
+            if modo == ESATTO and (inizio, fine) != (0, len(corretti)):
+                continue
+            if modo == INIZIO and inizio != 0:
+                continue
+            if (modo == OVUNQUE or nome in SENZA_CORREZIONE) and any(errori[inizio:fine]):
+                continue
+            # Priorità: comandi a inizio frase, poi frase più lunga, poi meno correzioni
+            chiave = (inizio == 0, fine - inizio, -sum(errori[inizio:fine]))
+            if migliore is None or chiave > migliore[0]:
+                migliore = (chiave, inizio, fine, valore)
+        if migliore is None:
+            return None
+        _, inizio, fine, valore = migliore
+        lettere = sum(len(t) for t in corretti[inizio:fine])
+        punteggio = 1.0 - sum(errori[inizio:fine]) / max(lettere, 1)
+        if valore[0] == PERSONALIZZATO:
+            argomenti = valore[2]
+        else:
+            argomenti = testo[token[fine - 1][2]:].strip(" ,.;:!?") if fine < len(token) else ""
+        frase = testo[token[inizio][1]:token[fine - 1][2]]
+        return Intento(valore[0], argomenti, frase, punteggio)
+
+def _senza_attivazione(token):
+    while len(token) > 1 and token[0][0] in PAROLE_ATTIVAZIONE:
+        token = token[1:]
+    return token
+
+# --- MICRO-BENCHMARK ---
+def _catena_originale(testo, blacklist, personalizzati):
+    # Equivalente della vecchia catena if/elif di processa_comando, per confronto
+    if any(b in testo for b in blacklist):
+        return BLOCCATO
+    if testo.startswith("scrivi "):
+        return "scrivi"
+    elif testo.startswith("salva nota"):
+        return "salva_nota"
+    elif testo.startswith("apri "):
+        return "apri"
+    elif testo in personalizzati:
+        return PERSONALIZZATO
+    elif "non leggere le email" in testo:
+        return "non_leggere_email"
+    elif "leggi tutto" in testo:
+        return "leggi_tutto"
+    elif "esci" in testo:
+        return "esci"
+    return None
+
+def benchmark(n_comandi=3000, n_personalizzati=200, n_blacklist=300, seme=0):
+    rnd = random.Random(seme)
+    parole = "casa nota testo lettera mamma lavoro domani chiama musica luce porta finestra".split()
+    personalizzati = {f"comando {rnd.choice(parole)} {i}": f"risposta {i}" for i in range(n_personalizzati)}
+    blacklist = ["elimina sistema", "formatta disco", "shutdown"]
+    blacklist += [f"vietato {rnd.choice(parole)} {i}" for i in range(n_blacklist)]
+    registro = RegistroComandi()
+    registra_predefiniti(registro)
+    registro.imposta_personalizzati(personalizzati)
+    registro.imposta_blacklist(blacklist)
+    t0 = time.perf_counter()
+    registro.compila()
+    t_compila = time.perf_counter() - t0
+    modelli = ["scrivi {} {}", "salva nota", "salva notta", "apri blocco note", "apri bloco {}",
+               "leggi tutto", "kit leggi tuto", "non leggere le email", "esci", "{} {} {}", "formatta disco {}"]
+    frasi = [rnd.choice(modelli).format(*rnd.sample(parole, 3)) for _ in range(n_comandi)]
+    frasi += rnd.sample(list(personalizzati), min(len(personalizzati), n_comandi // 10))
+    t0 = time.perf_counter()
+    riconosciuti = sum(registro.riconosci(f) is not None for f in frasi)
+    t_registro = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    catena = sum(_catena_originale(f, blacklist, personalizzati) is not None for f in frasi)
+    t_catena = time.perf_counter() - t0
+    print(f"{len(frasi)} comandi, {len(registro.comandi) + len(personalizzati)} frasi registrate, "
+          f"{len(blacklist)} voci in blacklist")
+    print(f"compilazione: {t_compila * 1000:.1f} ms")
+    print(f"registro:     {t_registro / len(frasi) * 1e6:.1f} us/comando, {riconosciuti} riconosciuti")
+    print(f"catena if:    {t_catena / len(frasi) * 1e6:.1f} us/comando, {catena} riconosciuti (senza tolleranza)")
+
+def registra_predefiniti(registro):
+    """Comandi di base dell'assistente (README, sezione 2)"""
+    registro.registra("scrivi", ["scrivi"])
+    registro.registra("salva_nota", ["salva nota"])
+    registro.registra("annulla_ultimo", ["annulla ultima frase", "cancella ultima frase"])
+    registro.registra("apri", ["apri"])
+    registro.registra("cerca_note", ["cerca nelle note", "cerca tra le note"])
+    registro.registra("cerca", ["fai una ricerca", "cerca"])
+    registro.registra("non_leggere_email", ["non leggere le email"], OVUNQUE)
+    registro.registra("leggi_tutto", ["leggi tutto"], OVUNQUE)
+    registro.registra("esci", ["esci"], ESATTO)
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--bench"]:
+        benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 3000)
+    else:
+        registro = RegistroComandi()
+        registra_predefiniti(registro)
+        for frase in sys.argv[1:]:
+            print(f"{frase!r}: {registro.riconosci(frase)}")
@@ -0,0 +1,270 @@
+"""KRIS - Configurazione unica: schema con tipi e default, migrazione, ricarica a caldo.
+
+config.json resta un dict piatto ("voice", "rate", "note_dir"...). `carica()`
+migra i formati vecchi, unisce in profondità con i default e valida ogni
+valore: un valore sbagliato torna al default con un avviso invece di far
+cadere l'assistente. `OsservatoreConfig` guarda la data di modifica del file
+e passa le nuove impostazioni a chi le applica senza riavvio.
+
+    python kris_config.py [config.json]    # mostra config valida e avvisi
+"""
+import os
+import sys
+import copy
+import json
+import threading
+
+from kris_log import LOG_DEFAULT
+from kris_trascrizione import BACKEND_VALIDI, PRECISIONI_VALIDE
+from kris_scelte import POLITICHE, MODALITA, BACKEND_RISPOSTE
+from kris_digitazione import BACKEND_DIGITAZIONE
+
+VERSIONE = 2
+
+def _positivo(v):
+    return v > 0
+
+def _lista_testi(v):
+    return all(isinstance(x, str) for x in v)
+
+def _dizionario_testi(v):
+    return all(isinstance(k, str) and isinstance(x, str) for k, x in v.items())
+
+# chiave -> (tipo, default, controllo opzionale); i dict annidati sono sotto-schemi
+SCHEMA = {
+    "versione": (int, VERSIONE, None),
+    # Voce
+    "voice": ((str, type(None)), None, None),
+    "rate": (int, 150, lambda v: 50 <= v <= 400),
+    "volume": (float, 1.0, lambda v: 0.0 <= v <= 1.0),
+    "cache_voce": (str, "cache_voce", bool),
+    # Comandi e note
+    "blacklist": (list, [], _lista_testi),
+    "custom_commands": (dict, {}, _dizionario_testi),
+    "note_dir": (str, "note", bool),
+    "risposte_backend": (str, "auto", lambda v: v in BACKEND_RISPOSTE),
+    "risposte_modello": (str, "", None),    # path .gguf (llama-cpp) o nome del modello Ollama
+    "risposte_url": (str, "http://127.0.0.1:11434", bool),
+    "cache_risposte": (str, "cache_risposte.json", bool),
+    "app_alias": (dict, {}, _dizionario_testi),
+    "app_indice": (str, "logs/app_indice.json", bool),
+    "dettatura_diario": (str, "logs/dettatura.journal", bool),
+    "language": (str, "it", bool),
+    # Trascrizione
+    "whisper_model": (str, "base", bool),
+    "whisper_model_comandi": (str, "tiny", None),   # "" = lo stesso modello anche per i comandi
+    "trascrizione_modalita": (str, "auto", lambda v: v in MODALITA),
+    "whisper_backend": (str, "auto", lambda v: v in BACKEND_VALIDI),
+    "whisper_precisione": (str, "int8", lambda v: v in PRECISIONI_VALIDE),
+    "torch_threads": (int, 0, lambda v: v >= 0),
+    "pipeline_politica": (str, "annulla", lambda v: v in POLITICHE),
+    "lotto_dimensione": (int, 4, lambda v: v >= 1),     # clip decodificate insieme, 1 = una alla volta
+    "lotto_attesa_ms": (float, 0.0, lambda v: v >= 0),  # attesa massima di altre clip prima di decodificare
+    "cache_modelli": (str, "cache_modelli", None),  # pesi whisper int8 già quantizzati; "" = niente cache
+    "inattivita_minuti": (float, 20.0, lambda v: v >= 0),   # modelli rilasciati dopo questa inattività, 0 = mai
+    "response_timing": {
+        "listen_timeout": (float, 5.0, _positivo),
+        "processing_delay": (float, 0.5, lambda v: v >= 0),
+        "voice_pause": (float, 1.0, lambda v: v >= 0),
+        "vad_soglia": (float, 0.01, _positivo),
+        "vad_fattore": (float, 3.0, _positivo),
+        "vad_silenzio": (float, 0.7, _positivo),
+        "vad_margine": (float, 0.15, lambda v: v >= 0)
+    },
+    # Log e interfaccia
+    "log_max_mb": (float, LOG_DEFAULT["log_max_mb"], _positivo),
+    "log_max_ore": (float, LOG_DEFAULT["log_max_ore"], _positivo),
+    "log_archivi": (int, LOG_DEFAULT["log_archivi"], lambda v: v >= 0),
+    "log_comprimi": (bool, LOG_DEFAULT["log_comprimi"], None),
+    "mostra_latenze": (bool, False, None),
+    "display_max_righe": (int, 500, lambda v: v >= 20),
+    # Demone
+    "motore_remoto": ((str, type(None)), None, None),
+    "daemon_porta": (int, 8765, lambda v: 0 < v < 65536),
+    "daemon_token": ((str, type(None)), None, None),
+    # nuovo 2.py
+    "browser": (str, "brave", bool),
+    "digitazione_backend": (str, "auto", lambda v: v in BACKEND_DIGITAZIONE),
+    "nome_utente": (str, "Kris", bool),
+    "wake_enabled": (bool, True, None),
+    "wake_modelli": (str, "wake", bool),
+    "wake_soglia": ((float, type(None)), None, None)
+}
+
+# File e cartelle: dal demone HTTP non si cambiano (kris_daemon.py)
+PERCORSI = {"note_dir", "cache_voce", "cache_risposte", "cache_modelli", "app_indice", "dettatura_diario",
+            "risposte_modello", "wake_modelli"}
+
+# Cambiano solo al prossimo avvio (tutto il resto si applica a caldo)
+RICHIEDONO_RIAVVIO = {"app_indice", "cache_risposte", "cache_voce", "dettatura_diario", "log_max_mb", "log_max_ore",
+                      "log_archivi", "log_comprimi", "display_max_righe", "motore_remoto", "daemon_porta", "daemon_token"}
+
+def predefinita(schema=SCHEMA):
+    return {k: predefinita(v) if isinstance(v, dict) else copy.deepcopy(v[1]) for k, v in schema.items()}
+
+def unisci_profondo(base, sopra):
+    """Copia di `base` con i valori di `sopra`; i dict annidati sono uniti chiave per chiave"""
+    risultato = copy.deepcopy(base)
+    for k, v in sopra.items():
+        if isinstance(v, dict) and isinstance(risultato.get(k), dict):
+            risultato[k] = unisci_profondo(risultato[k], v)
+        else:
+            risultato[k] = copy.deepcopy(v)
+    return risultato
+
+def _converti(valore, tipo):
+    """Conversioni innocue (5 -> 5.0, 150.0 -> 150); None se il tipo non torna"""
+    tipi = tipo if isinstance(tipo, tuple) else (tipo,)
+    if isinstance(valore, bool) and bool not in tipi:
+        return None
+    if isinstance(valore, tipi):
+        return valore
+    if float in tipi and isinstance(valore, int):
+        return float(valore)
+    if int in tipi and isinstance(valore, float) and valore.is_integer():
+        return int(valore)
+    return None
+
+def valida(config, schema=SCHEMA, prefisso=""):
+    """(config corretta, [avvisi]); le chiavi sconosciute sono conservate così come sono"""
+    pulita = dict(config)
+    avvisi = []
+    for chiave, regola in schema.items():
+        if isinstance(regola, dict):
+            annidata = config.get(chiave)
+            if not isinstance(annidata, dict):
+                if annidata is not None:
+                    avvisi.append(f"{prefisso}{chiave}: atteso un oggetto, uso i valori predefiniti")
+                annidata = {}
+            pulita[chiave], sotto = valida(annidata, regola, f"{prefisso}{chiave}.")
+            avvisi += sotto
+            continue
+        tipo, default, controllo = regola
+        if chiave not in config:
+            pulita[chiave] = copy.deepcopy(default)
+            continue
+        grezzo = config[chiave]
+        valore = _converti(grezzo, tipo)
+        nullo_ammesso = isinstance(tipo, tuple) and type(None) in tipo
+        if valore is None and (grezzo is not None or not nullo_ammesso) or \
+                valore is not None and controllo is not None and not controllo(valore):
+            avvisi.append(f"{prefisso}{chiave}: valore non valido {grezzo!r}, uso {default!r}")
+            valore = copy.deepcopy(default)
+        pulita[chiave] = valore
+    return pulita, avvisi
+
+def migra(config):
+    """Formato vecchio (voice_settings / directories / blacklist_commands) -> schema piatto"""
+    config = dict(config)
+    if config.get("versione", 1) >= VERSIONE:
+        return config
+    voce = config.pop("voice_settings", None)
+    if isinstance(voce, dict):
+        # voice_index non ha un equivalente stabile: si riparte dalla voce italiana automatica
+        for vecchia, nuova in (("rate", "rate"), ("volume", "volume")):
+            if vecchia in voce:
+                config.setdefault(nuova, voce[vecchia])
+    cartelle = config.pop("directories", None)
+    if isinstance(cartelle, dict) and "notes_dir" in cartelle:
+        config.setdefault("note_dir", cartelle["notes_dir"])
+    vecchia_blacklist = config.pop("blacklist_commands", None)
+    if isinstance(vecchia_blacklist, list):
+        config["blacklist"] = list(dict.fromkeys(list(config.get("blacklist") or []) + vecchia_blacklist))
+    config["versione"] = VERSIONE
+    return config
+
+def carica(path="config.json", crea=True):
+    """(config valida, [avvisi]); se il file manca lo crea con i default (se `crea`).
+    Solleva ValueError se il JSON è illeggibile, così chi ricarica a caldo tiene la config precedente."""
+    if not os.path.exists(path):
+        config = predefinita()
+        if crea:
+            salva(path, config)
+        return config, []
+    with open(path, "r", encoding="utf-8") as f:
+        letta = json.load(f)
+    if not isinstance(letta, dict):
+        raise ValueError(f"{path}: atteso un oggetto JSON")
+    migrata = migra(letta)
+    config, avvisi = valida(unisci_profondo(predefinita(), migrata))
+    if migrata != letta and crea:
+        salva(path, config)
+        avvisi.append(f"{path}: convertito al formato versione {VERSIONE}")
+    return config, avvisi
+
+def salva(path, config):
+    """Scrittura atomica: l'osservatore non legge mai un file a metà"""
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def differenze(vecchia, nuova):
+    """Chiavi di primo livello cambiate"""
+    return {k for k in set(vecchia) | set(nuova) if vecchia.get(k) != nuova.get(k)}
+
+class OsservatoreConfig:
+    """Controlla la data di modifica del file ogni `intervallo` secondi;
+    chiama `applica(nuova, cambiate)` (dal suo thread) quando il contenuto cambia davvero"""
+
+    def __init__(self, path, config, applica, intervallo=1.0):
+        self.path = path
+        self.config = config
+        self.applica = applica
+        self.intervallo = intervallo
+        self._firma = self._leggi_firma()
+        self._lock = threading.Lock()   # thread dell'osservatore e controlli manuali (finestra di configurazione)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _leggi_firma(self):
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def avvia(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._ciclo, daemon=True)
+            self._thread.start()
+        return self
+
+    def ferma(self):
+        self._stop.set()
+
+    def controlla(self):
+        """Un controllo (anche manuale, es. subito dopo un salvataggio); True se ha applicato modifiche.
+        Una modifica è applicata una volta sola anche se due thread controllano insieme."""
+        with self._lock:
+            firma = self._leggi_firma()
+            if firma is None or firma == self._firma:
+                return False
+            try:
+                nuova, avvisi = carica(self.path, crea=False)
+            except (OSError, ValueError) as e:
+                print(f"Config non ricaricata ({e}); resta in uso quella precedente")
+                self._firma = firma  # si riprova alla prossima modifica
+                return False
+            self._firma = firma
+            for avviso in avvisi:
+                print("Config:", avviso)
+            cambiate = differenze(self.config, nuova)
+            if not cambiate:
+                return False
+            self.config = nuova
+            self.applica(nuova, cambiate)
+            return True
+
+    def _ciclo(self):
+        while not self._stop.wait(self.intervallo):
+            try:
+                self.controlla()
+            except Exception as e:
+                print("Errore ricarica config:", e)
+
+if __name__ == "__main__":
+    config, avvisi = carica(sys.argv[1] if len(sys.argv) > 1 else "config.json", crea=False)
+    print(json.dumps(config, indent=2, ensure_ascii=False))
+    for avviso in avvisi:
+        print("Avviso:", avviso)
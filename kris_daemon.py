@@ -0,0 +1,257 @@
+"""KRIS - Demone senza interfaccia: il modello resta caricato e serve più front-end.
+
+API HTTP solo su 127.0.0.1 (porta 8765 di default, config "daemon_porta"):
+
+    GET  /stato      -> {"pronto", "scaricato", "modello", "errore", "caricamento_s"}
+    GET  /metriche   -> riepilogo dei tempi per fase
+    POST /comando    {"testo": "apri blocco note"}
+    POST /audio      corpo WAV, oppure PCM grezzo s16le mono (?samplerate=16000)
+    POST /config     solo le chiavi da cambiare: blacklist, comandi personalizzati...
+
+/comando e /audio rispondono {"trascrizione", "risposta", "intento", "latenze"}.
+Ogni richiesta deve avere l'header X-Kris-Token uguale a config["daemon_token"],
+generato e salvato in config.json al primo avvio del demone. Una pagina web
+può mandare POST "semplici" a 127.0.0.1: le richieste con l'header Origin sono
+rifiutate e /comando e /config vogliono Content-Type application/json.
+/config non cambia file e cartelle (kris_config.PERCORSI) né il demone stesso.
+
+Dopo "inattivita_minuti" senza richieste il modello è rilasciato (kris_risorse)
+e si ricarica alla prima richiesta audio.
+
+    python kris_daemon.py [--porta 8765] [--voce]
+    python kris_daemon.py --invia "apri blocco note"
+"""
+import io
+import sys
+import hmac
+import json
+import time
+import secrets
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+import kris_log
+import kris_config
+import kris_vad
+import kris_motore
+import kris_risorse
+
+CONFIG_FILE = "config.json"
+PORTA_DEFAULT = 8765
+MAX_CORPO = 50 * 1024 * 1024  # ~25 minuti di PCM a 16 kHz
+PROTETTE = kris_config.PERCORSI | {"motore_remoto", "daemon_porta", "daemon_token"}
+
+def assicura_token(config, path=CONFIG_FILE):
+    """Token del demone; al primo avvio ne genera uno e lo scrive in config.json, dove lo leggono i client"""
+    if not config.get("daemon_token"):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                grezza = json.load(f)
+        except (OSError, ValueError):
+            grezza = dict(config)
+        config["daemon_token"] = grezza["daemon_token"] = secrets.token_urlsafe(24)
+        kris_config.salva(path, grezza)
+        print(f"Token del demone generato in {path}")
+    return config["daemon_token"]
+
+def decodifica_audio(corpo, samplerate=kris_motore.SAMPLERATE):
+    """WAV (qualsiasi formato PCM, ricampionato) oppure PCM s16le mono -> float32 a 16 kHz"""
+    if corpo[:4] == b"RIFF":
+        return kris_vad.leggi_wav(io.BytesIO(corpo), kris_motore.SAMPLERATE)
+    audio = np.frombuffer(corpo[:len(corpo) // 2 * 2], dtype="<i2").astype(np.float32) / 32768
+    if samplerate != kris_motore.SAMPLERATE and len(audio):
+        n = int(round(len(audio) * kris_motore.SAMPLERATE / samplerate))
+        audio = np.interp(np.linspace(0, len(audio) - 1, n), np.arange(len(audio)), audio).astype(np.float32)
+    return audio
+
+def codifica_pcm(audio):
+    """float32 -> PCM s16le, il formato più compatto per /audio"""
+    return (np.clip(np.asarray(audio, dtype=np.float32), -1, 1) * 32767).astype("<i2").tobytes()
+
+# --- SERVER ---
+class GestoreRichieste(BaseHTTPRequestHandler):
+    motore = None
+    token = None
+    parla = None  # con --voce il demone pronuncia anche le risposte
+
+    def log_message(self, formato, *args):
+        pass  # ogni comando finisce già nel log JSONL
+
+    def _rispondi(self, dati, codice=200):
+        corpo = json.dumps(dati, ensure_ascii=False).encode("utf-8")
+        self.send_response(codice)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _autorizzato(self, solo_json=False):
+        if self.headers.get("Origin") is not None:
+            self._rispondi({"errore": "richieste dal browser non ammesse"}, 403)
+            return False
+        ricevuto = (self.headers.get("X-Kris-Token") or "").encode("utf-8")
+        if not self.token or not hmac.compare_digest(ricevuto, self.token.encode("utf-8")):
+            self._rispondi({"errore": "token non valido"}, 403)
+            return False
+        if solo_json and self.headers.get_content_type() != "application/json":
+            self._rispondi({"errore": "Content-Type deve essere application/json"}, 415)
+            return False
+        return True
+
+    def _corpo(self):
+        lunghezza = int(self.headers.get("Content-Length") or 0)
+        if lunghezza < 0:
+            raise ValueError("Content-Length non valido")
+        if lunghezza > MAX_CORPO:
+            raise ValueError("richiesta troppo grande")
+        return self.rfile.read(lunghezza)
+
+    def do_GET(self):
+        if not self._autorizzato():
+            return
+        percorso = urllib.parse.urlsplit(self.path).path
+        if percorso == "/stato":
+            self._rispondi(self.motore.stato())
+        elif percorso == "/metriche":
+            self._rispondi(self.motore.metriche.riepilogo())
+        else:
+            self._rispondi({"errore": f"percorso sconosciuto: {percorso}"}, 404)
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        if not self._autorizzato(solo_json=url.path != "/audio"):
+            return
+        try:
+            corpo = self._corpo()
+            if url.path in ("/comando", "/audio"):
+                if url.path == "/comando":
+                    richiesta = json.loads(corpo or b"{}")
+                    if not isinstance(richiesta, dict):
+                        raise ValueError("comando non valido")
+                    risultato = self.motore.gestisci(testo=str(richiesta.get("testo", "")))
+                else:
+                    query = urllib.parse.parse_qs(url.query)
+                    samplerate = int(query.get("samplerate", [kris_motore.SAMPLERATE])[0])
+                    risultato = self.motore.gestisci(audio=decodifica_audio(corpo, samplerate))
+                if self.parla is not None:
+                    self.parla(risultato["risposta"])
+                self._rispondi(risultato)
+            elif url.path == "/config":
+                modifiche = json.loads(corpo)
+                if not isinstance(modifiche, dict):
+                    raise ValueError("config non valida")
+                # Aggiornamento parziale: le chiavi non inviate restano come sono
+                attuale = self.motore.config
+                vietate = sorted(k for k in modifiche if k in PROTETTE and modifiche[k] != attuale.get(k))
+                if vietate:
+                    raise ValueError("non modificabili via HTTP: " + ", ".join(vietate))
+                config, avvisi = kris_config.valida(kris_config.unisci_profondo(attuale, modifiche))
+                self.motore.aggiorna_config(config)
+                self._rispondi({"ok": True, "avvisi": avvisi})
+            else:
+                self._rispondi({"errore": f"percorso sconosciuto: {url.path}"}, 404)
+        except (ValueError, EOFError) as e:
+            self._rispondi({"errore": str(e)}, 400)
+        except Exception as e:   # il client riceve comunque una risposta, non una connessione chiusa
+            print("Errore demone:", e)
+            self._rispondi({"errore": f"{type(e).__name__}: {e}"}, 500)
+
+def crea_server(motore, porta=PORTA_DEFAULT, token=None, parla=None):
+    if not token:
+        raise ValueError("il demone richiede un token (assicura_token)")
+    gestore = type("GestoreKris", (GestoreRichieste,), {"motore": motore, "token": token,
+                                                         "parla": staticmethod(parla) if parla else None})
+    return ThreadingHTTPServer(("127.0.0.1", porta), gestore)
+
+# --- CLIENT (usato dalla GUI in modalità remota e dagli script) ---
+class ClienteKris:
+    """Stessa interfaccia di MotoreKris per gestisci/stato/aggiorna_config, via HTTP"""
+
+    def __init__(self, url=f"http://127.0.0.1:{PORTA_DEFAULT}", token=None, timeout=120):
+        self.url = url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+
+    def _richiesta(self, percorso, corpo=None, tipo="application/json", timeout=None):
+        richiesta = urllib.request.Request(self.url + percorso, data=corpo)
+        if corpo is not None:
+            richiesta.add_header("Content-Type", tipo)
+        if self.token:
+            richiesta.add_header("X-Kris-Token", self.token)
+        with urllib.request.urlopen(richiesta, timeout=timeout or self.timeout) as risposta:
+            return json.loads(risposta.read().decode("utf-8"))
+
+    def stato(self):
+        try:
+            return self._richiesta("/stato", timeout=2)  # chiamato dal ciclo dei LED: non deve bloccare
+        except OSError as e:
+            return {"pronto": False, "modello": None, "errore": f"demone non raggiungibile: {e}"}
+
+    def gestisci(self, testo=None, audio=None, latenze=None):
+        t0 = time.perf_counter()
+        if testo is not None:
+            risultato = self._richiesta("/comando", json.dumps({"testo": testo}).encode("utf-8"))
+        else:
+            risultato = self._richiesta(f"/audio?samplerate={kris_motore.SAMPLERATE}", codifica_pcm(audio),
+                                        "application/octet-stream")
+        if latenze is not None:
+            latenze.update(risultato.get("latenze", {}))
+            latenze["rete"] = time.perf_counter() - t0 - risultato.get("latenze", {}).get("totale", 0.0)
+        return risultato
+
+    def aggiorna_config(self, config):
+        return self._richiesta("/config", json.dumps(config, ensure_ascii=False).encode("utf-8"))
+
+def _opzione(args, nome, default):
+    if nome in args:
+        return args[args.index(nome) + 1]
+    return default
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    try:
+        config, avvisi = kris_config.carica(CONFIG_FILE)
+    except (OSError, ValueError) as e:
+        config, avvisi = kris_config.predefinita(), [f"{CONFIG_FILE} illeggibile: {e}"]
+    for avviso in avvisi:
+        print("Config:", avviso)
+    porta = int(_opzione(args, "--porta", config.get("daemon_porta", PORTA_DEFAULT)))
+    token = config.get("daemon_token")
+    if "--invia" in args:
+        cliente = ClienteKris(f"http://127.0.0.1:{porta}", token)
+        print(json.dumps(cliente.gestisci(testo=_opzione(args, "--invia", "")), indent=2, ensure_ascii=False))
+        sys.exit(0)
+    parla = None
+    voce = None
+    if "--voce" in args:
+        import kris_voce
+        voce = kris_voce.VoceWorker(kris_voce.SinkPyttsx3(config.get("voice"), config.get("rate", 150),
+                                                          config.get("volume", 1.0))).avvia()
+        parla = voce.parla
+    token = assicura_token(config)
+    motore = kris_motore.MotoreKris(config, parla=parla, eventi=kris_log.crea_registro(config))
+    motore.avvia_caricamento()
+    risorse = kris_risorse.GestoreRisorse(config, motore.metriche)
+    risorse.registra("whisper", lambda: motore.ultimo_uso, motore.rilascia_modello)
+    risorse.registra("risposte", lambda: motore.risposte.ultimo_uso, motore.risposte.rilascia)
+    if voce is not None:
+        risorse.registra("voce", lambda: voce.ultimo_uso, voce.rilascia)
+    risorse.avvia()
+
+    def _applica(nuova, cambiate):
+        motore.aggiorna_config(nuova)
+        risorse.imposta_config(nuova)
+    # Modifiche a config.json applicate a caldo (un modello diverso si ricarica in background)
+    kris_config.OsservatoreConfig(CONFIG_FILE, config, _applica).avvia()
+    server = crea_server(motore, porta, token, parla)
+    print(f"KRIS in ascolto su http://127.0.0.1:{porta} (Ctrl+C per uscire)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        motore.metriche.salva("logs/metriche_daemon.json")
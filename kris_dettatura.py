@@ -0,0 +1,200 @@
+"""KRIS - Dettatura in tempo reale: ipotesi parziali mentre si parla.
+
+Durante la dettatura il buffer audio viene decodificato ogni PASSO_S secondi
+di audio nuovo. Una parola è confermata quando due decodifiche consecutive
+sono d'accordo su di essa (accordo locale): va subito nel testo corrente,
+mentre il resto dell'ipotesi è mostrato come provvisorio. Quando le parole
+confermate coprono segmenti interi, il loro audio esce dal buffer e il loro
+testo diventa il prompt di Whisper: ogni passo decodifica solo l'audio non
+ancora confermato, invece di ripartire dall'inizio.
+
+A fine dettatura l'ultimo buffer è decodificato una volta e confermato per
+intero. Per controllare che il testo finale corrisponda alla trascrizione
+dell'intero file:
+
+    python kris_dettatura.py corpus/ [--passo 1.0] [--soglia-wer 0.15]
+"""
+import os
+import sys
+import glob
+import json
+
+import numpy as np
+
+import kris_vad
+from kris_testo import parole
+
+SAMPLERATE = 16000
+PASSO_S = 1.0          # audio nuovo tra una decodifica e la successiva
+TAGLIO_S = 8.0         # oltre questa durata il buffer si accorcia ai confini di segmento
+MAX_BUFFER_S = 25.0    # sotto la finestra di 30 s di Whisper: oltre si conferma tutto e si riparte
+PROMPT_PAROLE = 60     # parole confermate passate come prompt
+
+# Parametri del VAD per la dettatura: frasi lunghe e pause per pensare
+VAD_DETTATURA = {"listen_timeout": 120, "vad_silenzio": 1.5}
+
+def _chiave(parola):
+    return " ".join(parole(parola))
+
+def _prefisso_comune(a, b):
+    n = 0
+    for x, y in zip(a, b):
+        if _chiave(x) != _chiave(y):
+            break
+        n += 1
+    return n
+
+class DettaturaStreaming:
+    """`decodifica(audio, prompt)` -> {"text", "segments"} (come kris_trascrizione); `aggiungi()`
+    ritorna le parole appena confermate dopo ogni decodifica (None se non ha decodificato)"""
+
+    def __init__(self, decodifica, passo_s=PASSO_S, samplerate=SAMPLERATE):
+        self.decodifica = decodifica
+        self.passo = int(passo_s * samplerate)
+        self.samplerate = samplerate
+        self.buffer = np.zeros(0, dtype=np.float32)
+        self.nuovi = 0            # campioni arrivati dall'ultima decodifica
+        self.prima = []           # parole confermate il cui audio è già uscito dal buffer
+        self.confermate = []      # parole confermate che cadono nel buffer
+        self.ipotesi = []         # ultima ipotesi sull'intero buffer
+        self.decodifiche = 0
+
+    @property
+    def testo(self):
+        return " ".join(self.prima + self.confermate)
+
+    @property
+    def provvisorio(self):
+        return " ".join(self.ipotesi[len(self.confermate):])
+
+    def aggiungi(self, audio):
+        self.buffer = np.concatenate([self.buffer, np.asarray(audio, dtype=np.float32).reshape(-1)])
+        self.nuovi += len(audio)
+        if self.nuovi < self.passo:
+            return None
+        return self._decodifica()
+
+    def fine(self):
+        """Ultima decodifica: tutto ciò che resta nel buffer è confermato"""
+        if self.nuovi:
+            nuove = self._decodifica(finale=True)
+        else:
+            nuove = self.ipotesi[len(self.confermate):]  # nessun audio nuovo: vale l'ultima ipotesi
+            self.confermate += nuove
+        self.prima += self.confermate
+        self.confermate, self.ipotesi = [], []
+        self.buffer = np.zeros(0, dtype=np.float32)
+        return nuove
+
+    def _decodifica(self, finale=False):
+        risultato = self.decodifica(self.buffer, " ".join(self.prima[-PROMPT_PAROLE:]))
+        self.decodifiche += 1
+        self.nuovi = 0
+        ipotesi = risultato["text"].split()
+        n = len(self.confermate)
+        # Accordo locale: dopo le parole già confermate, vale il tratto uguale all'ipotesi precedente
+        stabili = len(ipotesi) if finale else n + _prefisso_comune(ipotesi[n:], self.ipotesi[n:])
+        nuove = ipotesi[n:stabili]
+        self.confermate += nuove
+        self.ipotesi = ipotesi
+        if not finale:
+            nuove = nuove + self._accorcia(risultato.get("segments") or [])
+        return nuove
+
+    def _accorcia(self, segmenti):
+        """Toglie dal buffer l'audio dei segmenti già confermati per intero; ritorna le parole
+        provvisorie confermate d'ufficio (buffer troppo lungo), che vanno consegnate come le altre"""
+        if len(self.buffer) > MAX_BUFFER_S * self.samplerate:
+            # Parlato continuo senza confini utili: si conferma tutto e si riparte da un buffer vuoto
+            coda = self.ipotesi[len(self.confermate):]
+            self.prima += self.confermate + coda
+            self.confermate, self.ipotesi = [], []
+            self.buffer = np.zeros(0, dtype=np.float32)
+            return coda
+        if len(self.buffer) <= TAGLIO_S * self.samplerate:
+            return []
+        taglio, parole_tagliate, contate = 0.0, 0, 0
+        for segmento in segmenti:
+            contate += len(segmento["text"].split())
+            if contate > len(self.confermate):
+                break
+            taglio, parole_tagliate = segmento["end"], contate
+        campioni = int(taglio * self.samplerate)
+        if not parole_tagliate or campioni <= 0:
+            return []
+        self.buffer = self.buffer[campioni:]
+        self.prima += self.confermate[:parole_tagliate]
+        self.confermate = self.confermate[parole_tagliate:]
+        self.ipotesi = self.ipotesi[parole_tagliate:]
+        return []
+
+def detta(blocchi, streaming, al_cambio=None, samplerate=SAMPLERATE, **parametri_vad):
+    """Consuma blocchi audio finché il VAD chiude la dettatura, decodificando mentre si parla.
+    `al_cambio(nuove_parole)` dopo ogni decodifica. Ritorna il testo finale."""
+    vad = kris_vad.EnergyVAD(samplerate=samplerate, **{**parametri_vad, **VAD_DETTATURA})
+    inviati = 0   # frame del VAD già passati allo streaming
+    resto = np.zeros(0, dtype=np.float32)
+    try:
+        for blocco in blocchi:
+            resto = np.concatenate([resto, np.asarray(blocco, dtype=np.float32).reshape(-1)])
+            finito = False
+            while len(resto) >= vad.frame_len and not finito:
+                frame, resto = resto[:vad.frame_len], resto[vad.frame_len:]
+                finito = vad.aggiungi(frame)
+            # Allo streaming va l'audio dall'inizio del parlato (col margine), come nell'ascolto normale
+            if vad.primo_parlato is not None:
+                inizio = max(inviati, vad.primo_parlato - vad.margine_frame)
+                if inizio < len(vad.frames):
+                    nuove = streaming.aggiungi(np.concatenate(vad.frames[inizio:]))
+                    inviati = len(vad.frames)
+                    if nuove is not None and al_cambio is not None:
+                        al_cambio(nuove)
+            if finito:
+                break
+    finally:
+        close = getattr(blocchi, "close", None)
+        if close:
+            close()
+    if vad.primo_parlato is not None:
+        nuove = streaming.fine()
+        if al_cambio is not None:
+            al_cambio(nuove)
+    return streaming.testo
+
+# --- CONFRONTO CON LA TRASCRIZIONE OFFLINE ---
+def confronta(backend, wav, language="it", passo_s=PASSO_S, parametri_vad=None):
+    """Stesso file decodificato per intero e in streaming -> dict con i due testi e la WER tra loro"""
+    from kris_bench import errori_parole
+    audio = kris_vad.leggi_wav(wav, SAMPLERATE)
+    offline = backend.trascrivi(audio, language=language)["text"].strip()
+
+    def _decodifica(buffer, prompt):
+        return backend.trascrivi(buffer, language=language, initial_prompt=prompt or None)
+    streaming = DettaturaStreaming(_decodifica, passo_s)
+    finale = detta(kris_vad.blocchi_da_wav(wav, SAMPLERATE), streaming, **(parametri_vad or {}))
+    errori, n = errori_parole(offline, finale)
+    return {"file": os.path.basename(wav), "offline": offline, "streaming": finale,
+            "wer": round(errori / max(n, 1), 3), "decodifiche": streaming.decodifiche,
+            "secondi": round(len(audio) / SAMPLERATE, 1)}
+
+def _opzione(args, nome, default):
+    if nome in args:
+        return args[args.index(nome) + 1]
+    return default
+
+if __name__ == "__main__":
+    import kris_config
+    import kris_trascrizione
+    args = sys.argv[1:]
+    if not args or args[0].startswith("--"):
+        print(__doc__)
+        sys.exit(2)
+    config, _ = kris_config.carica("config.json", crea=False)
+    backend = kris_trascrizione.crea_backend(config)
+    soglia = float(_opzione(args, "--soglia-wer", 0.15))
+    risultati = [confronta(backend, wav, config.get("language", "it"), float(_opzione(args, "--passo", PASSO_S)),
+                           kris_vad.parametri_da_config(config))
+                 for wav in sorted(glob.glob(os.path.join(args[0], "*.wav")))]
+    print(json.dumps({"backend": backend.descrizione(), "risultati": risultati}, indent=2, ensure_ascii=False))
+    # Codice di uscita 1 se lo streaming si allontana dalla trascrizione offline (regressioni)
+    sys.exit(1 if any(r["wer"] > soglia for r in risultati) else 0)
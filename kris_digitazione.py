@@ -0,0 +1,320 @@
+"""KRIS - Testo dettato inserito nella finestra attiva ("scrivi ...", "mi digiti ...").
+
+pyautogui.typewrite manda un tasto alla volta con una pausa per carattere e
+salta le lettere accentate. Qui il testo entra in blocco:
+- "appunti": il testo va negli appunti, si incolla con Ctrl+V e dopo
+  RIPRISTINO_S si rimette quello che c'era prima (solo testo: un'immagine
+  negli appunti non torna). Se nel frattempo l'utente ha copiato altro, non
+  si tocca niente.
+- "tasti": battitura a blocchi di BLOCCO caratteri, Unicode completo: su
+  Windows una sola SendInput per blocco (KEYEVENTF_UNICODE), su Linux xdotool
+  o wtype; altrove pyautogui.write (solo ASCII).
+- "finto": non scrive niente, ricorda il testo ricevuto (prove senza finestra)
+- "auto" (config "digitazione_backend"): appunti se ci sono appunti e Ctrl+V,
+  altrimenti tasti
+
+    python kris_digitazione.py "Perché è già lì" [--backend appunti|tasti|finto] [--attesa 3] [--ripeti 1]
+"""
+import os
+import sys
+import time
+import shutil
+import threading
+import subprocess
+import unicodedata
+from abc import ABC, abstractmethod
+
+BACKEND_DIGITAZIONE = ("auto", "appunti", "tasti", "finto")
+RIPRISTINO_S = 0.5   # l'applicazione legge gli appunti dopo aver ricevuto Ctrl+V, non subito
+BLOCCO = 200
+
+# (leggi, scrivi) degli appunti fuori da Windows, nell'ordine in cui si provano
+COMANDI_APPUNTI = [
+    (["wl-paste", "--no-newline"], ["wl-copy"]),
+    (["xclip", "-selection", "clipboard", "-o"], ["xclip", "-selection", "clipboard"]),
+    (["xsel", "--clipboard", "--output"], ["xsel", "--clipboard", "--input"]),
+    (["pbpaste"], ["pbcopy"]),
+]
+
+class DigitazioneNonDisponibile(Exception):
+    """Nessun modo di inserire testo in questo sistema (niente appunti né battitura)"""
+
+def _attaccato(testo, i):
+    """Il carattere i-esimo fa parte di quello prima (accento combinante, selettore di variante,
+    colore della pelle, ZWJ)"""
+    c = testo[i]
+    return (unicodedata.combining(c) or c in "\u200d\ufe0e\ufe0f" or "\U0001f3fb" <= c <= "\U0001f3ff"
+            or (i > 0 and testo[i - 1] == "\u200d"))
+
+def _blocchi(testo, n=BLOCCO):
+    """Blocchi di al massimo n caratteri, tagliati solo fra un carattere visibile e l'altro
+    ("e" + accento combinante o un'emoji composta restano interi)"""
+    blocchi, inizio = [], 0
+    while inizio < len(testo):
+        fine = min(inizio + n, len(testo))
+        taglio = fine
+        while taglio < len(testo) and taglio > inizio + 1 and _attaccato(testo, taglio):
+            taglio -= 1
+        if taglio < len(testo) and _attaccato(testo, taglio):
+            taglio = fine   # un solo carattere con più di n segni attaccati: si taglia comunque
+        blocchi.append(testo[inizio:taglio])
+        inizio = taglio
+    return blocchi
+
+# --- APPUNTI ---
+def _appunti_windows():
+    import ctypes
+    from ctypes import wintypes
+    user32, kernel32 = ctypes.windll.user32, ctypes.windll.kernel32
+    user32.GetClipboardData.restype = wintypes.HANDLE
+    user32.SetClipboardData.argtypes = [wintypes.UINT, wintypes.HANDLE]
+    user32.SetClipboardData.restype = wintypes.HANDLE
+    kernel32.GlobalAlloc.restype = wintypes.HGLOBAL
+    kernel32.GlobalLock.argtypes = [wintypes.HGLOBAL]
+    kernel32.GlobalLock.restype = ctypes.c_void_p
+    kernel32.GlobalUnlock.argtypes = [wintypes.HGLOBAL]
+    CF_UNICODETEXT, GMEM_MOVEABLE = 13, 0x0002
+
+    def _apri():
+        # Un altro programma può tenere aperti gli appunti per qualche ms
+        for _ in range(20):
+            if user32.OpenClipboard(None):
+                return
+            time.sleep(0.01)
+        raise OSError("appunti occupati da un altro programma")
+
+    def leggi():
+        _apri()
+        try:
+            h = user32.GetClipboardData(CF_UNICODETEXT)
+            if not h:
+                return None
+            p = kernel32.GlobalLock(h)
+            try:
+                return ctypes.wstring_at(p)
+            finally:
+                kernel32.GlobalUnlock(h)
+        finally:
+            user32.CloseClipboard()
+
+    def scrivi(testo):
+        dati = ctypes.create_unicode_buffer(testo)
+        _apri()
+        try:
+            user32.EmptyClipboard()
+            h = kernel32.GlobalAlloc(GMEM_MOVEABLE, ctypes.sizeof(dati))
+            p = kernel32.GlobalLock(h)
+            ctypes.memmove(p, dati, ctypes.sizeof(dati))
+            kernel32.GlobalUnlock(h)
+            user32.SetClipboardData(CF_UNICODETEXT, h)   # da qui la memoria è degli appunti
+        finally:
+            user32.CloseClipboard()
+
+    return leggi, scrivi
+
+def _appunti_comandi(cmd_leggi, cmd_scrivi):
+    def leggi():
+        r = subprocess.run(cmd_leggi, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=2)
+        return r.stdout.decode("utf-8", errors="replace") if r.returncode == 0 else None
+
+    def scrivi(testo):
+        # xclip resta in background a servire gli appunti: niente pipe da aspettare in uscita
+        subprocess.run(cmd_scrivi, input=testo.encode("utf-8"), stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, timeout=2, check=True)
+
+    return leggi, scrivi
+
+def appunti_di_sistema():
+    """(leggi, scrivi) degli appunti di sistema; None se non ci sono"""
+    if os.name == "nt":
+        return _appunti_windows()
+    for cmd_leggi, cmd_scrivi in COMANDI_APPUNTI:
+        if cmd_leggi[0] == "wl-paste" and not os.environ.get("WAYLAND_DISPLAY"):
+            continue
+        if shutil.which(cmd_leggi[0]) and shutil.which(cmd_scrivi[0]):
+            return _appunti_comandi(cmd_leggi, cmd_scrivi)
+    return None
+
+def _incolla_pyautogui():
+    """Ctrl+V (Cmd+V su macOS) nella finestra attiva; None se pyautogui non c'è"""
+    try:
+        import pyautogui
+    except Exception:   # senza display pyautogui fallisce già all'import
+        return None
+    tasto = "command" if sys.platform == "darwin" else "ctrl"
+    return lambda: pyautogui.hotkey(tasto, "v")
+
+# --- BATTITURA ---
+def _tasti_windows():
+    """SendInput con KEYEVENTF_UNICODE: tutti i caratteri di un blocco in una sola chiamata"""
+    import ctypes
+    from ctypes import wintypes
+    INPUT_KEYBOARD, KEYEVENTF_KEYUP, KEYEVENTF_UNICODE, VK_RETURN = 1, 0x0002, 0x0004, 0x0D
+
+    class KEYBDINPUT(ctypes.Structure):
+        _fields_ = [("wVk", wintypes.WORD), ("wScan", wintypes.WORD), ("dwFlags", wintypes.DWORD),
+                    ("time", wintypes.DWORD), ("dwExtraInfo", ctypes.c_size_t)]
+
+    class MOUSEINPUT(ctypes.Structure):   # solo per la dimensione giusta dell'unione
+        _fields_ = [("dx", wintypes.LONG), ("dy", wintypes.LONG), ("mouseData", wintypes.DWORD),
+                    ("dwFlags", wintypes.DWORD), ("time", wintypes.DWORD), ("dwExtraInfo", ctypes.c_size_t)]
+
+    class _EVENTO(ctypes.Union):
+        _fields_ = [("ki", KEYBDINPUT), ("mi", MOUSEINPUT)]
+
+    class INPUT(ctypes.Structure):
+        _fields_ = [("type", wintypes.DWORD), ("u", _EVENTO)]
+
+    def scrivi(testo):
+        eventi = []
+        codifica = testo.replace("\r\n", "\n").encode("utf-16-le")
+        # Unità UTF-16: le emoji sono due surrogate, ciascuna con il suo evento
+        for i in range(0, len(codifica), 2):
+            unita = int.from_bytes(codifica[i:i + 2], "little")
+            if unita == 0x0A:
+                premuto = KEYBDINPUT(VK_RETURN, 0, 0, 0, 0)
+                rilasciato = KEYBDINPUT(VK_RETURN, 0, KEYEVENTF_KEYUP, 0, 0)
+            else:
+                premuto = KEYBDINPUT(0, unita, KEYEVENTF_UNICODE, 0, 0)
+                rilasciato = KEYBDINPUT(0, unita, KEYEVENTF_UNICODE | KEYEVENTF_KEYUP, 0, 0)
+            eventi += [INPUT(INPUT_KEYBOARD, _EVENTO(ki=premuto)), INPUT(INPUT_KEYBOARD, _EVENTO(ki=rilasciato))]
+        vettore = (INPUT * len(eventi))(*eventi)
+        if ctypes.windll.user32.SendInput(len(eventi), vettore, ctypes.sizeof(INPUT)) != len(eventi):
+            raise OSError("SendInput bloccato (finestra di un altro utente o con privilegi più alti?)")
+
+    return scrivi
+
+def tasti_di_sistema():
+    """(nome, scrivi(blocco)) per battere testo Unicode; None se non c'è niente"""
+    if os.name == "nt":
+        return "sendinput", _tasti_windows()
+    if os.environ.get("WAYLAND_DISPLAY") and shutil.which("wtype"):
+        return "wtype", lambda blocco: subprocess.run(["wtype", "--", blocco], check=True, timeout=10)
+    if shutil.which("xdotool"):
+        return "xdotool", lambda blocco: subprocess.run(["xdotool", "type", "--delay", "0", "--", blocco],
+                                                          check=True, timeout=10)
+    try:
+        import pyautogui
+    except Exception:
+        return None
+    return "pyautogui", lambda blocco: pyautogui.write(blocco, interval=0)
+
+# --- BACKEND ---
+class Iniettore(ABC):
+    nome = ""
+
+    @abstractmethod
+    def scrivi(self, testo):
+        """Inserisce il testo nella finestra attiva"""
+
+    def descrizione(self):
+        return self.nome
+
+class IniettoreAppunti(Iniettore):
+    """Incolla dagli appunti e poi rimette il contenuto di prima"""
+    nome = "appunti"
+
+    def __init__(self, appunti, incolla, ripristino_s=RIPRISTINO_S):
+        self.leggi, self.imposta = appunti
+        self.incolla = incolla
+        self.ripristino_s = ripristino_s
+        self._lock = threading.Lock()
+        self._generazione = 0
+        self._precedente = None
+        self._nostro = None
+
+    def scrivi(self, testo):
+        with self._lock:
+            # Con un ripristino ancora in sospeso gli appunti contengono il testo di prima: resta salvato l'originale
+            if self._nostro is None:
+                try:
+                    self._precedente = self.leggi()
+                except (OSError, subprocess.SubprocessError):
+                    self._precedente = None
+            self.imposta(testo)
+            self._nostro = testo
+            self.incolla()
+            self._generazione += 1
+            timer = threading.Timer(self.ripristino_s, self._ripristina, (self._generazione,))
+            timer.daemon = True
+            timer.start()
+
+    def _ripristina(self, generazione):
+        with self._lock:
+            if generazione != self._generazione:
+                return   # un'altra frase è stata incollata: ripristina il suo timer
+            try:
+                # Se nel frattempo l'utente ha copiato altro, gli appunti sono suoi
+                if self._precedente is not None and self.leggi() == self._nostro:
+                    self.imposta(self._precedente)
+            except (OSError, subprocess.SubprocessError) as e:
+                print("Errore ripristino appunti:", e)
+            self._precedente = self._nostro = None
+
+class IniettoreTasti(Iniettore):
+    """Battitura a blocchi: una chiamata di sistema per blocco, non una per carattere"""
+    nome = "tasti"
+
+    def __init__(self, tasti, blocco=BLOCCO):
+        self.metodo, self.batti = tasti
+        self.blocco = blocco
+
+    def scrivi(self, testo):
+        for pezzo in _blocchi(testo, self.blocco):
+            self.batti(pezzo)
+
+    def descrizione(self):
+        return f"{self.nome} ({self.metodo})"
+
+class IniettoreFinto(Iniettore):
+    """Non scrive niente: `scritti` tiene i testi ricevuti"""
+    nome = "finto"
+
+    def __init__(self):
+        self.scritti = []
+
+    def scrivi(self, testo):
+        self.scritti.append(testo)
+
+def crea_iniettore(config):
+    """Backend scelto da config["digitazione_backend"]; DigitazioneNonDisponibile se non ce n'è uno"""
+    scelta = config.get("digitazione_backend", "auto")
+    if scelta == "finto":
+        return IniettoreFinto()
+    if scelta in ("auto", "appunti"):
+        appunti, incolla = appunti_di_sistema(), _incolla_pyautogui()
+        if appunti is not None and incolla is not None:
+            return IniettoreAppunti(appunti, incolla)
+        if scelta == "appunti":
+            raise DigitazioneNonDisponibile("appunti di sistema o pyautogui non disponibili")
+    tasti = tasti_di_sistema()
+    if tasti is None:
+        raise DigitazioneNonDisponibile("niente per battere il testo (xdotool, wtype o pyautogui)")
+    return IniettoreTasti(tasti)
+
+def _opzione(args, nome, default):
+    if nome in args:
+        return args[args.index(nome) + 1]
+    return default
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if not args or args[0].startswith("--"):
+        print(__doc__)
+        sys.exit(2)
+    try:
+        iniettore = crea_iniettore({"digitazione_backend": _opzione(args, "--backend", "auto")})
+    except DigitazioneNonDisponibile as e:
+        print("Digitazione non disponibile:", e)
+        sys.exit(1)
+    attesa = float(_opzione(args, "--attesa", 3 if iniettore.nome != "finto" else 0))
+    print(f"Backend: {iniettore.descrizione()}; scrivo tra {attesa:.0f} s nella finestra attiva")
+    time.sleep(attesa)
+    testo = args[0] * int(_opzione(args, "--ripeti", 1))
+    t0 = time.perf_counter()
+    iniettore.scrivi(testo)
+    print(f"{len(testo)} caratteri in {(time.perf_counter() - t0) * 1000:.1f} ms")
+    if iniettore.nome == "finto":
+        print(iniettore.scritti)
+    elif iniettore.nome == "appunti":
+        time.sleep(RIPRISTINO_S + 0.2)   # il ripristino degli appunti gira in un timer
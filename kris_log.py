@@ -0,0 +1,159 @@
+"""KRIS - Registro eventi strutturato (JSONL) con scrittura in background e rotazione.
+
+Ogni comando diventa una riga JSON con data e ora complete, trascrizione,
+intento riconosciuto, latenze per fase ed esito. Le righe vengono accodate e
+scritte a blocchi da un thread; il file ruota per dimensione o età e gli
+archivi vengono compressi (gzip).
+
+    python kris_log.py --ultimi 20
+    python kris_log.py --lenti 10 [--fase trascrizione]
+"""
+import os
+import sys
+import glob
+import gzip
+import json
+import time
+import queue
+import atexit
+import shutil
+import threading
+from datetime import datetime
+
+LOG_DEFAULT = {
+    "log_file": "logs/kris_log.jsonl",
+    "log_max_mb": 5,          # rotazione per dimensione
+    "log_max_ore": 24,        # rotazione per età del file
+    "log_archivi": 10,        # archivi compressi conservati
+    "log_comprimi": True
+}
+
+def adesso():
+    return datetime.now().astimezone().isoformat(timespec="milliseconds")
+
+class RegistroEventi:
+    def __init__(self, path=LOG_DEFAULT["log_file"], max_mb=5, max_ore=24, archivi=10, comprimi=True,
+                 intervallo=1.0, max_blocco=200):
+        self.path = path
+        self.max_byte = int(max_mb * 1024 * 1024)
+        self.max_secondi = max_ore * 3600
+        self.archivi = archivi
+        self.comprimi = comprimi
+        self.intervallo = intervallo
+        self.max_blocco = max_blocco
+        self.coda = queue.Queue()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.inizio_file = self._inizio_file()
+        self._thread = threading.Thread(target=self._ciclo, daemon=True)
+        self._thread.start()
+        atexit.register(self.chiudi)
+
+    def registra(self, **campi):
+        """Non blocca: l'evento viene scritto al prossimo flush"""
+        self.coda.put({"ts": adesso(), **campi})
+
+    def chiudi(self):
+        """Scrive gli eventi in sospeso e ferma il thread"""
+        if self._thread.is_alive():
+            self.coda.put(None)
+            self._thread.join(timeout=5)
+
+    def _inizio_file(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return datetime.fromisoformat(json.loads(f.readline())["ts"]).timestamp()
+        except (OSError, ValueError, KeyError):
+            return time.time()
+
+    def _ciclo(self):
+        fine = False
+        while not fine:
+            blocco = [self.coda.get()]
+            scadenza = time.monotonic() + self.intervallo
+            while len(blocco) < self.max_blocco:
+                try:
+                    blocco.append(self.coda.get(timeout=max(0, scadenza - time.monotonic())))
+                except queue.Empty:
+                    break
+            if None in blocco:
+                fine = True
+                blocco = [e for e in blocco if e is not None]
+            if blocco:
+                try:
+                    self._scrivi(blocco)
+                except OSError as e:
+                    print("Errore scrittura log:", e)
+
+    def _scrivi(self, eventi):
+        self._ruota_se_serve()
+        righe = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in eventi)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(righe)
+
+    def _ruota_se_serve(self):
+        try:
+            dimensione = os.path.getsize(self.path)
+        except OSError:
+            return
+        if dimensione < self.max_byte and time.time() - self.inizio_file < self.max_secondi:
+            return
+        base, est = os.path.splitext(self.path)
+        ora = time.time()
+        archivio = f"{base}-{time.strftime('%Y%m%d-%H%M%S', time.localtime(ora))}{int(ora * 1000) % 1000:03d}{est}"
+        os.replace(self.path, archivio)
+        self.inizio_file = time.time()
+        if self.comprimi:
+            with open(archivio, "rb") as src, gzip.open(archivio + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(archivio)
+        for vecchio in archivi(self.path)[:-self.archivi or None]:
+            os.remove(vecchio)
+
+def crea_registro(config):
+    opz = {k: config.get(k, v) for k, v in LOG_DEFAULT.items()}
+    return RegistroEventi(opz["log_file"], opz["log_max_mb"], opz["log_max_ore"], opz["log_archivi"], opz["log_comprimi"])
+
+# --- CONSULTAZIONE ---
+def archivi(path):
+    base, est = os.path.splitext(path)
+    return sorted(glob.glob(f"{base}-*{est}") + glob.glob(f"{base}-*{est}.gz"))
+
+def leggi_eventi(path=LOG_DEFAULT["log_file"]):
+    """Tutti gli eventi, dal più vecchio (archivi compressi compresi)"""
+    for file in archivi(path) + [path]:
+        apri = gzip.open if file.endswith(".gz") else open
+        try:
+            with apri(file, "rt", encoding="utf-8") as f:
+                for riga in f:
+                    try:
+                        yield json.loads(riga)
+                    except ValueError:
+                        pass  # riga troncata da un arresto improvviso
+        except OSError:
+            pass
+
+def ultimi(n=20, path=LOG_DEFAULT["log_file"]):
+    from collections import deque
+    return list(deque(leggi_eventi(path), maxlen=n))
+
+def piu_lenti(n=10, fase="totale", path=LOG_DEFAULT["log_file"]):
+    import heapq
+    con_latenza = (e for e in leggi_eventi(path) if fase in (e.get("latenze") or {}))
+    return heapq.nlargest(n, con_latenza, key=lambda e: e["latenze"][fase])
+
+def _stampa(evento):
+    latenze = " ".join(f"{k}={v * 1000:.0f}ms" for k, v in (evento.get("latenze") or {}).items())
+    print(f"[{evento['ts']}] {evento.get('intento') or '-'}: {evento.get('testo', '')!r} -> "
+          f"{evento.get('esito', '')!r} {latenze}")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    path = args[args.index("--file") + 1] if "--file" in args else LOG_DEFAULT["log_file"]
+    if "--lenti" in args:
+        fase = args[args.index("--fase") + 1] if "--fase" in args else "totale"
+        for evento in piu_lenti(int(args[args.index("--lenti") + 1]), fase, path):
+            _stampa(evento)
+    else:
+        n = int(args[args.index("--ultimi") + 1]) if "--ultimi" in args else 20
+        for evento in ultimi(n, path):
+            _stampa(evento)
@@ -0,0 +1,193 @@
+"""KRIS - Trascrizioni in coda servite a lotti.
+
+Le richieste di trascrizione (comandi dal demone da più front-end, passi
+della dettatura in tempo reale, ridecodifiche) arrivano al servizio da thread
+diversi e ognuna riceve un Future. Un solo thread decodifica: prende la
+prima clip in attesa, aspetta al massimo "lotto_attesa_ms" che ne arrivino
+altre con le stesse opzioni e le passa insieme (fino a "lotto_dimensione") a
+`trascrivi_lotto` del backend, un solo passaggio di encoder e decoder.
+
+Con attesa 0 (default) una richiesta da sola non aspetta niente: il lotto è
+fatto da quello che si è accumulato mentre il modello lavorava sul precedente.
+
+    python kris_lotti.py clip.wav [altre.wav] [--dimensioni 1,2,4,8] [--richieste 16] [--attesa-ms 0]
+                         [--modello base] [--backend whisper] [--finto]
+"""
+import sys
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+from kris_metriche import percentile
+from kris_trascrizione import Annullato
+
+DIMENSIONE_DEFAULT = 4
+ATTESA_MS_DEFAULT = 0.0
+
+class _Richiesta:
+    __slots__ = ("audio", "opzioni", "chiave", "annulla", "futuro", "arrivo")
+
+    def __init__(self, audio, opzioni, annulla):
+        self.audio = audio
+        self.opzioni = opzioni
+        self.chiave = repr(sorted(opzioni.items()))   # in un lotto solo richieste con le stesse opzioni
+        self.annulla = annulla
+        self.futuro = Future()
+        self.arrivo = time.monotonic()
+
+class _TuttiAnnullati:
+    """Come threading.Event per il backend: il lotto si ferma solo se lo annullano tutti"""
+
+    def __init__(self, eventi):
+        self.eventi = eventi
+
+    def is_set(self):
+        return all(e is not None and e.is_set() for e in self.eventi)
+
+class ServizioLotti:
+    def __init__(self, decodifica_lotto, dimensione=DIMENSIONE_DEFAULT, attesa_ms=ATTESA_MS_DEFAULT, metriche=None):
+        """`decodifica_lotto(audios, annulla, **opzioni)` -> un risultato per clip"""
+        self.decodifica_lotto = decodifica_lotto
+        self.dimensione = dimensione
+        self.attesa_ms = attesa_ms
+        self.metriche = metriche
+        self._attesa = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def imposta_config(self, config):
+        self.imposta(config.get("lotto_dimensione", DIMENSIONE_DEFAULT),
+                     config.get("lotto_attesa_ms", ATTESA_MS_DEFAULT))
+
+    def imposta(self, dimensione, attesa_ms):
+        with self._cond:
+            self.dimensione, self.attesa_ms = max(1, int(dimensione)), max(0.0, float(attesa_ms))
+            self._cond.notify()
+
+    def invia(self, audio, annulla=None, **opzioni):
+        """Clip in coda -> Future col risultato del backend (Annullato se `annulla` è impostato prima)"""
+        richiesta = _Richiesta(audio, opzioni, annulla)
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._ciclo, daemon=True)
+                self._thread.start()
+            self._attesa.append(richiesta)
+            self._cond.notify()
+        return richiesta.futuro
+
+    def trascrivi(self, audio, annulla=None, **opzioni):
+        return self.invia(audio, annulla, **opzioni).result()
+
+    def _prossimo_lotto(self):
+        with self._cond:
+            while not self._attesa:
+                self._cond.wait()
+            chiave = self._attesa[0].chiave
+            scadenza = self._attesa[0].arrivo + self.attesa_ms / 1000
+            while sum(r.chiave == chiave for r in self._attesa) < self.dimensione:
+                resto = scadenza - time.monotonic()
+                if resto <= 0:
+                    break
+                self._cond.wait(resto)
+            lotto, rimasti = [], deque()
+            for r in self._attesa:
+                (lotto if r.chiave == chiave and len(lotto) < self.dimensione else rimasti).append(r)
+            self._attesa = rimasti
+            return lotto
+
+    def _ciclo(self):
+        while True:
+            lotto = self._prossimo_lotto()
+            for r in [r for r in lotto if r.annulla is not None and r.annulla.is_set()]:
+                lotto.remove(r)
+                r.futuro.set_exception(Annullato())
+            if not lotto:
+                continue
+            t0 = time.perf_counter()
+            try:
+                risultati = self.decodifica_lotto([r.audio for r in lotto], _TuttiAnnullati([r.annulla for r in lotto]),
+                                                  **lotto[0].opzioni)
+            except Exception as e:
+                for r in lotto:
+                    r.futuro.set_exception(e)
+                continue
+            if self.metriche is not None:
+                self.metriche.registra(f"lotto_{len(lotto)}", time.perf_counter() - t0)
+            for r, risultato in zip(lotto, risultati):
+                if r.annulla is not None and r.annulla.is_set():
+                    r.futuro.set_exception(Annullato())
+                else:
+                    r.futuro.set_result(risultato)
+
+# --- MISURA: clip al secondo e latenza per dimensione del lotto ---
+class _BackendFinto:
+    """Costo fisso per passaggio più un costo per clip: come un modello su CPU, senza modello"""
+
+    def __init__(self, fisso=0.2, per_clip=0.05):
+        self.fisso, self.per_clip = fisso, per_clip
+
+    def trascrivi_lotto(self, audios, language="it", annulla=None, **opzioni):
+        time.sleep(self.fisso + self.per_clip * len(audios))
+        return [{"text": f"clip di {len(a) / 16000:.1f} s",
+                 "segments": [{"text": f"clip di {len(a) / 16000:.1f} s", "start": 0.0, "end": len(a) / 16000}]}
+                for a in audios]
+
+    def descrizione(self):
+        return f"finto {self.fisso * 1000:.0f} ms + {self.per_clip * 1000:.0f} ms/clip"
+
+def misura(backend, clip, dimensioni=(1, 2, 4, 8), richieste=16, attesa_ms=ATTESA_MS_DEFAULT, language="it"):
+    """Tutte le richieste inviate insieme, per ogni dimensione: {dimensione: {clip_s, p50_ms, p95_ms}}"""
+    risultati = {}
+    for dimensione in dimensioni:
+        servizio = ServizioLotti(lambda audios, annulla, **o: backend.trascrivi_lotto(audios, language, annulla, **o),
+                                 dimensione, attesa_ms)
+        latenze = []
+        fatti = threading.Semaphore(0)
+
+        def _finito(futuro, t0):
+            latenze.append(time.perf_counter() - t0)
+            fatti.release()
+        t_inizio = time.perf_counter()
+        for i in range(richieste):
+            t0 = time.perf_counter()
+            servizio.invia(clip[i % len(clip)]).add_done_callback(lambda f, t0=t0: _finito(f, t0))
+        for _ in range(richieste):
+            fatti.acquire()
+        durata = time.perf_counter() - t_inizio
+        latenze.sort()
+        risultati[dimensione] = {"clip_s": round(richieste / durata, 2),
+                                 "p50_ms": round(percentile(latenze, 50) * 1000, 1),
+                                 "p95_ms": round(percentile(latenze, 95) * 1000, 1)}
+    return risultati
+
+def _opzione(args, nome, default):
+    if nome in args:
+        return args[args.index(nome) + 1]
+    return default
+
+if __name__ == "__main__":
+    import kris_vad
+    import kris_config
+    import kris_trascrizione
+    args = sys.argv[1:]
+    wav = [a for a in args if a.lower().endswith(".wav")]
+    if not wav:
+        print(__doc__)
+        sys.exit(2)
+    clip = [kris_vad.leggi_wav(path, 16000) for path in wav]
+    if "--finto" in args:
+        backend = _BackendFinto()
+    else:
+        config, _ = kris_config.carica("config.json", crea=False)
+        config["whisper_model"] = _opzione(args, "--modello", config["whisper_model"])
+        config["whisper_backend"] = _opzione(args, "--backend", config["whisper_backend"])
+        backend = kris_trascrizione.crea_backend(config)
+        backend.trascrivi_lotto(clip[:1])   # riscaldamento: il primo passaggio alloca tutto
+    print("Backend:", backend.descrizione())
+    dimensioni = [int(d) for d in _opzione(args, "--dimensioni", "1,2,4,8").split(",")]
+    report = misura(backend, clip, dimensioni, int(_opzione(args, "--richieste", 16)),
+                    float(_opzione(args, "--attesa-ms", ATTESA_MS_DEFAULT)))
+    print(f"{'lotto':>5} {'clip/s':>8} {'p50 ms':>9} {'p95 ms':>9}")
+    for dimensione, r in report.items():
+        print(f"{dimensione:>5} {r['clip_s']:>8} {r['p50_ms']:>9} {r['p95_ms']:>9}")
@@ -0,0 +1,120 @@
+"""KRIS - Tempi per fase: span leggeri con istogrammi mobili in memoria.
+
+    with metriche.fase("trascrizione", latenze):
+        ...
+
+Ogni fase tiene gli ultimi campioni (finestra mobile) da cui si ricavano
+p50/p95/massimo e un istogramma a fasce; `salva()` scrive il riepilogo in
+JSON (l'assistente lo fa all'uscita). Così si distingue un microfono lento
+da un modello lento o da un'app che ci mette a partire.
+
+    python kris_metriche.py logs/metriche.json
+"""
+import sys
+import json
+import time
+import threading
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+FINESTRA = 500  # campioni tenuti per fase
+FASCE_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+def percentile(ordinati, p):
+    if not ordinati:
+        return 0.0
+    k = (len(ordinati) - 1) * p / 100
+    i = int(k)
+    j = min(i + 1, len(ordinati) - 1)
+    return ordinati[i] + (ordinati[j] - ordinati[i]) * (k - i)
+
+class Metriche:
+    def __init__(self, finestra=FINESTRA):
+        self.finestra = finestra
+        self.campioni = {}     # fase -> deque dei secondi più recenti
+        self.conteggi = {}     # fase -> misure totali dall'avvio
+        self.ultime = {}       # fase -> ultima durata
+        self._lock = threading.Lock()
+
+    def registra(self, nome, secondi):
+        with self._lock:
+            if nome not in self.campioni:
+                self.campioni[nome] = deque(maxlen=self.finestra)
+                self.conteggi[nome] = 0
+            self.campioni[nome].append(secondi)
+            self.conteggi[nome] += 1
+            self.ultime[nome] = secondi
+
+    @contextmanager
+    def fase(self, nome, latenze=None):
+        """Misura il blocco; se `latenze` è un dict ci scrive anche la durata (per log e benchmark)"""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            durata = time.perf_counter() - t0
+            self.registra(nome, durata)
+            if latenze is not None:
+                latenze[nome] = durata
+
+    def primo_blocco(self, blocchi, latenze=None, nome="microfono"):
+        """Inoltra i blocchi audio misurando quanto arriva il primo (apertura dello stream)"""
+        t0 = time.perf_counter()
+        try:
+            for i, blocco in enumerate(blocchi):
+                if i == 0:
+                    durata = time.perf_counter() - t0
+                    self.registra(nome, durata)
+                    if latenze is not None:
+                        latenze[nome] = durata
+                yield blocco
+        finally:
+            close = getattr(blocchi, "close", None)
+            if close:
+                close()
+
+    def riepilogo(self):
+        """{fase: {n, ultimo_ms, p50_ms, p95_ms, max_ms, istogramma}} sulla finestra mobile"""
+        with self._lock:
+            copie = {nome: (sorted(c), self.conteggi[nome], self.ultime[nome]) for nome, c in self.campioni.items()}
+        risultato = {}
+        for nome, (ordinati, n, ultimo) in copie.items():
+            ms = [s * 1000 for s in ordinati]
+            istogramma = {}
+            for v in ms:
+                i = bisect_left(FASCE_MS, v)
+                fascia = f"<{FASCE_MS[i]}" if i < len(FASCE_MS) else f">={FASCE_MS[-1]}"
+                istogramma[fascia] = istogramma.get(fascia, 0) + 1
+            risultato[nome] = {
+                "n": n,
+                "ultimo_ms": round(ultimo * 1000, 1),
+                "p50_ms": round(percentile(ms, 50), 1),
+                "p95_ms": round(percentile(ms, 95), 1),
+                "max_ms": round(ms[-1], 1),
+                "istogramma": istogramma
+            }
+        return risultato
+
+    def salva(self, path):
+        dati = {"ts": datetime.now().astimezone().isoformat(timespec="seconds"), "fasi": self.riepilogo()}
+        if not dati["fasi"]:
+            return
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(dati, f, indent=2, ensure_ascii=False)
+        except OSError as e:
+            print("Errore salvataggio metriche:", e)
+
+def riga_latenze(latenze):
+    """{fase: secondi} -> "acquisizione 2100 | trascrizione 850 ms" per il display"""
+    return " | ".join(f"{fase} {s * 1000:.0f}" for fase, s in latenze.items()) + " ms"
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "logs/metriche.json"
+    with open(path, "r", encoding="utf-8") as f:
+        dati = json.load(f)
+    print(f"Metriche del {dati['ts']}")
+    for nome, s in sorted(dati["fasi"].items(), key=lambda x: -x[1]["p95_ms"]):
+        print(f"  {nome:20s} n={s['n']:<6d} p50 {s['p50_ms']:8.1f} ms  p95 {s['p95_ms']:8.1f} ms  max {s['max_ms']:8.1f} ms")
@@ -0,0 +1,78 @@
+"""KRIS - Due modalità di trascrizione: comando (veloce) e dettatura (accurata).
+
+Quasi tutto ciò che si dice a KRIS è un comando breve ("salva nota", "apri
+calcolatrice"): per questi basta il modello piccolo (config
+"whisper_model_comandi") con decodifica greedy, pochi token e un prompt con le
+frasi dei comandi registrati e personalizzati, che spinge Whisper verso il
+vocabolario giusto. La modalità dettatura usa il modello principale con beam
+search.
+
+In "auto" (config "trascrizione_modalita") si prova prima la modalità comando;
+si ridecodifica in dettatura quando:
+- l'audio è più lungo di DURATA_COMANDO_S (è dettatura, inutile provare)
+- la confidenza è bassa (avg_logprob, ripetizioni, testo vuoto con parlato)
+- la decodifica ha esaurito i token o il testo non è un comando riconosciuto
+- il comando porta un testo libero ("scrivi ...", "cerca nelle note ...")
+
+    testo, modalita, motivo = trascrivi(audio, decodifica, registro)
+"""
+import kris_comandi
+from kris_scelte import MODALITA
+
+DURATA_COMANDO_S = 5.0
+MAX_TOKEN_COMANDO = 32
+PROMPT_CARATTERI = 400       # il prompt di Whisper tiene al massimo 224 token
+SOGLIA_LOGPROB = -0.8
+SOGLIA_COMPRESSIONE = 2.4
+SOGLIA_SILENZIO = 0.6
+PAROLE_ARGOMENTO = 3         # argomenti più lunghi sono testo libero: meglio il modello grande
+
+OPZIONI_DETTATURA = {"beam_size": 5, "best_of": 5}
+
+def prompt_comandi(registro):
+    """Frasi dei comandi come prompt: "Kris, scrivi, salva nota, apri, ..." (troncato a PROMPT_CARATTERI)"""
+    prompt = "Kris"
+    for frase in registro.frasi():
+        if len(prompt) + len(frase) + 2 > PROMPT_CARATTERI:
+            break
+        prompt += ", " + frase
+    return prompt + "."
+
+def opzioni_comando(prompt):
+    return {"beam_size": 1, "temperature": 0.0, "max_token": MAX_TOKEN_COMANDO,
+            "initial_prompt": prompt, "condition_on_previous_text": False}
+
+def motivo_dettatura(risultato, intento):
+    """Perché il risultato della modalità comando va ridecodificato in dettatura; None se va bene"""
+    segmenti = risultato.get("segments") or []
+    if not risultato["text"].strip():
+        silenzio = min((s.get("no_speech_prob", 0.0) for s in segmenti), default=1.0)
+        return None if silenzio >= SOGLIA_SILENZIO else "vuota"
+    if any(s.get("avg_logprob", 0.0) < SOGLIA_LOGPROB for s in segmenti):
+        return "confidenza"
+    if any(s.get("compression_ratio", 0.0) > SOGLIA_COMPRESSIONE for s in segmenti):
+        return "ripetizioni"
+    if sum(len(s.get("tokens") or ()) for s in segmenti) >= MAX_TOKEN_COMANDO:
+        return "troncata"
+    if intento is None:
+        return "non_riconosciuto"
+    if intento.nome not in (kris_comandi.BLOCCATO, kris_comandi.PERSONALIZZATO) and \
+            len(intento.argomenti.split()) > PAROLE_ARGOMENTO:
+        return "testo_libero"
+    return None
+
+def trascrivi(audio, decodifica, registro, modalita="auto", samplerate=16000):
+    """`decodifica(audio, modalita, **opzioni)` -> risultato del backend.
+    Ritorna (testo, modalità usata, motivo del passaggio alla dettatura o None)."""
+    motivo = None
+    if modalita != "dettatura":
+        if modalita == "auto" and len(audio) > DURATA_COMANDO_S * samplerate:
+            motivo = "lunga"
+        else:
+            risultato = decodifica(audio, "comando", **opzioni_comando(prompt_comandi(registro)))
+            if modalita == "comando":
+                return risultato["text"], "comando", None
+            motivo = motivo_dettatura(risultato, registro.riconosci(risultato["text"].strip().lower()))
+            if motivo is None:
+                return risultato["text"], "comando", None
+    return decodifica(audio, "dettatura", **OPZIONI_DETTATURA)["text"], "dettatura", motivo
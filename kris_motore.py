@@ -0,0 +1,421 @@
+"""KRIS - Motore dell'assistente, separato dall'interfaccia grafica.
+
+Tiene il modello Whisper, la grammatica dei comandi, l'archivio note e lo
+stato della sessione (testo dettato, lettura email). La GUI, il demone HTTP
+(kris_daemon.py) e il benchmark usano tutti questa classe: il modello si
+carica una volta sola e serve qualsiasi front-end.
+
+    motore = MotoreKris(config, parla=speak)
+    motore.avvia_caricamento()
+    motore.gestisci(testo="apri blocco note")
+    motore.gestisci(audio=pcm_float32_16khz)
+
+I comandi brevi sono trascritti col modello piccolo in modalità comando, il
+resto (o un comando poco sicuro) col modello principale: vedi kris_modalita.py.
+Le decodifiche richieste insieme da più thread (demone, dettatura) passano a
+lotti da kris_lotti.py.
+"""
+import os
+import time
+import threading
+
+import numpy as np
+
+import kris_app
+import kris_vad
+import kris_note
+import kris_buffer
+import kris_lotti
+import kris_comandi
+import kris_modalita
+import kris_metriche
+import kris_risposte
+import kris_trascrizione
+
+SAMPLERATE = 16000  # Whisper lavora a 16 kHz mono
+PRIORITA_LETTURA = 2  # come kris_voce.PRIORITA_LETTURA, senza importare pyttsx3
+
+def parametri_modelli(config):
+    """(parametri del modello principale, parametri del modello dei comandi)"""
+    return kris_trascrizione.parametri_da_config(config), kris_trascrizione.parametri_comandi(config)
+
+def audio_per_whisper(audio):
+    """Buffer float32 mono contiguo: Whisper calcola il log-mel direttamente dall'array"""
+    audio = np.squeeze(np.asarray(audio))
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    return np.ascontiguousarray(audio, dtype=np.float32)
+
+def ascolta(config, metriche, sorgente=None, latenze=None):
+    """Blocchi audio (microfono se None) fino al silenzio finale -> float32 mono 16 kHz"""
+    if sorgente is None:
+        sorgente = kris_vad.blocchi_microfono(SAMPLERATE)
+    with metriche.fase("acquisizione", latenze):
+        return kris_vad.ascolta(metriche.primo_blocco(sorgente, latenze), SAMPLERATE,
+                                **kris_vad.parametri_da_config(config))
+
+class MotoreKris:
+    def __init__(self, config, parla=None, metriche=None, eventi=None):
+        """`parla(testo, priorita)`: sintesi vocale locale, None per i demoni senza voce.
+        `eventi`: kris_log.RegistroEventi in cui registrare ogni comando (opzionale)."""
+        self.config = config
+        self.parla = parla
+        self.metriche = metriche or kris_metriche.Metriche()
+        self.eventi = eventi
+        # Applicazioni installate, indicizzate in background; apri_app è sostituibile (benchmark, prove)
+        self.indice_app = kris_app.IndiceApp(config.get("app_indice", kris_app.INDICE_DEFAULT))
+        self.apri_app = self.indice_app.apri
+        # Stato della sessione; il testo dettato ha un diario su disco e sopravvive ai crash
+        self.dettato = kris_buffer.BufferDettatura(config.get("dettatura_diario", kris_buffer.DIARIO_DEFAULT))
+        self.leggi_email = True
+        self.ultimo_comando = ""
+        self.ultimo_intento = None
+        self._lock = threading.RLock()          # comandi e stato
+        self._lock_modello = threading.Lock()   # un'inferenza alla volta
+        self._lock_ricarica = threading.Lock()
+        # Grammatica e note
+        self.registro = kris_comandi.RegistroComandi()
+        kris_comandi.registra_predefiniti(self.registro)
+        self.archivio_note = kris_note.ArchivioNote(config.get("note_dir", "note"))
+        # Domande ("cerca ..."): risposta generata in background e letta una frase alla volta
+        self.risposte = kris_risposte.Risponditore(config, self.archivio_note)
+        self.al_risposta = None   # funzione(frase), dal thread della risposta (display della GUI)
+        self._annulla_risposta = threading.Event()
+        # Modelli (caricati in background): principale per la dettatura, piccolo per i comandi (anche lo stesso)
+        self.model = None
+        self.model_comandi = None
+        self.model_pronto = threading.Event()
+        self.model_errore = None
+        # Decodifiche chieste insieme da più thread: un passaggio del modello per tutte
+        self.lotti = kris_lotti.ServizioLotti(self._decodifica_lotto, metriche=self.metriche)
+        self.lotti.imposta_config(config)
+        self.tempo_caricamento_modello = None
+        self.ultimo_uso = None          # time.monotonic() dell'ultima decodifica (None se scaricato)
+        self.scaricato = False          # rilasciato per inattività (kris_risorse): si ricarica al prossimo uso
+        self._lock_risveglio = threading.Lock()
+        self._parametri_modello = None  # modello, backend, precisione e thread dei due modelli in uso
+        self.aggiorna_config(config)
+
+    # --- MODELLO ---
+    def carica_modello(self, opzioni=None):
+        """Carica il backend di trascrizione (config, più eventuali `opzioni`); False se fallisce"""
+        t0 = time.perf_counter()
+        try:
+            config = {**self.config, **(opzioni or {})}
+            self.model, self.model_comandi, self._parametri_modello = self._crea_modelli(config)
+            self.model_errore = None
+            self.ultimo_uso = time.monotonic()
+            self.tempo_caricamento_modello = time.perf_counter() - t0
+            self.metriche.registra("caricamento_modello", self.tempo_caricamento_modello)
+        except Exception as e:
+            self.model = self.model_comandi = None
+            self.model_errore = e
+            print("Errore nel caricamento di Whisper:", e)
+        finally:
+            self.model_pronto.set()
+        return self.model is not None
+
+    def _crea_modelli(self, config):
+        """(modello principale, modello dei comandi, parametri). Riusa i modelli già caricati con gli stessi
+        parametri; se il modello dei comandi non si carica, i comandi usano il principale."""
+        parametri = parametri_modelli(config)
+        caricati = []
+        if self._parametri_modello is not None:
+            caricati = [(self._parametri_modello[0], self.model), (self._parametri_modello[1], self.model_comandi)]
+
+        def _caricato(p):
+            return next((m for q, m in caricati if q == p and m is not None), None)
+        model = _caricato(parametri[0]) or kris_trascrizione.crea_backend({**config, **parametri[0]})
+        if parametri[1] == parametri[0]:
+            return model, model, parametri
+        model_comandi = _caricato(parametri[1])
+        if model_comandi is None:
+            try:
+                model_comandi = kris_trascrizione.crea_backend({**config, **parametri[1]})
+            except Exception as e:
+                print("Errore nel caricamento del modello dei comandi, uso quello principale:", e)
+                model_comandi = model
+        return model, model_comandi, parametri
+
+    def avvia_caricamento(self):
+        threading.Thread(target=self.carica_modello, daemon=True).start()
+        self.indice_app.avvia()
+
+    def _ricarica_modello(self):
+        """Modello cambiato in config: il nuovo si carica in background, il vecchio risponde fino allo scambio"""
+        with self._lock_ricarica:
+            try:
+                if parametri_modelli(self.config) == self._parametri_modello:
+                    return
+                t0 = time.perf_counter()
+                nuovi = self._crea_modelli(self.config)
+            except Exception as e:
+                print("Errore nel caricamento di Whisper, resta il modello precedente:", e)
+                return
+            with self._lock_modello:
+                self.model, self.model_comandi, self._parametri_modello = nuovi
+            self.tempo_caricamento_modello = time.perf_counter() - t0
+            self.metriche.registra("caricamento_modello", self.tempo_caricamento_modello)
+            print("Modello vocale ricaricato:", self.model.descrizione())
+
+    def rilascia_modello(self, usato_prima_di=None):
+        """Scarica i modelli Whisper (inattività); tornano al prossimo uso. False se stanno lavorando o se
+        sono stati usati dopo `usato_prima_di` (time.monotonic()): un risveglio arrivato dopo il controllo
+        di kris_risorse li tiene caricati."""
+        with self._lock_risveglio:
+            if not self._lock_modello.acquire(blocking=False):
+                return False
+            try:
+                if self.model is None:
+                    return False
+                if usato_prima_di is not None and (self.ultimo_uso is None or self.ultimo_uso > usato_prima_di):
+                    return False
+                self.model = self.model_comandi = None
+                self._parametri_modello = None
+                self.ultimo_uso = None
+                self.scaricato = True
+                self.model_pronto.clear()
+            finally:
+                self._lock_modello.release()
+        return True
+
+    def risveglia(self):
+        """Sta per arrivare audio ("Parla", parola di attivazione): se i modelli sono stati scaricati
+        ricominciano a caricarsi subito, mentre l'utente parla"""
+        with self._lock_risveglio:
+            if not self.scaricato:
+                if self.model is not None:
+                    self.ultimo_uso = time.monotonic()
+                return
+            self.scaricato = False
+        threading.Thread(target=self.carica_modello, daemon=True).start()
+
+    def stato(self):
+        return {
+            # Scaricato per inattività conta come pronto: si ricarica da solo alla prima richiesta
+            "pronto": self.model_pronto.is_set() or self.scaricato,
+            "scaricato": self.scaricato,
+            "modello": self.model.descrizione() if self.model is not None else None,
+            "modello_comandi": self.model_comandi.descrizione() if self.model_comandi is not None else None,
+            "errore": str(self.model_errore) if self.model_errore else None,
+            "caricamento_s": round(self.tempo_caricamento_modello, 2) if self.tempo_caricamento_modello else None
+        }
+
+    # --- AUDIO ---
+    def ascolta(self, sorgente=None, latenze=None):
+        return ascolta(self.config, self.metriche, sorgente, latenze)
+
+    def attendi_modello(self, latenze=None, annulla=None):
+        """L'ascolto può iniziare mentre il modello sta ancora caricando; False se il modello non c'è"""
+        self.risveglia()
+        with self.metriche.fase("attesa_modello", latenze):
+            while not self.model_pronto.wait(0.1):
+                if annulla is not None and annulla.is_set():
+                    raise kris_trascrizione.Annullato()
+        return self.model is not None
+
+    def decodifica(self, audio, annulla=None, modalita="dettatura", **opzioni):
+        """Risultato completo del backend ({text, segments}); il modello deve essere pronto.
+        `annulla`: threading.Event che interrompe la decodifica con kris_trascrizione.Annullato;
+        `modalita`: "comando" usa il modello dei comandi"""
+        # Niente temp.wav: il buffer in memoria va a Whisper senza passare da disco e ffmpeg
+        audio = audio_per_whisper(audio)
+        if self.lotti.dimensione > 1:
+            return self.lotti.trascrivi(audio, annulla, modalita=modalita, **opzioni)
+        return self._decodifica_lotto([audio], annulla, modalita, **opzioni)[0]
+
+    def _decodifica_lotto(self, audios, annulla=None, modalita="dettatura", **opzioni):
+        # Modello rilasciato per inattività fra l'attesa e la decodifica: si ricarica qui
+        if self.model is None and not self.attendi_modello(annulla=annulla):
+            raise RuntimeError(f"Modello vocale non disponibile: {self.model_errore}")
+        with self._lock_modello:
+            model = self.model_comandi if modalita == "comando" and self.model_comandi is not None else self.model
+            if model is None:
+                raise RuntimeError("Modello vocale non disponibile")
+            try:
+                if len(audios) == 1:
+                    return [model.trascrivi(audios[0], self.config.get("language", "it"), annulla, **opzioni)]
+                return model.trascrivi_lotto(audios, self.config.get("language", "it"), annulla, **opzioni)
+            finally:
+                self.ultimo_uso = time.monotonic()
+
+    def trascrivi(self, audio, latenze=None, annulla=None):
+        if audio.size == 0:
+            return ""
+        if not self.attendi_modello(latenze, annulla):
+            return f"[Modello vocale non disponibile: {self.model_errore}]"
+        latenze = {} if latenze is None else latenze
+
+        def _decodifica(audio, modalita, **opzioni):
+            with self.metriche.fase("trascrizione_" + modalita, latenze):
+                return self.decodifica(audio, annulla, modalita, **opzioni)
+        with self.metriche.fase("trascrizione", latenze):
+            testo, _, motivo = kris_modalita.trascrivi(audio, _decodifica, self.registro,
+                                                       self.config.get("trascrizione_modalita", "auto"), SAMPLERATE)
+        if motivo is not None and "trascrizione_comando" in latenze:
+            # Tempo della modalità comando sprecato, per motivo: dice quali soglie costano di più
+            self.metriche.registra("ridecodifica_" + motivo, latenze["trascrizione_comando"])
+        return testo
+
+    # --- PUNTO DI INGRESSO PER TUTTI I FRONT-END ---
+    def gestisci(self, testo=None, audio=None, latenze=None, annulla=None):
+        """Comando testuale o audio (float32 mono 16 kHz) -> {trascrizione, risposta, intento, latenze}"""
+        latenze = {} if latenze is None else latenze
+        t_inizio = time.perf_counter()
+        if testo is None:
+            try:
+                testo = self.trascrivi(audio_per_whisper(audio), latenze, annulla)
+            except kris_trascrizione.Annullato:
+                raise
+            except Exception as e:
+                testo = f"[Errore trascrizione: {e}]"
+        testo = testo.strip().lower()
+        with self._lock:
+            self.ultimo_intento = None
+            if not testo:
+                risposta = "[Nessun comando rilevato]"
+            else:
+                with self.metriche.fase("comando", latenze):
+                    risposta = self.processa_comando(testo)
+                self.ultimo_comando = testo
+            intento = self.ultimo_intento
+        latenze["totale"] = time.perf_counter() - t_inizio
+        if self.eventi is not None:
+            self.eventi.registra(testo=testo, intento=intento, latenze=latenze, esito=risposta)
+        return {"trascrizione": testo, "risposta": risposta, "intento": intento,
+                "latenze": {k: round(v, 4) for k, v in latenze.items()}}
+
+    def aggiorna_config(self, config):
+        """Applica blacklist, comandi personalizzati, alias delle app e cartella note senza riavviare;
+        se cambia uno dei modelli Whisper lo ricarica in background"""
+        with self._lock:
+            self.config = config
+            self.registro.imposta_blacklist(config.get("blacklist", []))
+            self.registro.imposta_personalizzati(config.get("custom_commands", {}))
+            self.indice_app.imposta_alias({"browser": config.get("browser", "brave"), **config.get("app_alias", {})})
+            note_dir = config.get("note_dir", "note")
+            if note_dir != self.archivio_note.cartella:
+                self.archivio_note = kris_note.ArchivioNote(note_dir)
+            self.risposte.imposta_config(config, self.archivio_note)
+            self.lotti.imposta_config(config)
+        try:
+            cambiato = parametri_modelli(config) != self._parametri_modello
+        except ValueError:
+            cambiato = False
+        if self._parametri_modello is not None and cambiato:
+            threading.Thread(target=self._ricarica_modello, daemon=True).start()
+
+    # --- COMANDI ---
+    def processa_comando(self, text):
+        intento = self.registro.riconosci(text)
+        self.ultimo_intento = intento.nome if intento else None
+        if intento is None:
+            return "[Comando non riconosciuto]"
+        if intento.nome == kris_comandi.BLOCCATO:
+            return "[Comando bloccato]"
+        if intento.nome == kris_comandi.PERSONALIZZATO:
+            return intento.argomenti
+        return getattr(self, "cmd_" + intento.nome)(intento.argomenti)
+
+    @property
+    def testo_corrente(self):
+        return self.dettato.testo()
+
+    def aggiungi_testo(self, testo, continua=False):
+        """Testo dettato in coda a quello corrente. La dettatura in tempo reale lo manda parola per parola
+        con `continua`: resta un segmento solo (una riga, un "annulla ultima frase") fino a `chiudi_testo`."""
+        self.dettato.aggiungi(testo, continua)
+
+    def chiudi_testo(self):
+        self.dettato.chiudi_segmento()
+
+    # --- GESTORI DEI COMANDI (uno per intento del registro) ---
+    def cmd_scrivi(self, argomenti):
+        self.aggiungi_testo(argomenti)
+        return "Testo aggiunto."
+
+    def cmd_salva_nota(self, argomenti):
+        # Il diario della dettatura diventa la nota: niente da riscrivere
+        path = self.dettato.finalizza(self.archivio_note)
+        if path is None:
+            return "Nessun testo da salvare."
+        return f"Nota salvata in {path}"
+
+    def cmd_annulla_ultimo(self, argomenti):
+        tolto = self.dettato.annulla_ultimo()
+        if tolto is None:
+            return "Niente da annullare."
+        return f"Tolto: {tolto}"
+
+    def cmd_apri(self, argomenti):
+        with self.metriche.fase("apri_app"):
+            return self.apri_app(argomenti)
+
+    def cmd_cerca_note(self, argomenti):
+        if not argomenti:
+            return "Cosa cerco nelle note?"
+        risultati = self.archivio_note.cerca(argomenti, 3)
+        if not risultati:
+            return f"Nessuna nota trovata per: {argomenti}"
+        righe = [f"{os.path.basename(path)}: {anteprima}" for _, path, anteprima in risultati]
+        return f"Note trovate: {len(risultati)}.\n" + "\n".join(righe)
+
+    def cmd_cerca(self, argomenti):
+        if not argomenti:
+            return "Cosa cerco?"
+        pronta = self.risposte.in_cache(argomenti)
+        if pronta is not None:
+            return " ".join(pronta)
+        if self.parla is None:
+            try:
+                return self.risposte.rispondi(argomenti)  # senza voce locale la risposta intera torna al client
+            except Exception as e:
+                return f"Errore nella risposta: {e}"
+        self.interrompi_risposta()
+        annulla = self._annulla_risposta = threading.Event()
+        threading.Thread(target=self._rispondi, args=(argomenti, annulla), daemon=True).start()
+        return "Sto cercando..."
+
+    def _rispondi(self, domanda, annulla):
+        """Thread della risposta: alla prima domanda crea anche il backend (un modello GGUF si carica qui,
+        non sotto il lock del motore); ogni frase è letta (e mostrata) appena il backend la completa"""
+        t0 = time.perf_counter()
+        prima = []
+
+        def _al_frase(frase):
+            if annulla.is_set():
+                raise kris_trascrizione.Annullato()
+            if not prima:
+                prima.append(frase)
+                self.metriche.registra("risposta_prima_frase", time.perf_counter() - t0)
+            self.parla(frase, PRIORITA_LETTURA)
+            if self.al_risposta is not None:
+                self.al_risposta(frase)
+        try:
+            with self.metriche.fase("risposta_completa"):
+                self.risposte.rispondi(domanda, _al_frase, annulla)
+        except kris_trascrizione.Annullato:
+            pass
+        except Exception as e:
+            self.parla(f"Errore nella risposta: {e}", 0)
+
+    def interrompi_risposta(self):
+        """Ferma la generazione della risposta in corso (barge-in, Esc)"""
+        self._annulla_risposta.set()
+
+    def cmd_non_leggere_email(self, argomenti):
+        self.leggi_email = False
+        return "Lettura email disattivata."
+
+    def cmd_leggi_tutto(self, argomenti):
+        testo = self.dettato.testo()
+        if not testo:
+            return "Nessun testo da leggere."
+        if self.parla is None:
+            return testo  # senza voce locale il testo torna al client
+        self.parla(testo, PRIORITA_LETTURA)
+        return "[Sintesi vocale avviata]"
+
+    def cmd_esci(self, argomenti):
+        # La chiusura spetta al front-end (intento "esci")
+        return "Arrivederci!"
@@ -0,0 +1,213 @@
+"""KRIS - Archivio note con indice full-text incrementale (BM25).
+
+Le note restano file .txt in note_dir; i nomi non collidono mai (due
+salvataggi nello stesso secondo diventano _2, _3...). L'indice invertito è
+salvato in note_dir/.indice.json e alla prima ricerca viene riallineato
+guardando solo le date di modifica dei file: si rileggono soltanto le note
+nuove o cambiate.
+
+    python kris_note.py "lista della spesa" [--dir note]
+"""
+import os
+import sys
+import json
+import math
+import time
+import atexit
+import shutil
+import threading
+
+from kris_testo import parole
+
+# Parole troppo comuni per distinguere una nota dall'altra
+STOPWORD = set("""
+a ad al alla alle allo ai agli all anche che chi ci come con da dal dalla dalle dai degli dei del della
+delle dello di e ed gli ha hai ho i il in io la le lei li lo loro lui ma mi mia mio ne nei nel nella
+nelle nello noi non o per piu poi se si sia sono su sua sue sui sul sulla suo ti tra tu tua tuo un una
+uno vi voi
+""".split())
+
+K1 = 1.2
+B = 0.75
+
+def termini(testo):
+    """Token senza accenti, senza stopword, con una radice leggera (gatto/gatti/gatta -> gatt)"""
+    risultato = []
+    for parola in parole(testo):
+        if parola in STOPWORD:
+            continue
+        if len(parola) >= 5 and parola[-1] in "aeio":
+            parola = parola[:-1]
+        risultato.append(parola)
+    return risultato
+
+class ArchivioNote:
+    VERSIONE = 1
+
+    def __init__(self, cartella="note"):
+        self.cartella = cartella
+        self.path_indice = os.path.join(cartella, ".indice.json")
+        os.makedirs(cartella, exist_ok=True)
+        self._lock = threading.RLock()
+        self.documenti = {}    # nome file -> {"mtime", "lunghezza", "termini": {termine: frequenza}}
+        self.postings = {}     # termine -> {nome file: frequenza}
+        self.lunghezza_totale = 0
+        self._allineato = False
+        self._modificato = False
+        self._carica_indice()
+        atexit.register(self.salva_indice)
+
+    # --- SALVATAGGIO ---
+    def _crea_file(self):
+        """(nome, file aperto) con nome univoco: creazione esclusiva, _2, _3... nello stesso secondo"""
+        base = time.strftime("%Y%m%d_%H%M%S")
+        for n in range(1, 1000):
+            nome = f"{base}.txt" if n == 1 else f"{base}_{n}.txt"
+            try:
+                return nome, open(os.path.join(self.cartella, nome), "x", encoding="utf-8")
+            except FileExistsError:
+                continue
+        raise FileExistsError(f"Troppe note salvate in {base}")
+
+    def salva(self, testo):
+        """Nuova nota con nome univoco; aggiorna subito l'indice"""
+        nome, f = self._crea_file()
+        with f:
+            f.write(testo)
+        path = os.path.join(self.cartella, nome)
+        with self._lock:
+            self._indicizza(nome, testo, os.path.getmtime(path))
+        return path
+
+    def importa(self, sorgente, testo):
+        """Sposta un file già scritto (il diario della dettatura) fra le note senza riscriverlo;
+        `testo` è il suo contenuto, per l'indice"""
+        nome, f = self._crea_file()
+        f.close()
+        path = os.path.join(self.cartella, nome)
+        try:
+            os.replace(sorgente, path)  # stesso disco: un rename atomico
+        except OSError:
+            shutil.move(sorgente, path)
+        with self._lock:
+            self._indicizza(nome, testo, os.path.getmtime(path))
+        return path
+
+    # --- RICERCA ---
+    def cerca(self, query, n=5):
+        """[(punteggio, path, anteprima)] in ordine di pertinenza (BM25)"""
+        with self._lock:
+            self.allinea()
+            totale = len(self.documenti)
+            if not totale:
+                return []
+            media = self.lunghezza_totale / totale
+            punteggi = {}
+            for termine in set(termini(query)):
+                post = self.postings.get(termine)
+                if not post:
+                    continue
+                idf = math.log(1 + (totale - len(post) + 0.5) / (len(post) + 0.5))
+                for nome, tf in post.items():
+                    norm = K1 * (1 - B + B * self.documenti[nome]["lunghezza"] / media)
+                    punteggi[nome] = punteggi.get(nome, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+            migliori = sorted(punteggi.items(), key=lambda x: -x[1])[:n]
+        return [(p, os.path.join(self.cartella, nome), self.anteprima(nome)) for nome, p in migliori]
+
+    def anteprima(self, nome, caratteri=80):
+        try:
+            with open(os.path.join(self.cartella, nome), "r", encoding="utf-8") as f:
+                testo = " ".join(f.read(caratteri * 2).split())
+        except OSError:
+            return ""
+        return testo[:caratteri] + ("..." if len(testo) > caratteri else "")
+
+    # --- INDICE ---
+    def allinea(self):
+        """Riallinea l'indice alla cartella una volta per sessione: rilegge solo i file nuovi o modificati"""
+        with self._lock:
+            if self._allineato:
+                return
+            presenti = {}
+            with os.scandir(self.cartella) as voci:
+                for voce in voci:
+                    if voce.is_file() and voce.name.endswith(".txt"):
+                        presenti[voce.name] = voce.stat().st_mtime
+            for nome in set(self.documenti) - set(presenti):
+                self._rimuovi(nome)
+            for nome, mtime in presenti.items():
+                doc = self.documenti.get(nome)
+                if doc is None or doc["mtime"] != mtime:
+                    try:
+                        with open(os.path.join(self.cartella, nome), "r", encoding="utf-8", errors="replace") as f:
+                            self._indicizza(nome, f.read(), mtime)
+                    except OSError:
+                        pass
+            self._allineato = True
+            self.salva_indice()
+
+    def _indicizza(self, nome, testo, mtime):
+        self._rimuovi(nome)
+        frequenze = {}
+        lista = termini(testo)
+        for t in lista:
+            frequenze[t] = frequenze.get(t, 0) + 1
+        self._aggiungi(nome, {"mtime": mtime, "lunghezza": len(lista), "termini": frequenze})
+        self._modificato = True
+
+    def _aggiungi(self, nome, doc):
+        self.documenti[nome] = doc
+        self.lunghezza_totale += doc["lunghezza"]
+        for t, tf in doc["termini"].items():
+            self.postings.setdefault(t, {})[nome] = tf
+
+    def _rimuovi(self, nome):
+        doc = self.documenti.pop(nome, None)
+        if doc is None:
+            return
+        self.lunghezza_totale -= doc["lunghezza"]
+        for t in doc["termini"]:
+            post = self.postings.get(t)
+            if post is not None:
+                post.pop(nome, None)
+                if not post:
+                    del self.postings[t]
+        self._modificato = True
+
+    def _carica_indice(self):
+        try:
+            with open(self.path_indice, "r", encoding="utf-8") as f:
+                dati = json.load(f)
+        except (OSError, ValueError):
+            return
+        if dati.get("versione") != self.VERSIONE:
+            return
+        for nome, doc in dati.get("documenti", {}).items():
+            self._aggiungi(nome, doc)
+
+    def salva_indice(self):
+        with self._lock:
+            if not self._modificato:
+                return
+            tmp = self.path_indice + ".tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump({"versione": self.VERSIONE, "documenti": self.documenti}, f, ensure_ascii=False)
+                os.replace(tmp, self.path_indice)
+                self._modificato = False
+            except OSError as e:
+                print("Errore salvataggio indice note:", e)
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    cartella = "note"
+    if "--dir" in args:
+        i = args.index("--dir")
+        cartella = args[i + 1]
+        del args[i:i + 2]
+    archivio = ArchivioNote(cartella)
+    t0 = time.perf_counter()
+    risultati = archivio.cerca(" ".join(args))
+    print(f"{len(archivio.documenti)} note, ricerca in {(time.perf_counter() - t0) * 1000:.1f} ms")
+    for punteggio, path, anteprima in risultati:
+        print(f"{punteggio:6.2f}  {path}  {anteprima}")
@@ -0,0 +1,298 @@
+"""KRIS - Pipeline unica dei comandi vocali: cattura -> trascrizione -> comando -> voce.
+
+Un thread per fase, collegati da code limitate: il microfono ha un solo
+lettore, Whisper fa una sola decodifica alla volta e i risultati escono
+nell'ordine delle richieste. L'ultima fase è kris_voce.VoceWorker, che ha
+già la sua coda.
+
+Cosa succede premendo "Parla" mentre la pipeline è occupata (config
+"pipeline_politica"):
+- "annulla": la richiesta in corso è annullata (ascolto, decodifica Whisper e
+  lettura si fermano) e la nuova parte subito
+- "accoda": la nuova richiesta aspetta il suo turno (al massimo MAX_IN_ATTESA)
+- "unisci": le pressioni durante un'elaborazione valgono come una sola
+
+Con `invia(dettatura=True)` ascolto e trascrizione vanno insieme
+(kris_dettatura.py): ipotesi parziali durante la dettatura e parole stabili
+subito nel testo corrente.
+
+Il microfono è una fabbrica di blocchi sostituibile: con
+`fabbrica_blocchi=lambda: kris_vad.blocchi_da_wav(path)` la pipeline gira
+senza hardware.
+
+    pipeline = PipelineKris(motore, config, metriche, notifica=gui.evento)
+    richiesta = pipeline.invia()
+    richiesta.fatta.wait()
+"""
+import time
+import queue
+import itertools
+import threading
+
+import kris_vad
+import kris_motore
+import kris_dettatura
+from kris_scelte import POLITICHE
+from kris_trascrizione import Annullato
+
+MAX_IN_ATTESA = 3
+
+class Richiesta:
+    """Un comando che attraversa la pipeline; `annulla` la ferma in qualsiasi fase"""
+
+    def __init__(self, n, audio=None, testo=None, dettatura=False):
+        self.n = n
+        self.audio = audio
+        self.testo = testo
+        self.dettatura = dettatura
+        self.parziale = ("", "")   # dettatura: (testo confermato, coda provvisoria)
+        self.stato = "in_attesa"   # in_attesa, ascolto, trascrizione, comando, fatta
+        self.annulla = threading.Event()
+        self.fatta = threading.Event()
+        self.latenze = {}
+        self.risultato = None      # {trascrizione, risposta, intento, latenze} di MotoreKris.gestisci
+        self.t_inizio = time.perf_counter()
+
+def interrompibile(blocchi, annulla):
+    """Inoltra i blocchi audio finché `annulla` non è impostato, poi chiude la sorgente"""
+    try:
+        for blocco in blocchi:
+            if annulla.is_set():
+                raise Annullato()
+            yield blocco
+    finally:
+        close = getattr(blocchi, "close", None)
+        if close:
+            close()
+
+class PipelineKris:
+    def __init__(self, motore, config, metriche, notifica=None, interrompi_voce=None, fabbrica_blocchi=None,
+                 attendi_voce=None):
+        """`motore`: MotoreKris o kris_daemon.ClienteKris. `notifica(evento, richiesta)` è chiamata dai
+        thread della pipeline con "ascolto", "parziale", "trascrizione", "risultato" o "annullata".
+        `interrompi_voce()` ferma la lettura in corso (barge-in). `attendi_voce(annulla)` blocca finché
+        la voce non ha finito (es. "Dimmi Kris" detto all'evento "ascolto"): il microfono si apre dopo,
+        così il VAD non scambia la sintesi per parlato."""
+        self.motore = motore
+        self.config = config
+        self.metriche = metriche
+        self.notifica = notifica
+        self.interrompi_voce = interrompi_voce
+        self.attendi_voce = attendi_voce
+        self.fabbrica_blocchi = fabbrica_blocchi or (lambda: kris_vad.blocchi_microfono(kris_motore.SAMPLERATE))
+        self._ingresso = queue.Queue()                  # limitata dalla politica in invia()
+        self._da_trascrivere = queue.Queue(maxsize=1)   # la cattura successiva aspetta Whisper
+        self._da_eseguire = queue.Queue(maxsize=1)
+        self._attive = []                               # richieste non concluse, in ordine di arrivo
+        self._numeri = itertools.count(1)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def politica(self):
+        # Letta a ogni pressione: la ricarica a caldo della config vale subito
+        return self.config.get("pipeline_politica", "annulla")
+
+    def avvia(self):
+        if self._thread is None:
+            self._thread = [threading.Thread(target=fase, daemon=True)
+                            for fase in (self._cattura, self._trascrizione, self._comando)]
+            for t in self._thread:
+                t.start()
+        return self
+
+    def ferma(self):
+        self.annulla_tutto()
+        self._ingresso.put(None)
+
+    # --- RICHIESTE ---
+    def invia(self, audio=None, testo=None, dettatura=False):
+        """Nuova richiesta (senza audio né testo si ascolta il microfono; con `dettatura` in tempo reale).
+        Ritorna la Richiesta (con "unisci" quella già in attesa), None se scartata perché la coda è piena."""
+        self.avvia()
+        with self._lock:
+            attive = [r for r in self._attive if not r.annulla.is_set()]
+            politica = self.politica
+            if attive and politica == "unisci":
+                in_attesa = [r for r in attive if r.stato == "in_attesa"]
+                if in_attesa:
+                    return in_attesa[-1]
+            elif politica == "accoda" and len(attive) > MAX_IN_ATTESA:
+                return None
+            if politica == "annulla":
+                for r in attive:
+                    r.annulla.set()
+            richiesta = Richiesta(next(self._numeri), audio, testo, dettatura)
+            self._attive.append(richiesta)
+        # Modelli rilasciati per inattività (kris_risorse): si ricaricano mentre l'utente parla
+        risveglia = getattr(self.motore, "risveglia", None)
+        if testo is None and risveglia is not None:
+            risveglia()
+        # Un comando nuovo zittisce la lettura in corso, ma in coda non interrompe quelli già avviati
+        if (politica == "annulla" or not attive) and self.interrompi_voce is not None:
+            self.interrompi_voce()
+        self._ingresso.put(richiesta)
+        return richiesta
+
+    def annulla_tutto(self):
+        """Annulla le richieste in corso e in attesa e ferma la lettura"""
+        with self._lock:
+            for r in self._attive:
+                r.annulla.set()
+        if self.interrompi_voce is not None:
+            self.interrompi_voce()
+
+    def occupata(self):
+        with self._lock:
+            return any(not r.annulla.is_set() for r in self._attive)
+
+    def fase_attuale(self):
+        """"ascolto" se una richiesta sta ascoltando, "trascrizione" se una è in elaborazione, altrimenti None"""
+        with self._lock:
+            stati = {r.stato for r in self._attive if not r.annulla.is_set()}
+        if "ascolto" in stati:
+            return "ascolto"
+        if stati & {"trascrizione", "comando"}:
+            return "trascrizione"
+        return None
+
+    def _avvisa(self, evento, richiesta):
+        if self.notifica is not None:
+            try:
+                self.notifica(evento, richiesta)
+            except Exception as e:
+                print("Errore notifica pipeline:", e)
+
+    def _conclusa(self, richiesta, evento="risultato"):
+        with self._lock:
+            if richiesta in self._attive:
+                self._attive.remove(richiesta)
+            richiesta.stato = "fatta"
+        richiesta.audio = None
+        richiesta.fatta.set()
+        self._avvisa(evento, richiesta)
+
+    def _errore(self, richiesta, risposta):
+        richiesta.risultato = {"trascrizione": richiesta.testo or "", "risposta": risposta, "intento": None,
+                               "latenze": richiesta.latenze}
+
+    # --- FASI (un thread ciascuna) ---
+    def _cattura(self):
+        while True:
+            richiesta = self._ingresso.get()
+            if richiesta is None:
+                self._da_trascrivere.put(None)
+                return
+            if richiesta.annulla.is_set():
+                self._conclusa(richiesta, "annullata")
+                continue
+            self.metriche.registra("attesa_pipeline", time.perf_counter() - richiesta.t_inizio)
+            if richiesta.dettatura:
+                try:
+                    self._dettatura(richiesta)
+                except Annullato:
+                    self._conclusa(richiesta, "annullata")
+                    continue
+                except Exception as e:
+                    self._errore(richiesta, f"[Errore dettatura: {e}]")
+            elif richiesta.audio is None and richiesta.testo is None:
+                richiesta.stato = "ascolto"
+                self._avvisa("ascolto", richiesta)
+                try:
+                    sorgente = self._microfono(richiesta)
+                    richiesta.audio = kris_motore.ascolta(self.config, self.metriche, sorgente, richiesta.latenze)
+                except Annullato:
+                    self._conclusa(richiesta, "annullata")
+                    continue
+                except Exception as e:
+                    self._errore(richiesta, f"[Errore acquisizione audio: {e}]")
+            self._da_trascrivere.put(richiesta)
+
+    def _microfono(self, richiesta):
+        """Blocchi audio della richiesta, aperti solo quando la voce tace"""
+        if self.attendi_voce is not None:
+            self.attendi_voce(richiesta.annulla)
+        if richiesta.annulla.is_set():
+            raise Annullato()
+        return interrompibile(self.fabbrica_blocchi(), richiesta.annulla)
+
+    def _dettatura(self, richiesta):
+        """Ascolto e trascrizione insieme, nel thread di cattura: le parole confermate vanno subito nel
+        testo corrente (restano anche se poi la dettatura è annullata)"""
+        if not hasattr(self.motore, "decodifica"):
+            self._errore(richiesta, "[Dettatura in tempo reale non disponibile col motore remoto]")
+            return
+        if not self.motore.attendi_modello(richiesta.latenze, richiesta.annulla):
+            self._errore(richiesta, "[Modello vocale non disponibile]")
+            return
+        richiesta.stato = "ascolto"
+        self._avvisa("ascolto", richiesta)
+
+        def _decodifica(audio, prompt):
+            with self.metriche.fase("dettatura_passo"):
+                return self.motore.decodifica(audio, richiesta.annulla, initial_prompt=prompt or None)
+
+        def _al_cambio(nuove):
+            self.motore.aggiungi_testo(" ".join(nuove), continua=True)
+            richiesta.parziale = (streaming.testo, streaming.provvisorio)
+            self._avvisa("parziale", richiesta)
+
+        streaming = kris_dettatura.DettaturaStreaming(_decodifica)
+        sorgente = self._microfono(richiesta)
+        try:
+            with self.metriche.fase("dettatura", richiesta.latenze):
+                testo = kris_dettatura.detta(sorgente, streaming, _al_cambio, kris_motore.SAMPLERATE,
+                                             **kris_vad.parametri_da_config(self.config))
+        finally:
+            self.motore.chiudi_testo()   # tutta la dettatura è un segmento, anche se annullata a metà
+        richiesta.testo = testo
+        richiesta.risultato = {"trascrizione": testo, "risposta": "Testo aggiunto." if testo else "[Nessun testo dettato]",
+                               "intento": "scrivi" if testo else None, "latenze": richiesta.latenze}
+
+    def _trascrizione(self):
+        while True:
+            richiesta = self._da_trascrivere.get()
+            if richiesta is None:
+                self._da_eseguire.put(None)
+                return
+            if richiesta.annulla.is_set():
+                self._conclusa(richiesta, "annullata")
+                continue
+            # Col demone (ClienteKris) trascrizione e comando sono una sola chiamata, fatta dalla fase comando
+            if richiesta.risultato is None and richiesta.testo is None and hasattr(self.motore, "trascrivi"):
+                richiesta.stato = "trascrizione"
+                self._avvisa("trascrizione", richiesta)
+                try:
+                    richiesta.testo = self.motore.trascrivi(kris_motore.audio_per_whisper(richiesta.audio),
+                                                            richiesta.latenze, richiesta.annulla)
+                except Annullato:
+                    self._conclusa(richiesta, "annullata")
+                    continue
+                except Exception as e:
+                    richiesta.testo = f"[Errore trascrizione: {e}]"
+                richiesta.audio = None
+            self._da_eseguire.put(richiesta)
+
+    def _comando(self):
+        while True:
+            richiesta = self._da_eseguire.get()
+            if richiesta is None:
+                return
+            if richiesta.annulla.is_set():
+                self._conclusa(richiesta, "annullata")
+                continue
+            if richiesta.risultato is None:
+                richiesta.stato = "comando"
+                if richiesta.testo is None:
+                    self._avvisa("trascrizione", richiesta)  # audio inviato al demone
+                try:
+                    if richiesta.testo is not None:
+                        richiesta.risultato = self.motore.gestisci(testo=richiesta.testo, latenze=richiesta.latenze)
+                    else:
+                        richiesta.risultato = self.motore.gestisci(audio=richiesta.audio, latenze=richiesta.latenze)
+                except Exception as e:
+                    self._errore(richiesta, f"[Errore elaborazione comando: {e}]")
+            # Il comando è già stato eseguito: anche se nel frattempo è stata annullata, il risultato arriva
+            richiesta.latenze["totale"] = time.perf_counter() - richiesta.t_inizio
+            self.metriche.registra("totale", richiesta.latenze["totale"])
+            self._conclusa(richiesta)
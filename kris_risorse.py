@@ -0,0 +1,139 @@
+"""KRIS - Memoria da inattivo: modelli rilasciati quando l'assistente non lavora.
+
+La GUI resta spesso aperta tutto il giorno: il modello Whisper, il modello
+delle risposte e il motore TTS occuperebbero centinaia di MB senza fare
+niente. GestoreRisorse controlla ogni CONTROLLO_S secondi da quanto ogni
+risorsa registrata non è usata; oltre "inattivita_minuti" (config, 0 = mai)
+la rilascia, restituisce al sistema la memoria liberata e riporta la memoria
+residente prima e dopo.
+
+Le risorse si ricaricano da sole al primo uso: il motore ricomincia a
+caricare Whisper appena si preme "Parla" (mentre si parla, non dopo), con i
+pesi già quantizzati salvati in "cache_modelli" (vedi kris_trascrizione).
+
+    python kris_risorse.py    # memoria residente di questo processo
+"""
+import gc
+import os
+import sys
+import time
+import threading
+
+CONTROLLO_S = 30.0
+
+def memoria_residente():
+    """Memoria residente (RSS) del processo in byte, None se non si riesce a leggerla"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    if sys.platform.startswith("linux"):
+        try:
+            with open("/proc/self/statm", "r") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            return None
+    if os.name == "nt":
+        import ctypes
+        from ctypes import wintypes
+
+        class CONTATORI(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+        contatori = CONTATORI(cb=ctypes.sizeof(CONTATORI))
+        processo = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(processo, ctypes.byref(contatori), contatori.cb):
+            return contatori.WorkingSetSize
+    return None
+
+def mb(byte):
+    return "?" if byte is None else f"{byte / 2 ** 20:.0f}"
+
+def libera_memoria():
+    """Dopo aver lasciato i riferimenti a un modello: raccolta, cache di torch e heap restituito al sistema"""
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    if sys.platform.startswith("linux"):
+        # glibc tiene la memoria liberata per riusarla: senza malloc_trim l'RSS non scende
+        try:
+            import ctypes
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+        except (OSError, AttributeError):
+            pass
+
+class GestoreRisorse:
+    """Risorse registrate con `registra()`; il controllo gira in un thread daemon.
+    `al_rilascio(nomi, prima, dopo)` riceve le risorse rilasciate e l'RSS in byte prima e dopo."""
+
+    def __init__(self, config, metriche=None, al_rilascio=None, controllo_s=CONTROLLO_S):
+        self.config = config
+        self.metriche = metriche
+        self.al_rilascio = al_rilascio
+        self.controllo_s = controllo_s
+        self.risorse = {}     # nome -> (ultimo_uso(), rilascia())
+        self._stop = threading.Event()
+        self._thread = None
+
+    def registra(self, nome, ultimo_uso, rilascia):
+        """`ultimo_uso()`: time.monotonic() dell'ultimo uso, None se la risorsa non è caricata;
+        `rilascia(usato_prima_di)`: la scarica, False se in quel momento non si può o se è stata usata
+        dopo `usato_prima_di` (l'uso letto dal controllo può essere già vecchio)"""
+        self.risorse[nome] = (ultimo_uso, rilascia)
+        return self
+
+    def imposta_config(self, config):
+        self.config = config
+
+    def avvia(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._ciclo, daemon=True)
+            self._thread.start()
+        return self
+
+    def ferma(self):
+        self._stop.set()
+
+    def controlla(self, adesso=None):
+        """Rilascia le risorse inattive da più di inattivita_minuti; ritorna i nomi rilasciati"""
+        limite = self.config.get("inattivita_minuti", 0) * 60
+        if limite <= 0:
+            return []
+        adesso = time.monotonic() if adesso is None else adesso
+        inattive = []
+        for nome, (ultimo_uso, _) in self.risorse.items():
+            uso = ultimo_uso()
+            if uso is not None and adesso - uso >= limite:
+                inattive.append(nome)
+        if not inattive:
+            return []
+        prima = memoria_residente()
+        t0 = time.perf_counter()
+        rilasciate = []
+        for nome in inattive:
+            try:
+                if self.risorse[nome][1](adesso - limite) is not False:
+                    rilasciate.append(nome)
+            except Exception as e:
+                print(f"Errore rilascio {nome}:", e)
+        if rilasciate:
+            libera_memoria()
+            dopo = memoria_residente()
+            if self.metriche is not None:
+                self.metriche.registra("rilascio_risorse", time.perf_counter() - t0)
+            print(f"Risorse inattive rilasciate ({', '.join(rilasciate)}): memoria {mb(prima)} -> {mb(dopo)} MB")
+            if self.al_rilascio is not None:
+                self.al_rilascio(rilasciate, prima, dopo)
+        return rilasciate
+
+    def _ciclo(self):
+        while not self._stop.wait(self.controllo_s):
+            self.controlla()
+
+if __name__ == "__main__":
+    print(f"Memoria residente: {mb(memoria_residente())} MB")
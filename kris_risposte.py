@@ -0,0 +1,328 @@
+"""KRIS - Risposte offline alle domande ("cerca ...", "fai una ricerca ...").
+
+Backend (config "risposte_backend"):
+- "llama-cpp": modello GGUF locale con llama-cpp-python ("risposte_modello" = path del .gguf)
+- "ollama": server Ollama locale ("risposte_url", "risposte_modello" = nome del modello)
+- "note": nessun modello, le frasi più pertinenti delle note (indice BM25 di kris_note)
+- "finto": risposta fissa e deterministica, per le prove
+- "auto": llama-cpp se c'è il .gguf e il pacchetto, poi ollama se risponde, altrimenti note
+
+Il testo arriva a pezzi (token) e `rispondi()` consegna ogni frase appena è
+completa: la prima frase viene letta mentre il modello scrive ancora le altre.
+Le risposte complete sono tenute in cache per domanda normalizzata (minuscolo,
+senza accenti né parole vuote), così una domanda ripetuta risponde subito.
+
+    python kris_risposte.py "chi ha scritto la divina commedia" [--backend finto] [--ritardo 0.05]
+"""
+import os
+import re
+import sys
+import json
+import time
+import threading
+import urllib.request
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from kris_note import termini
+from kris_scelte import BACKEND_RISPOSTE
+from kris_testo import parole
+from kris_trascrizione import Annullato
+
+CACHE_DEFAULT = "cache_risposte.json"
+MAX_TOKEN = 300
+MAX_FRASE = 200
+FRASI_DA_NOTE = 3
+
+ISTRUZIONI = ("Sei KRIS, un assistente vocale offline. Rispondi in italiano con poche frasi brevi, "
+              "senza elenchi, titoli o markdown: il testo verrà letto ad alta voce.")
+
+RE_FINE_FRASE = re.compile(r"[.!?;:]\s+|\n+")
+
+def chiave(domanda):
+    """Domanda normalizzata: "Chi è il Presidente?" e "chi e presidente" hanno la stessa chiave"""
+    return " ".join(termini(domanda)) or " ".join(parole(domanda))
+
+def frasi(pezzi):
+    """Pezzi di testo in streaming -> frasi complete, ciascuna appena finisce"""
+    resto = ""
+    for pezzo in pezzi:
+        resto += pezzo
+        inizio = 0
+        for m in RE_FINE_FRASE.finditer(resto):
+            if resto[inizio:m.end()].strip():
+                yield resto[inizio:m.end()].strip()
+            inizio = m.end()
+        resto = resto[inizio:]
+        # Frase lunga senza punteggiatura: si spezza sull'ultimo spazio (anche più volte per pezzo)
+        while len(resto) > MAX_FRASE:
+            taglio = resto.rfind(" ", 0, MAX_FRASE)
+            if taglio <= 0:
+                break
+            yield resto[:taglio].strip()
+            resto = resto[taglio + 1:]
+    if resto.strip():
+        yield resto.strip()
+
+# --- BACKEND ---
+class BackendRisposte(ABC):
+    nome = ""
+    in_cache = True   # le risposte dei modelli restano valide; quelle dalle note cambiano con le note
+
+    @abstractmethod
+    def genera(self, domanda, annulla=None):
+        """Pezzi della risposta man mano che sono generati"""
+
+    def descrizione(self):
+        return self.nome
+
+class RisposteLlamaCpp(BackendRisposte):
+    nome = "llama-cpp"
+
+    def __init__(self, modello):
+        from llama_cpp import Llama
+        self.modello = modello
+        self.llm = Llama(model_path=modello, n_ctx=2048, verbose=False)
+
+    def genera(self, domanda, annulla=None):
+        messaggi = [{"role": "system", "content": ISTRUZIONI}, {"role": "user", "content": domanda}]
+        for pezzo in self.llm.create_chat_completion(messaggi, max_tokens=MAX_TOKEN, stream=True):
+            if annulla is not None and annulla.is_set():
+                raise Annullato()  # uscire dal generatore ferma la generazione
+            yield pezzo["choices"][0]["delta"].get("content") or ""
+
+    def descrizione(self):
+        return f"{self.nome} {os.path.basename(self.modello)}"
+
+class RisposteOllama(BackendRisposte):
+    nome = "ollama"
+
+    def __init__(self, url, modello):
+        self.url = url.rstrip("/")
+        self.modello = modello
+
+    def disponibile(self, timeout=0.5):
+        try:
+            with urllib.request.urlopen(self.url + "/api/tags", timeout=timeout) as r:
+                return r.status == 200
+        except OSError:
+            return False
+
+    def genera(self, domanda, annulla=None):
+        dati = json.dumps({"model": self.modello, "prompt": domanda, "system": ISTRUZIONI, "stream": True,
+                           "options": {"num_predict": MAX_TOKEN}}).encode("utf-8")
+        richiesta = urllib.request.Request(self.url + "/api/generate", data=dati,
+                                           headers={"Content-Type": "application/json"})
+        # Una riga JSON per pezzo; chiudere la connessione interrompe la generazione
+        with urllib.request.urlopen(richiesta, timeout=60) as r:
+            for riga in r:
+                if annulla is not None and annulla.is_set():
+                    raise Annullato()
+                pezzo = json.loads(riga)
+                yield pezzo.get("response", "")
+                if pezzo.get("done"):
+                    return
+
+    def descrizione(self):
+        return f"{self.nome} {self.modello}"
+
+class RisposteNote(BackendRisposte):
+    """Senza modello: le frasi delle note più pertinenti alla domanda"""
+    nome = "note"
+    in_cache = False
+
+    def __init__(self, archivio):
+        self.archivio = archivio
+
+    def genera(self, domanda, annulla=None):
+        cercati = set(termini(domanda))
+        candidate = []
+        for punteggio, path, _ in self.archivio.cerca(domanda, 3):
+            try:
+                with open(path, "r", encoding="utf-8", errors="replace") as f:
+                    testo = f.read()
+            except OSError:
+                continue
+            for frase in frasi([testo]):
+                comuni = len(cercati & set(termini(frase)))
+                if comuni:
+                    candidate.append((comuni, punteggio, frase))
+        if not candidate:
+            yield f"Non ho trovato niente nelle note su: {domanda}."
+            return
+        yield "Dalle tue note: "
+        for _, _, frase in sorted(candidate, key=lambda c: (-c[0], -c[1]))[:FRASI_DA_NOTE]:
+            yield frase.rstrip(".!?;:") + ". "
+
+class RisposteFinte(BackendRisposte):
+    """Risposta fissa, token per token, con un ritardo opzionale che simula la generazione"""
+    nome = "finto"
+
+    def __init__(self, ritardo=0.0):
+        self.ritardo = ritardo
+
+    def genera(self, domanda, annulla=None):
+        testo = f"Questa è la risposta di prova a {domanda.strip().rstrip('?')}. Seconda frase della risposta. Fine."
+        for parola in re.findall(r"\S+\s*", testo):
+            if annulla is not None and annulla.is_set():
+                raise Annullato()
+            if self.ritardo:
+                time.sleep(self.ritardo)
+            yield parola
+
+def crea_backend(config, archivio):
+    """Backend scelto da config (risposte_backend, risposte_modello, risposte_url)"""
+    scelta = config.get("risposte_backend", "auto")
+    modello = config.get("risposte_modello", "")
+    if scelta == "finto":
+        return RisposteFinte()
+    if scelta == "llama-cpp" or scelta == "auto" and modello.endswith(".gguf") and os.path.exists(modello):
+        try:
+            return RisposteLlamaCpp(modello)
+        except ImportError:
+            if scelta == "llama-cpp":
+                raise
+    if scelta in ("ollama", "auto") and modello and not modello.endswith(".gguf"):
+        ollama = RisposteOllama(config.get("risposte_url", "http://127.0.0.1:11434"), modello)
+        if scelta == "ollama" or ollama.disponibile():
+            return ollama
+    return RisposteNote(archivio)
+
+def nomi_backend(config):
+    """Backend che `crea_backend` può scegliere con questa config, senza crearlo né interrogare Ollama"""
+    scelta = config.get("risposte_backend", "auto")
+    if scelta != "auto":
+        return [scelta]
+    modello = config.get("risposte_modello", "")
+    if modello.endswith(".gguf"):
+        return ["llama-cpp", "note"] if os.path.exists(modello) else ["note"]
+    return ["ollama", "note"] if modello else ["note"]
+
+# --- CACHE ---
+class CacheRisposte:
+    """Risposte complete per chiave normalizzata, le più vecchie escono oltre `max_voci`"""
+
+    def __init__(self, path=CACHE_DEFAULT, max_voci=200):
+        self.path = path
+        self.max_voci = max_voci
+        self.voci = OrderedDict()
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.voci.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+
+    def leggi(self, chiave):
+        with self._lock:
+            if chiave not in self.voci:
+                return None
+            self.voci.move_to_end(chiave)
+            return self.voci[chiave]
+
+    def aggiungi(self, chiave, frasi):
+        with self._lock:
+            self.voci[chiave] = frasi
+            self.voci.move_to_end(chiave)
+            while len(self.voci) > self.max_voci:
+                self.voci.popitem(last=False)
+            copia = dict(self.voci)
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(copia, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print("Errore salvataggio cache risposte:", e)
+
+# --- RISPOSTE ---
+class Risponditore:
+    """Backend creato alla prima domanda (la scelta "auto" può interrogare Ollama) e cache delle risposte"""
+
+    def __init__(self, config, archivio, cache=None):
+        self.config = config
+        self.archivio = archivio
+        self.cache = cache if cache is not None else CacheRisposte(config.get("cache_risposte", CACHE_DEFAULT))
+        self.backend = None
+        self.ultimo_uso = None      # time.monotonic() dell'ultima risposta generata
+        self._lock = threading.Lock()
+
+    def rilascia(self, usato_prima_di=None):
+        """Lascia il backend (un modello llama-cpp occupa GB); si ricrea alla prossima domanda.
+        False se è stato usato dopo `usato_prima_di` (time.monotonic())."""
+        with self._lock:
+            if usato_prima_di is not None and self.ultimo_uso is not None and self.ultimo_uso > usato_prima_di:
+                return False
+            self.backend = None
+            self.ultimo_uso = None
+        return True
+
+    def imposta_config(self, config, archivio=None):
+        """Nuova config: il backend si ricrea alla prossima domanda se sono cambiate le sue impostazioni"""
+        campi = ("risposte_backend", "risposte_modello", "risposte_url")
+        if any(config.get(c) != self.config.get(c) for c in campi) or archivio is not self.archivio:
+            self.backend = None
+        self.config = config
+        self.archivio = archivio or self.archivio
+
+    def _backend(self):
+        with self._lock:
+            if self.backend is None:
+                self.backend = crea_backend(self.config, self.archivio)
+            self.ultimo_uso = time.monotonic()
+            return self.backend
+
+    def in_cache(self, domanda):
+        """Frasi della risposta già data a questa domanda, None se non è in cache. Non crea il backend
+        (caricare un GGUF richiede secondi): con "auto" prova tutti quelli che la config può dare."""
+        backend = self.backend
+        nomi = [backend.nome] if backend is not None else nomi_backend(self.config)
+        for nome in nomi:
+            if nome == RisposteNote.nome:
+                continue   # dipende dalle note, mai in cache
+            dette = self.cache.leggi(f"{nome}:{chiave(domanda)}")
+            if dette is not None:
+                return dette
+        return None
+
+    def rispondi(self, domanda, al_frase=None, annulla=None):
+        """Risposta completa; `al_frase(frase)` è chiamata per ogni frase appena è pronta.
+        Con `annulla` impostato si ferma con kris_trascrizione.Annullato."""
+        backend = self._backend()
+        voce = f"{backend.nome}:{chiave(domanda)}"
+        dette = self.cache.leggi(voce) if backend.in_cache else None
+        if dette is None:
+            dette = []
+            for frase in frasi(backend.genera(domanda, annulla)):
+                dette.append(frase)
+                if al_frase is not None:
+                    al_frase(frase)
+            if backend.in_cache and dette:
+                self.cache.aggiungi(voce, dette)
+        elif al_frase is not None:
+            for frase in dette:
+                al_frase(frase)
+        return " ".join(dette)
+
+def _opzione(args, nome, default):
+    if nome in args:
+        return args[args.index(nome) + 1]
+    return default
+
+if __name__ == "__main__":
+    import kris_note
+    import kris_config
+    args = sys.argv[1:]
+    if not args or args[0].startswith("--"):
+        print(__doc__)
+        sys.exit(2)
+    config, _ = kris_config.carica("config.json", crea=False)
+    config["risposte_backend"] = _opzione(args, "--backend", config["risposte_backend"])
+    risponditore = Risponditore(config, kris_note.ArchivioNote(config["note_dir"]))
+    if config["risposte_backend"] == "finto":
+        risponditore.backend = RisposteFinte(float(_opzione(args, "--ritardo", 0.05)))
+    print("Backend:", risponditore._backend().descrizione())
+    t0 = time.perf_counter()
+    # Il tempo della prima frase è quello che l'utente aspetta prima di sentire la voce
+    risponditore.rispondi(args[0], lambda frase: print(f"[{(time.perf_counter() - t0) * 1000:7.1f} ms] {frase}"))
+    print(f"Totale {(time.perf_counter() - t0) * 1000:.1f} ms")
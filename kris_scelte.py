@@ -0,0 +1,9 @@
+"""KRIS - Valori ammessi delle impostazioni a scelta.
+
+Modulo foglia, senza import: kris_config valida la configurazione senza caricare
+la pipeline, il motore o i backend che usano questi valori.
+"""
+
+POLITICHE = ("annulla", "accoda", "unisci")                          # pipeline_politica (kris_pipeline)
+MODALITA = ("auto", "comando", "dettatura")                          # trascrizione_modalita (kris_modalita)
+BACKEND_RISPOSTE = ("auto", "llama-cpp", "ollama", "note", "finto")  # risposte_backend (kris_risposte)
@@ -0,0 +1,39 @@
+"""KRIS - Utilità di testo condivise: normalizzazione senza accenti, token, distanza di edit"""
+import re
+import unicodedata
+
+RE_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+def normalizza(testo):
+    """Minuscolo e senza accenti: "Città" -> "citta" (stessa lunghezza dell'originale)"""
+    testo = testo.lower()
+    if testo.isascii():
+        return testo
+    return "".join(c for c in unicodedata.normalize("NFD", testo) if not unicodedata.combining(c))
+
+def tokenizza(testo):
+    """Token normalizzati con la loro posizione nel testo originale: [(token, inizio, fine)]"""
+    return [(normalizza(m.group()), m.start(), m.end()) for m in RE_TOKEN.finditer(testo)]
+
+def parole(testo):
+    return [normalizza(m.group()) for m in RE_TOKEN.finditer(testo)]
+
+def distanza(a, b, massimo=2):
+    """Distanza di Damerau-Levenshtein; si ferma appena supera `massimo` (ritorna massimo + 1)"""
+    if abs(len(a) - len(b)) > massimo:
+        return massimo + 1
+    prec2, prec = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        riga = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            riga[j] = min(prec[j] + 1, riga[j - 1] + 1, prec[j - 1] + (ca != cb))
+            if prec2 is not None and i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                riga[j] = min(riga[j], prec2[j - 2] + 1)
+        if min(riga) > massimo:
+            return massimo + 1
+        prec2, prec = prec, riga
+    return prec[-1]
+
+def cancellazioni(parola):
+    """Varianti con una lettera in meno (indice SymSpell per la ricerca tollerante)"""
+    return {parola[:i] + parola[i + 1:] for i in range(len(parola))}
@@ -0,0 +1,255 @@
+"""KRIS - Backend di trascrizione configurabili.
+
+- "faster-whisper": motore CTranslate2, int8 su CPU (se il pacchetto è installato)
+- "whisper": openai-whisper su PyTorch, fp32 oppure int8 con quantizzazione dinamica dei Linear
+- "auto": faster-whisper se disponibile, altrimenti whisper
+
+Ogni backend espone `trascrivi(audio, language, **opzioni)` con lo stesso
+risultato di `whisper.transcribe` ({"text", "segments", "language"}) e
+`descrizione()` con backend, modello, precisione e thread attivi. Le opzioni
+sono quelle di whisper (beam_size, temperature, initial_prompt...) più
+`max_token`, il limite di token generati, tradotto per ciascun backend.
+Con `annulla` (threading.Event) la decodifica in corso si interrompe con
+`Annullato` appena l'evento è impostato. `trascrivi_lotto(audios, ...)`
+decodifica più clip con le stesse opzioni: con whisper in un solo passaggio
+(log-mel impilati, le clip venute male ridecodificate da sole col fallback
+di temperatura di transcribe), altrimenti una alla volta (vedi kris_lotti).
+
+Con whisper int8 il modello già quantizzato è salvato in "cache_modelli":
+i caricamenti successivi (anche dopo il rilascio per inattività, vedi
+kris_risorse) leggono i pesi pronti invece di rifare la quantizzazione.
+faster-whisper carica già i pesi int8 convertiti dalla sua cache su disco.
+"""
+import os
+from abc import ABC, abstractmethod
+
+# --- PARAMETRI DI DEFAULT (chiavi di config.json) ---
+BACKEND_DEFAULT = {
+    "whisper_model": "base",
+    "whisper_backend": "auto",      # auto | faster-whisper | whisper
+    "whisper_precisione": "int8",   # int8 | fp32
+    "torch_threads": 0              # 0 = lascia decidere a torch / CTranslate2
+}
+
+BACKEND_VALIDI = ("auto", "faster-whisper", "whisper")
+PRECISIONI_VALIDE = ("int8", "fp32")
+
+class Annullato(Exception):
+    """Decodifica (o ascolto) interrotta perché la richiesta è stata annullata"""
+
+def parametri_da_config(config):
+    opz = {k: config.get(k, v) for k, v in BACKEND_DEFAULT.items()}
+    if opz["whisper_backend"] not in BACKEND_VALIDI:
+        raise ValueError(f"whisper_backend non valido: {opz['whisper_backend']}")
+    if opz["whisper_precisione"] not in PRECISIONI_VALIDE:
+        raise ValueError(f"whisper_precisione non valida: {opz['whisper_precisione']}")
+    opz["torch_threads"] = int(opz["torch_threads"] or 0)
+    return opz
+
+def parametri_comandi(config):
+    """Parametri del modello per la modalità comando: come il principale, con whisper_model_comandi se indicato"""
+    opz = parametri_da_config(config)
+    opz["whisper_model"] = config.get("whisper_model_comandi") or opz["whisper_model"]
+    return opz
+
+def opzioni_torch(opzioni):
+    """Opzioni comuni -> opzioni di whisper.transcribe"""
+    opzioni = dict(opzioni)
+    opzioni.setdefault("fp16", False)  # su CPU fp16 non è supportato
+    if "max_token" in opzioni:
+        opzioni["sample_len"] = opzioni.pop("max_token")
+    if opzioni.get("beam_size") == 1:
+        opzioni["beam_size"] = None    # decodifica greedy, senza la macchina della beam search
+    return opzioni
+
+def opzioni_lotto(opzioni, language):
+    """Opzioni comuni -> whisper.DecodingOptions: un solo tentativo alla prima temperatura; il fallback
+    lo fa `WhisperTorch.trascrivi_lotto` (best_of vale solo campionando, ed è alternativo alla beam search)"""
+    opzioni = opzioni_torch(opzioni)
+    temperatura = opzioni.get("temperature", 0.0)
+    if isinstance(temperatura, (tuple, list)):
+        temperatura = temperatura[0]
+    decodifica = {"language": language, "temperature": temperatura, "fp16": False, "without_timestamps": True}
+    if opzioni.get("beam_size"):
+        decodifica["beam_size"] = opzioni["beam_size"]
+    elif opzioni.get("best_of") and temperatura > 0:
+        decodifica["best_of"] = opzioni["best_of"]
+    if opzioni.get("sample_len"):
+        decodifica["sample_len"] = opzioni["sample_len"]
+    if opzioni.get("initial_prompt"):
+        decodifica["prompt"] = opzioni["initial_prompt"]
+    return decodifica
+
+def da_ridecodificare(compression_ratio, avg_logprob, opzioni):
+    """Le soglie del fallback di temperatura di transcribe (default o passate nelle opzioni)"""
+    soglia_compressione = opzioni.get("compression_ratio_threshold", 2.4)
+    soglia_logprob = opzioni.get("logprob_threshold", -1.0)
+    return ((soglia_compressione is not None and compression_ratio > soglia_compressione)
+            or (soglia_logprob is not None and avg_logprob < soglia_logprob))
+
+def imposta_thread(n):
+    """Numero di thread per l'inferenza torch su CPU (0 = invariato); ritorna quelli attivi"""
+    import torch
+    if n > 0:
+        torch.set_num_threads(n)
+    return torch.get_num_threads()
+
+class BackendTrascrizione(ABC):
+    nome = ""
+
+    def __init__(self, modello, precisione, threads):
+        self.modello = modello
+        self.precisione = precisione
+        self.threads = threads
+
+    @abstractmethod
+    def trascrivi(self, audio, language="it", annulla=None, **opzioni):
+        """Una clip float32 a 16 kHz -> {"text", "segments", "language"} come whisper.transcribe"""
+
+    def trascrivi_lotto(self, audios, language="it", annulla=None, **opzioni):
+        """Più clip con le stesse opzioni -> un risultato per clip; qui una alla volta"""
+        return [self.trascrivi(audio, language, annulla, **opzioni) for audio in audios]
+
+    def descrizione(self):
+        return f"{self.nome} {self.modello} {self.precisione}, {self.threads} thread"
+
+class WhisperTorch(BackendTrascrizione):
+    """openai-whisper su CPU; con precisione int8 i Linear sono quantizzati dinamicamente"""
+    nome = "whisper"
+
+    def __init__(self, modello="base", precisione="int8", threads=0, cache=None):
+        import torch
+        import whisper
+        super().__init__(modello, precisione, imposta_thread(threads))
+        self.model = None
+        path = None
+        if cache and precisione == "int8":
+            nome = os.path.splitext(os.path.basename(modello))[0]
+            path = os.path.join(cache, f"whisper-{nome}-{precisione}-torch{torch.__version__}.pt")
+            if os.path.exists(path):
+                self.model = _carica_salvato(torch, path)
+        if self.model is None:
+            self.model = whisper.load_model(modello, device="cpu")
+            if precisione == "int8":
+                _linear_standard(self.model)
+                self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+            if path:
+                _salva_modello(torch, self.model, path)
+
+    def trascrivi(self, audio, language="it", annulla=None, **opzioni):
+        return self._interrompibile(annulla, self.model.transcribe, audio, language=language,
+                                    **opzioni_torch(opzioni))
+
+    def trascrivi_lotto(self, audios, language="it", annulla=None, **opzioni):
+        """Le clip fino a 30 s diventano un tensore log-mel (B, n_mels, 3000) con padding: encoder e
+        decoder girano una volta per tutto il lotto. Le clip più lunghe, e quelle che con le soglie di
+        transcribe (testo ripetitivo o poco probabile) andrebbero ridecodificate a temperatura più alta,
+        passano da transcribe. Senza timestamp il segmento è la clip intera."""
+        import torch
+        import whisper
+        risultati = [None] * len(audios)
+        corte = [i for i, audio in enumerate(audios) if len(audio) <= whisper.audio.N_SAMPLES]
+        if len(corte) > 1:
+            mel = torch.stack([whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(audios[i])),
+                                                           self.model.dims.n_mels) for i in corte])
+            decodificati = self._interrompibile(annulla, whisper.decode, self.model, mel,
+                                                whisper.DecodingOptions(**opzioni_lotto(opzioni, language)))
+            for i, r in zip(corte, decodificati):
+                # Come transcribe: parlato improbabile e poco sicuro = silenzio
+                silenzio = r.no_speech_prob > 0.6 and r.avg_logprob < -1.0
+                if not silenzio and da_ridecodificare(r.compression_ratio, r.avg_logprob, opzioni):
+                    continue
+                testo = "" if silenzio else r.text
+                risultati[i] = {"text": testo, "language": r.language, "segments": [] if silenzio else [
+                    {"text": testo, "start": 0.0, "end": len(audios[i]) / whisper.audio.SAMPLE_RATE,
+                     "tokens": r.tokens, "avg_logprob": r.avg_logprob, "temperature": r.temperature,
+                     "compression_ratio": r.compression_ratio, "no_speech_prob": r.no_speech_prob}]}
+        for i, audio in enumerate(audios):
+            if risultati[i] is None:
+                risultati[i] = self.trascrivi(audio, language, annulla, **opzioni)
+        return risultati
+
+    def _interrompibile(self, annulla, funzione, *args, **kwargs):
+        if annulla is None:
+            return funzione(*args, **kwargs)
+        # Il decoder gira una volta per token: l'annullamento arriva entro un passo
+        def _controlla(modulo, ingressi):
+            if annulla.is_set():
+                raise Annullato()
+        gancio = self.model.decoder.register_forward_pre_hook(_controlla)
+        try:
+            return funzione(*args, **kwargs)
+        finally:
+            gancio.remove()
+
+def _carica_salvato(torch, path):
+    """Modello intero salvato da `_salva_modello`, mappato in memoria se torch lo permette; None se illeggibile"""
+    try:
+        try:
+            return torch.load(path, map_location="cpu", weights_only=False, mmap=True)
+        except TypeError:   # torch < 2.1: niente mmap né weights_only
+            return torch.load(path, map_location="cpu")
+    except Exception as e:
+        print(f"Cache modello {path} non valida, la rifaccio:", e)
+        return None
+
+def _salva_modello(torch, model, path):
+    tmp = path + ".tmp"
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        torch.save(model, tmp)
+        os.replace(tmp, path)
+    except Exception as e:
+        print("Errore salvataggio cache modello:", e)
+
+class FasterWhisper(BackendTrascrizione):
+    """CTranslate2 via faster-whisper: int8 nativo su CPU"""
+    nome = "faster-whisper"
+
+    def __init__(self, modello="base", precisione="int8", threads=0):
+        from faster_whisper import WhisperModel
+        super().__init__(modello, precisione, threads or os.cpu_count())
+        compute_type = "int8" if precisione == "int8" else "float32"
+        self.model = WhisperModel(modello, device="cpu", compute_type=compute_type, cpu_threads=threads)
+
+    def trascrivi(self, audio, language="it", annulla=None, **opzioni):
+        opzioni.pop("fp16", None)
+        if "max_token" in opzioni:
+            opzioni["max_new_tokens"] = opzioni.pop("max_token")
+        segmenti, info = self.model.transcribe(audio, language=language, **opzioni)
+        risultato = []
+        # I segmenti sono decodificati uno alla volta mentre si scorre il generatore
+        for s in segmenti:
+            if annulla is not None and annulla.is_set():
+                raise Annullato()
+            risultato.append({"start": s.start, "end": s.end, "text": s.text, "tokens": s.tokens,
+                              "avg_logprob": s.avg_logprob, "no_speech_prob": s.no_speech_prob,
+                              "compression_ratio": s.compression_ratio})
+        segmenti = risultato
+        return {"text": "".join(s["text"] for s in segmenti), "segments": segmenti, "language": info.language}
+
+def _linear_standard(modulo):
+    """whisper usa una sottoclasse di nn.Linear che quantize_dynamic non riconosce:
+    la sostituisce con nn.Linear equivalenti (stessi pesi)"""
+    import torch
+    for nome, figlio in modulo.named_children():
+        if isinstance(figlio, torch.nn.Linear) and type(figlio) is not torch.nn.Linear:
+            lineare = torch.nn.Linear(figlio.in_features, figlio.out_features, bias=figlio.bias is not None)
+            lineare.weight = figlio.weight
+            lineare.bias = figlio.bias
+            setattr(modulo, nome, lineare)
+        else:
+            _linear_standard(figlio)
+
+def crea_backend(config):
+    """Backend scelto da config.json (whisper_model, whisper_backend, whisper_precisione, torch_threads,
+    cache_modelli)"""
+    opz = parametri_da_config(config)
+    args = (opz["whisper_model"], opz["whisper_precisione"], opz["torch_threads"])
+    if opz["whisper_backend"] in ("auto", "faster-whisper"):
+        try:
+            return FasterWhisper(*args)
+        except ImportError:
+            if opz["whisper_backend"] == "faster-whisper":
+                raise
+    return WhisperTorch(*args, cache=config.get("cache_modelli"))
@@ -0,0 +1,153 @@
+"""KRIS - Aggiornamenti della finestra guidati da eventi.
+
+Tk non è thread-safe: i thread di lavoro (ascolto, trascrizione, voce, wake)
+non toccano mai i widget, ma `posta()` un evento in una coda che il loop di Tk
+svuota a lotti. Quando non succede niente l'intervallo di controllo si allunga
+fino a INTERVALLO_MAX_MS.
+
+I LED si animano solo nelle fasi attive (ascolto, trascrizione, voce,
+caricamento del modello); da fermi sono disegnati una volta sola. Il display
+tiene al massimo `max_righe` righe: le più vecchie vengono tolte, così anche
+dopo ore di sessione il widget Text resta reattivo.
+"""
+import queue
+
+MAX_RIGHE = 500
+LOTTO = 100                # eventi gestiti per giro del loop di Tk
+INTERVALLO_MIN_MS = 30
+INTERVALLO_MAX_MS = 250
+SPENTO = "#222"
+
+class CodaUI:
+    """Eventi dai thread di lavoro al thread di Tk.
+    `gestori`: tipo -> funzione(*dati), chiamata sempre nel thread di Tk."""
+
+    def __init__(self, widget, gestori):
+        self.widget = widget
+        self.gestori = gestori
+        self.coda = queue.SimpleQueue()
+        self._intervallo = INTERVALLO_MIN_MS
+        self._id = None
+
+    def posta(self, tipo, *dati):
+        """Da qualsiasi thread"""
+        self.coda.put((tipo, dati))
+
+    def avvia(self):
+        if self._id is None:
+            self._id = self.widget.after(INTERVALLO_MIN_MS, self._svuota)
+        return self
+
+    def sveglia(self):
+        """Dal thread di Tk, quando sta per iniziare un'attività: eventi di nuovo raccolti subito"""
+        self._intervallo = INTERVALLO_MIN_MS
+        if self._id is not None:
+            self.widget.after_cancel(self._id)
+            self._id = self.widget.after(INTERVALLO_MIN_MS, self._svuota)
+
+    def _svuota(self):
+        gestiti = 0
+        while gestiti < LOTTO:
+            try:
+                tipo, dati = self.coda.get_nowait()
+            except queue.Empty:
+                break
+            gestiti += 1
+            try:
+                self.gestori[tipo](*dati)
+            except Exception as e:
+                print(f"Errore evento interfaccia {tipo}:", e)
+        if gestiti:
+            self._intervallo = INTERVALLO_MIN_MS
+        else:
+            self._intervallo = min(self._intervallo * 2, INTERVALLO_MAX_MS)
+        # Lotto pieno: il resto al prossimo giro, senza attendere (ma lasciando ridisegnare la finestra)
+        self._id = self.widget.after(1 if gestiti == LOTTO else self._intervallo, self._svuota)
+
+class Trascritto:
+    """Text in sola lettura con al massimo `max_righe` righe;
+    le righe arrivate nello stesso giro sono scritte con una sola modifica.
+    L'ultima riga può essere provvisoria (ipotesi parziale della dettatura) e venire sostituita."""
+
+    def __init__(self, text, max_righe=MAX_RIGHE):
+        self.text = text
+        self.max_righe = max_righe
+        self._attesa = []
+        self._provvisoria = None
+        self._programmato = False
+        self.text.tag_configure("provvisoria", foreground="#1f8a0b")
+
+    def aggiungi(self, riga):
+        """Dal thread di Tk (i thread di lavoro passano da CodaUI)"""
+        self._attesa.append(riga)
+        self._programma()
+
+    def provvisoria(self, riga):
+        """Sostituisce la riga provvisoria in fondo al display; None la toglie"""
+        self._provvisoria = riga
+        self._programma()
+
+    def _programma(self):
+        if not self._programmato:
+            self._programmato = True
+            self.text.after_idle(self._scrivi)
+
+    def _scrivi(self):
+        righe, self._attesa = self._attesa, []
+        self._programmato = False
+        self.text.configure(state="normal")
+        intervallo = self.text.tag_ranges("provvisoria")
+        if intervallo:
+            self.text.delete(intervallo[0], intervallo[-1])
+        self.text.insert("end", "".join(r + "\n" for r in righe))
+        if self._provvisoria:
+            self.text.insert("end", self._provvisoria + "\n", "provvisoria")
+        # "end-1c" è l'inizio della riga vuota dopo l'ultimo a capo
+        eccesso = int(self.text.index("end-1c").split(".")[0]) - 1 - self.max_righe
+        if eccesso > 0:
+            self.text.delete("1.0", f"{eccesso + 1}.0")
+        self.text.see("end")
+        self.text.configure(state="disabled")
+
+class BarraLED:
+    """LED stile KITT. `imposta(colore, animazione)`: "scansione", "lampeggio" oppure None
+    (statico: tutti i LED del colore, o spenti se colore è None). Il timer gira solo se c'è un'animazione."""
+
+    def __init__(self, canvas, leds, periodo_ms=120):
+        self.canvas = canvas
+        self.leds = leds
+        self.periodo_ms = periodo_ms
+        self._colori = [None] * len(leds)
+        self._modo = None
+        self._passo = 0
+        self._id = None
+
+    def imposta(self, colore=None, animazione=None):
+        if (colore, animazione) == self._modo:
+            return
+        self._modo = (colore, animazione)
+        if self._id is not None:
+            self.canvas.after_cancel(self._id)
+            self._id = None
+        self._passo = 0
+        self._disegna()
+
+    def _disegna(self):
+        colore, animazione = self._modo
+        n = len(self.leds)
+        if animazione == "scansione":
+            colori = [colore if i == self._passo % n else SPENTO for i in range(n)]
+        elif animazione == "lampeggio":
+            colori = [colore if self._passo % 4 < 2 else SPENTO] * n
+        else:
+            colori = [colore or SPENTO] * n
+        # Solo i LED che cambiano colore: in scansione sono due per passo, non dieci
+        for i, (led, c) in enumerate(zip(self.leds, colori)):
+            if self._colori[i] != c:
+                self.canvas.itemconfig(led, fill=c)
+                self._colori[i] = c
+        if animazione:
+            self._passo += 1
+            self._id = self.canvas.after(self.periodo_ms, self._disegna)
+        else:
+            self._id = None
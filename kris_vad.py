@@ -0,0 +1,155 @@
+"""KRIS - Rilevamento attività vocale (VAD): chiude l'ascolto sul silenzio finale.
+
+Stessa logica per microfono e file WAV, così le registrazioni di prova
+passano dallo stesso codice usato in produzione:
+
+    python kris_vad.py registrazione.wav
+"""
+import sys
+import wave
+import queue
+
+import numpy as np
+
+SAMPLERATE = 16000
+FRAME_MS = 30
+
+# --- PARAMETRI DI DEFAULT (sovrascritti da config["response_timing"]) ---
+VAD_DEFAULT = {
+    "listen_timeout": 5,     # durata massima dell'ascolto, in secondi
+    "vad_soglia": 0.01,      # energia RMS minima per considerare un frame parlato
+    "vad_fattore": 3.0,      # il parlato deve superare il rumore di fondo di questo fattore
+    "vad_silenzio": 0.7,     # secondi di silenzio finale che chiudono l'ascolto
+    "vad_margine": 0.15      # secondi tenuti prima e dopo il parlato
+}
+
+def parametri_da_config(config):
+    """Legge soglie e durata massima da response_timing, con i default per le chiavi mancanti"""
+    timing = config.get("response_timing") or {}
+    return {k: float(timing.get(k, v)) for k, v in VAD_DEFAULT.items()}
+
+def rms(frame):
+    return float(np.sqrt(np.mean(np.square(frame, dtype=np.float64)))) if len(frame) else 0.0
+
+class EnergyVAD:
+    """VAD a energia con stima adattiva del rumore di fondo.
+
+    Riceve frame da FRAME_MS uno alla volta; `finito` diventa True quando,
+    dopo l'inizio del parlato, si accumula abbastanza silenzio o si supera
+    la durata massima.
+    """
+
+    def __init__(self, samplerate=SAMPLERATE, listen_timeout=5, vad_soglia=0.01,
+                 vad_fattore=3.0, vad_silenzio=0.7, vad_margine=0.15):
+        self.samplerate = samplerate
+        self.frame_len = int(samplerate * FRAME_MS / 1000)
+        self.soglia = vad_soglia
+        self.fattore = vad_fattore
+        self.max_frame = max(1, int(listen_timeout * 1000 / FRAME_MS))
+        self.silenzio_frame = max(1, int(vad_silenzio * 1000 / FRAME_MS))
+        self.margine_frame = int(vad_margine * 1000 / FRAME_MS)
+        self.rumore = None
+        self.frames = []
+        self.primo_parlato = None
+        self.ultimo_parlato = None
+        self.finito = False
+
+    def _soglia_attuale(self):
+        if self.rumore is None:
+            return self.soglia
+        return max(self.soglia, self.rumore * self.fattore)
+
+    def aggiungi(self, frame):
+        """Aggiunge un frame; ritorna True quando l'ascolto va chiuso"""
+        if self.finito:
+            return True
+        idx = len(self.frames)
+        self.frames.append(frame)
+        energia = rms(frame)
+        if energia > self._soglia_attuale():
+            if self.primo_parlato is None:
+                self.primo_parlato = idx
+            self.ultimo_parlato = idx
+        elif self.primo_parlato is None:
+            # Solo prima del parlato: aggiorna il rumore di fondo (media mobile)
+            self.rumore = energia if self.rumore is None else 0.9 * self.rumore + 0.1 * energia
+        if self.ultimo_parlato is not None and idx - self.ultimo_parlato >= self.silenzio_frame:
+            self.finito = True
+        elif len(self.frames) >= self.max_frame:
+            self.finito = True
+        return self.finito
+
+    def audio(self):
+        """Audio acquisito, senza il silenzio iniziale e finale (array vuoto se nessun parlato)"""
+        if self.primo_parlato is None:
+            return np.zeros(0, dtype=np.float32)
+        inizio = max(0, self.primo_parlato - self.margine_frame)
+        fine = min(len(self.frames), self.ultimo_parlato + 1 + self.margine_frame)
+        return np.concatenate(self.frames[inizio:fine]).astype(np.float32, copy=False)
+
+def ascolta(blocchi, samplerate=SAMPLERATE, **parametri):
+    """Consuma blocchi audio (di qualsiasi lunghezza) finché il VAD chiude l'ascolto"""
+    vad = EnergyVAD(samplerate=samplerate, **parametri)
+    resto = np.zeros(0, dtype=np.float32)
+    try:
+        for blocco in blocchi:
+            resto = np.concatenate([resto, np.asarray(blocco, dtype=np.float32).reshape(-1)])
+            while len(resto) >= vad.frame_len:
+                frame, resto = resto[:vad.frame_len], resto[vad.frame_len:]
+                if vad.aggiungi(frame):
+                    return vad.audio()
+    finally:
+        # Chiude subito lo stream del microfono, se la sorgente è un generatore
+        close = getattr(blocchi, "close", None)
+        if close:
+            close()
+    if len(resto):
+        vad.aggiungi(resto)
+    return vad.audio()
+
+# --- SORGENTI AUDIO ---
+def blocchi_microfono(samplerate=SAMPLERATE, blocco_ms=FRAME_MS):
+    """Blocchi float32 mono dal microfono predefinito, finché il generatore resta aperto"""
+    import sounddevice as sd
+    coda = queue.Queue()
+
+    def _callback(indata, frames, tempo, status):
+        coda.put(indata[:, 0].copy())
+
+    with sd.InputStream(samplerate=samplerate, channels=1, dtype='float32',
+                        blocksize=int(samplerate * blocco_ms / 1000), callback=_callback):
+        while True:
+            yield coda.get()
+
+def leggi_wav(path, samplerate=SAMPLERATE):
+    """WAV PCM -> float32 mono alla frequenza richiesta"""
+    with wave.open(path, "rb") as wf:
+        canali, larghezza, sr = wf.getnchannels(), wf.getsampwidth(), wf.getframerate()
+        raw = wf.readframes(wf.getnframes())
+    if larghezza == 1:
+        audio = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif larghezza == 2:
+        audio = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768
+    elif larghezza == 4:
+        audio = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648
+    else:
+        raise ValueError(f"WAV a {8 * larghezza} bit non supportato: {path}")
+    if canali > 1:
+        audio = audio.reshape(-1, canali).mean(axis=1)
+    if sr != samplerate and len(audio):
+        n = int(round(len(audio) * samplerate / sr))
+        audio = np.interp(np.linspace(0, len(audio) - 1, n), np.arange(len(audio)), audio).astype(np.float32)
+    return audio
+
+def blocchi_da_wav(path, samplerate=SAMPLERATE, blocco_ms=FRAME_MS):
+    """Come blocchi_microfono, ma da file: per le prove senza hardware"""
+    audio = leggi_wav(path, samplerate)
+    passo = int(samplerate * blocco_ms / 1000)
+    for i in range(0, len(audio), passo):
+        yield audio[i:i + passo]
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        totale = len(leggi_wav(path)) / SAMPLERATE
+        parlato = len(ascolta(blocchi_da_wav(path), **VAD_DEFAULT)) / SAMPLERATE
+        print(f"{path}: {totale:.2f}s registrati, {parlato:.2f}s di parlato tenuti")
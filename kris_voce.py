@@ -0,0 +1,403 @@
+"""KRIS - Sintesi vocale con un solo worker e coda a priorità.
+
+Un unico thread possiede il motore TTS (pyttsx3 non è thread-safe). I testi
+lunghi sono divisi in frasi: "leggi tutto" inizia a parlare subito, e un
+errore o una conferma accodati dopo passano davanti alle frasi rimanenti.
+`interrompi()` (barge-in) scarta tutto ciò che è in coda e ferma la frase in corso.
+
+Le frasi fisse (saluti, conferme) sono sintetizzate una volta sola in
+CacheFrasi e poi riprodotte dal PCM già pronto.
+
+    python kris_voce.py "Ciao Kris. Prova della voce."
+"""
+import os
+import re
+import sys
+import json
+import time
+import wave
+import hashlib
+import threading
+import itertools
+from collections import OrderedDict
+from queue import PriorityQueue
+
+PRIORITA_ERRORE = 0
+PRIORITA_CONFERMA = 1
+PRIORITA_LETTURA = 2
+PRIORITA_PREPARAZIONE = 3   # pre-rendering in cache, solo quando il worker è libero
+
+MAX_FRASE = 200  # caratteri: oltre si spezza anche sulle virgole
+
+RE_FRASI = re.compile(r"(?<=[.!?;:])\s+|\n+")
+RE_VIRGOLE = re.compile(r"(?<=,)\s+")
+
+def dividi_frasi(testo):
+    """Frasi brevi da pronunciare una alla volta"""
+    frasi = []
+    for frase in RE_FRASI.split(testo.strip()):
+        if len(frase) <= MAX_FRASE:
+            frasi.append(frase)
+            continue
+        pezzo = ""
+        for parte in RE_VIRGOLE.split(frase):
+            if pezzo and len(pezzo) + len(parte) > MAX_FRASE:
+                frasi.append(pezzo)
+                pezzo = ""
+            pezzo = f"{pezzo} {parte}" if pezzo else parte
+        frasi.append(pezzo)
+    return [f.strip() for f in frasi if f.strip()]
+
+# --- USCITE AUDIO ---
+class SinkPyttsx3:
+    """pyttsx3; il motore viene creato dentro il thread del worker"""
+
+    def __init__(self, voice=None, rate=150, volume=1.0):
+        self.engine = None
+        self.voice, self.rate, self.volume = voice, rate, volume
+
+    def apri(self):
+        import pyttsx3
+        self.engine = pyttsx3.init()
+        self.imposta(self.voice, self.rate, self.volume)
+
+    def chiudi(self):
+        """Rilascia il motore TTS (inattività); `apri()` lo ricrea"""
+        if self.engine is not None:
+            self.engine.stop()
+            self.engine = None
+
+    def imposta(self, voice, rate, volume):
+        self.voice, self.rate, self.volume = voice, rate, volume
+        if self.engine is None:
+            return
+        if voice:
+            self.engine.setProperty('voice', voice)
+        else:
+            # Seleziona voce italiana se disponibile
+            for v in self.engine.getProperty('voices'):
+                if 'it' in v.id or 'italian' in v.name.lower():
+                    self.engine.setProperty('voice', v.id)
+                    break
+            else:
+                print("⚠️ Nessuna voce italiana trovata. Verrà usata la voce predefinita.")
+        self.engine.setProperty('rate', rate)
+        self.engine.setProperty('volume', volume)
+
+    def pronuncia(self, testo):
+        self.engine.say(testo)
+        self.engine.runAndWait()
+
+    def renderizza(self, testo, path):
+        self.engine.save_to_file(testo, path)
+        self.engine.runAndWait()
+
+    def riproduci(self, testo, pcm, samplerate):
+        import sounddevice as sd
+        sd.play(pcm, samplerate)
+        sd.wait()
+
+    def interrompi(self):
+        if self.engine is not None:
+            self.engine.stop()
+        if "sounddevice" in sys.modules:
+            sys.modules["sounddevice"].stop()
+
+class SinkNullo:
+    """Nessun audio: tiene traccia di cosa sarebbe stato detto (prove senza altoparlanti).
+    Con `secondi_per_carattere` simula la durata della pronuncia, interrompibile."""
+
+    def __init__(self, secondi_per_carattere=0.0):
+        self.voice, self.rate, self.volume = None, 150, 1.0
+        self.detti = []
+        self.interrotti = 0
+        self.secondi_per_carattere = secondi_per_carattere
+        self._stop = threading.Event()
+
+    def apri(self):
+        pass
+
+    def chiudi(self):
+        pass
+
+    def imposta(self, voice, rate, volume):
+        self.voice, self.rate, self.volume = voice, rate, volume
+
+    def pronuncia(self, testo):
+        self._stop.clear()
+        self.detti.append(testo)
+        if self.secondi_per_carattere and self._stop.wait(len(testo) * self.secondi_per_carattere):
+            self.interrotti += 1
+
+    def renderizza(self, testo, path):
+        scrivi_wav(path, b"\x00\x00" * 160, 16000)
+
+    def riproduci(self, testo, pcm, samplerate):
+        self.pronuncia(testo)
+
+    def interrompi(self):
+        self._stop.set()
+
+# --- CACHE DELLE FRASI FISSE ---
+def scrivi_wav(path, pcm, samplerate):
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(samplerate)
+        wf.writeframes(pcm)
+
+def leggi_pcm(path):
+    """WAV -> (array int16, samplerate); mono o multicanale come nel file"""
+    import numpy as np
+    with wave.open(path, "rb") as wf:
+        canali, sr = wf.getnchannels(), wf.getframerate()
+        if wf.getsampwidth() != 2:
+            raise ValueError(f"WAV non a 16 bit: {path}")
+        pcm = np.frombuffer(wf.readframes(wf.getnframes()), dtype="<i2")
+    return (pcm.reshape(-1, canali) if canali > 1 else pcm), sr
+
+class CacheFrasi:
+    """Audio sintetizzato su disco (un WAV per frase) con scarto LRU, più gli ultimi PCM in memoria.
+    La chiave include voce, velocità e volume: cambiare voce non riusa audio vecchio.
+    Usata solo dal thread del worker vocale."""
+
+    def __init__(self, cartella="cache_voce", max_frasi=200, max_memoria=40):
+        self.cartella = cartella
+        self.max_frasi = max_frasi
+        self.max_memoria = max_memoria
+        self.memoria = OrderedDict()
+        self.path_indice = os.path.join(cartella, "indice.json")
+        os.makedirs(cartella, exist_ok=True)
+        try:
+            with open(self.path_indice, "r", encoding="utf-8") as f:
+                self.indice = json.load(f)
+        except (OSError, ValueError):
+            self.indice = {}
+
+    @staticmethod
+    def chiave(testo, impostazioni):
+        return hashlib.sha1(json.dumps([testo, *impostazioni]).encode("utf-8")).hexdigest()
+
+    def _path(self, chiave):
+        return os.path.join(self.cartella, chiave + ".wav")
+
+    def __contains__(self, chiave):
+        return chiave in self.indice
+
+    def leggi(self, chiave):
+        """(pcm, samplerate) oppure None"""
+        if chiave in self.memoria:
+            self.memoria.move_to_end(chiave)
+        elif chiave in self.indice:
+            try:
+                self.memoria[chiave] = leggi_pcm(self._path(chiave))
+            except (OSError, ValueError, EOFError):
+                self.rimuovi(chiave)
+                return None
+            while len(self.memoria) > self.max_memoria:
+                self.memoria.popitem(last=False)
+        else:
+            return None
+        self.indice[chiave]["uso"] = time.time()
+        return self.memoria[chiave]
+
+    def aggiungi(self, chiave, testo, impostazioni, renderizza):
+        """Sintetizza con `renderizza(testo, path)` e registra la frase; scarta le meno usate"""
+        path = self._path(chiave)
+        renderizza(testo, path)
+        self.indice[chiave] = {"testo": testo, "impostazioni": list(impostazioni), "uso": time.time()}
+        for vecchia in sorted(self.indice, key=lambda k: self.indice[k]["uso"])[:-self.max_frasi]:
+            self.rimuovi(vecchia)
+        self.salva_indice()
+
+    def rimuovi(self, chiave):
+        self.indice.pop(chiave, None)
+        self.memoria.pop(chiave, None)
+        try:
+            os.remove(self._path(chiave))
+        except OSError:
+            pass
+
+    def invalida(self, impostazioni):
+        """Elimina l'audio reso con impostazioni diverse da quelle attuali"""
+        for chiave in [k for k, v in self.indice.items() if v["impostazioni"] != list(impostazioni)]:
+            self.rimuovi(chiave)
+        self.salva_indice()
+
+    def salva_indice(self):
+        tmp = self.path_indice + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.indice, f, ensure_ascii=False)
+        os.replace(tmp, self.path_indice)
+
+# --- WORKER ---
+class VoceWorker:
+    def __init__(self, sink, cache=None, metriche=None):
+        self.sink = sink
+        self.cache = cache
+        self.metriche = metriche   # kris_metriche.Metriche: attesa prima dell'audio e durata delle frasi
+        self._accodate = {}        # ordine della prima frase di ogni testo -> istante in cui è stato accodato
+        self.fisse = set()
+        self.coda = PriorityQueue()
+        self._ordine = itertools.count()
+        self._generazione = 0
+        self._impostazioni = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self.parlando = False
+        self._da_dire = 0          # frasi da pronunciare accodate o in corso (non le preparazioni)
+        self._silenzio = threading.Condition()
+        self.al_cambio_voce = None  # funzione(parlando), dal thread della voce: inizio/fine (LED della GUI)
+        self.ultimo_uso = None      # time.monotonic() dell'ultima frase, None se il motore TTS è chiuso
+        self._usato_prima_di = None
+
+    def avvia(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._ciclo, daemon=True)
+            self._thread.start()
+        return self
+
+    def parla(self, testo, priorita=PRIORITA_CONFERMA, interrompi=False):
+        if interrompi:
+            self.interrompi()
+        self.avvia()
+        with self._lock:
+            generazione = self._generazione
+        for i, frase in enumerate(dividi_frasi(str(testo))):
+            ordine = next(self._ordine)
+            if i == 0 and self.metriche is not None:
+                self._accodate[ordine] = time.perf_counter()
+            with self._silenzio:
+                self._da_dire += 1
+            self.coda.put((priorita, ordine, generazione, frase))
+
+    def interrompi(self):
+        """Barge-in: scarta la coda e ferma la frase in corso"""
+        with self._lock:
+            self._generazione += 1
+        self.sink.interrompi()
+
+    def imposta(self, voice, rate, volume):
+        """Nuova voce/velocità/volume, applicati dal worker prima della frase successiva.
+        La cache delle frasi fisse viene invalidata e ripreparata in background."""
+        self._impostazioni = (voice, rate, volume)
+        self.avvia()
+        self.prepara(self.fisse)
+
+    def prepara(self, frasi):
+        """Frasi fisse da tenere pronte in cache; il rendering avviene quando il worker è libero"""
+        if self.cache is None:
+            return
+        self.avvia()
+        for frase in itertools.chain.from_iterable(dividi_frasi(f) for f in list(frasi)):
+            self.fisse.add(frase)
+            self.coda.put((PRIORITA_PREPARAZIONE, next(self._ordine), None, frase))
+
+    def attendi(self):
+        """Blocca finché tutto ciò che è in coda è stato pronunciato (o scartato)"""
+        self.coda.join()
+
+    def attendi_silenzio(self, timeout=None, annulla=None):
+        """Blocca finché non c'è più niente da pronunciare, senza aspettare le preparazioni della cache:
+        prima di aprire il microfono, perché la voce non finisca nell'ascolto. False allo scadere del
+        `timeout` o se `annulla` (threading.Event) viene impostato."""
+        scadenza = None if timeout is None else time.monotonic() + timeout
+        with self._silenzio:
+            while self._da_dire:
+                if annulla is not None and annulla.is_set():
+                    return False
+                resto = 0.05 if scadenza is None else min(0.05, scadenza - time.monotonic())
+                if resto <= 0:
+                    return False
+                self._silenzio.wait(resto)
+        return True
+
+    def ferma(self):
+        self.interrompi()
+        self.coda.put((-1, next(self._ordine), -1, None))
+
+    def rilascia(self, usato_prima_di=None):
+        """Chiude il motore TTS e svuota i PCM in memoria (inattività); alla prossima frase si riapre.
+        Lo fa il thread del worker, quando è libero, e solo se non ha parlato dopo `usato_prima_di`."""
+        self._usato_prima_di = usato_prima_di
+        self.coda.put((PRIORITA_PREPARAZIONE, next(self._ordine), None, None))
+
+    def _segnala(self, parlando):
+        if parlando != self.parlando:
+            self.parlando = parlando
+            if self.al_cambio_voce is not None:
+                self.al_cambio_voce(parlando)
+
+    def _impostazioni_sink(self):
+        return (self.sink.voice, self.sink.rate, self.sink.volume)
+
+    def _da_cache(self, frase, solo_prepara=False):
+        """Riproduce (o solo prepara) una frase fissa dalla cache; False se non è in cache"""
+        impostazioni = self._impostazioni_sink()
+        chiave = CacheFrasi.chiave(frase, impostazioni)
+        if chiave not in self.cache:
+            try:
+                self.cache.aggiungi(chiave, frase, impostazioni, self.sink.renderizza)
+            except Exception as e:
+                print("Errore cache vocale:", e)
+                return False
+        if solo_prepara:
+            return True
+        audio = self.cache.leggi(chiave)
+        if audio is None:
+            return False
+        self.sink.riproduci(frase, *audio)
+        return True
+
+    def _ciclo(self):
+        while True:
+            _, ordine, generazione, frase = self.coda.get()
+            accodata = self._accodate.pop(ordine, None)
+            try:
+                if frase is None:
+                    if generazione is not None:
+                        return
+                    limite = self._usato_prima_di
+                    if self.ultimo_uso is not None and (limite is None or self.ultimo_uso <= limite):   # rilascia()
+                        self.sink.chiudi()
+                        self.ultimo_uso = None
+                        if self.cache is not None:
+                            self.cache.memoria.clear()
+                    continue
+                if self.ultimo_uso is None:
+                    self.sink.apri()
+                self.ultimo_uso = time.monotonic()
+                if self._impostazioni is not None:
+                    impostazioni, self._impostazioni = self._impostazioni, None
+                    self.sink.imposta(*impostazioni)
+                    if self.cache is not None:
+                        self.cache.invalida(self._impostazioni_sink())
+                if generazione is None:
+                    self._segnala(False)
+                    self._da_cache(frase, solo_prepara=True)
+                    continue
+                if generazione != self._generazione:
+                    continue  # accodata prima di un'interruzione
+                self._segnala(True)
+                t0 = time.perf_counter()
+                if accodata is not None:
+                    self.metriche.registra("voce_attesa", t0 - accodata)
+                if not (self.cache is not None and frase in self.fisse and self._da_cache(frase)):
+                    self.sink.pronuncia(frase)
+                if self.metriche is not None:
+                    self.metriche.registra("voce_frase", time.perf_counter() - t0)
+            except Exception as e:
+                print("Errore sintesi vocale:", e)
+            finally:
+                if frase is not None and generazione is not None:
+                    with self._silenzio:
+                        self._da_dire -= 1
+                        self._silenzio.notify_all()
+                self.coda.task_done()
+                if self.coda.empty():
+                    self._segnala(False)
+
+if __name__ == "__main__":
+    worker = VoceWorker(SinkPyttsx3()).avvia()
+    worker.parla(" ".join(sys.argv[1:]) or "Ciao Kris. KIT operativo.", PRIORITA_LETTURA)
+    worker.attendi()
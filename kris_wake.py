@@ -0,0 +1,262 @@
+"""KRIS - Parola di attivazione ("KIT" / "Kris") a basso consumo.
+
+Stadio economico davanti a Whisper: MFCC calcolati in streaming e confrontati
+con modelli registrati dall'utente (DTW a sottosequenza), solo quando c'è
+energia vocale. L'audio passa per un buffer circolare: dopo l'attivazione
+Whisper riceve soltanto ciò che segue la parola chiave.
+
+    python kris_wake.py --registra wake/kit_1.wav        registra un modello
+    python kris_wake.py registrazione.wav [altre.wav]    prova su file, senza microfono
+"""
+import os
+import sys
+import glob
+import wave
+import itertools
+
+import numpy as np
+
+import kris_vad
+
+SAMPLERATE = 16000
+WIN = 400        # 25 ms
+HOP = 160        # 10 ms
+NFFT = 512
+N_MEL = 26
+N_MFCC = 13
+
+WAKE_DEFAULT = {
+    "wake_modelli": "wake",   # cartella con i WAV della parola chiave
+    "wake_soglia": None,      # None = calibrata dai modelli stessi
+    "wake_buffer": 10         # secondi tenuti nel buffer circolare
+}
+
+# --- MFCC (solo numpy) ---
+def _filtri_mel(samplerate=SAMPLERATE):
+    hz_mel = lambda f: 2595 * np.log10(1 + f / 700)
+    mel_hz = lambda m: 700 * (10 ** (m / 2595) - 1)
+    punti = mel_hz(np.linspace(hz_mel(0), hz_mel(samplerate / 2), N_MEL + 2))
+    bins = np.floor((NFFT + 1) * punti / samplerate).astype(int)
+    filtri = np.zeros((N_MEL, NFFT // 2 + 1))
+    for m in range(1, N_MEL + 1):
+        a, b, c = bins[m - 1], bins[m], bins[m + 1]
+        filtri[m - 1, a:b] = (np.arange(a, b) - a) / max(b - a, 1)
+        filtri[m - 1, b:c] = (c - np.arange(b, c)) / max(c - b, 1)
+    return filtri
+
+def _matrice_dct():
+    n = np.arange(N_MEL)
+    return np.cos(np.pi / N_MEL * (n + 0.5)[None, :] * np.arange(N_MFCC)[:, None])
+
+FILTRI_MEL = _filtri_mel()
+DCT = _matrice_dct()
+FINESTRA = np.hamming(WIN)
+
+def mfcc_frames(frames):
+    """frames (n, WIN) -> MFCC (n, N_MFCC-1), senza c0 (dipende dal volume)"""
+    spettro = np.abs(np.fft.rfft(frames * FINESTRA, NFFT)) ** 2 / NFFT
+    logmel = np.log(spettro @ FILTRI_MEL.T + 1e-10)
+    return (logmel @ DCT.T)[:, 1:]
+
+def preenfasi(audio, precedente=0.0):
+    audio = np.asarray(audio, dtype=np.float64)
+    return audio - 0.97 * np.concatenate([[precedente], audio[:-1]]) if len(audio) else audio
+
+def finestre(audio):
+    """Frame da WIN campioni ogni HOP; ritorna (frames, campioni consumati)"""
+    if len(audio) < WIN:
+        return np.zeros((0, WIN)), 0
+    n = 1 + (len(audio) - WIN) // HOP
+    idx = np.arange(WIN)[None, :] + HOP * np.arange(n)[:, None]
+    return audio[idx], n * HOP
+
+def mfcc(audio):
+    frames, _ = finestre(preenfasi(audio))
+    return mfcc_frames(frames) if len(frames) else np.zeros((0, N_MFCC - 1))
+
+# --- DTW A SOTTOSEQUENZA ---
+def costo_dtw(modello, sequenza):
+    """Costo medio del miglior allineamento del modello dentro la sequenza, per ogni frame finale.
+    Passi (1,1), (1,0), (1,2): ogni riga si calcola in modo vettoriale."""
+    c = np.sqrt(((modello[:, None, :] - sequenza[None, :, :]) ** 2).mean(axis=2))
+    d = c[0].copy()  # inizio libero in qualsiasi punto della sequenza
+    inf = np.full(2, np.inf)
+    for i in range(1, len(modello)):
+        diag = np.concatenate([inf[:1], d[:-1]])
+        salto = np.concatenate([inf, d[:-2]])
+        d = c[i] + np.minimum(np.minimum(d, diag), salto)
+    return d / len(modello)
+
+# --- BUFFER CIRCOLARE ---
+class BufferCircolare:
+    """Ultimi `capacita` campioni audio; le posizioni sono assolute (campioni dall'avvio)"""
+
+    def __init__(self, capacita):
+        self.dati = np.zeros(capacita, dtype=np.float32)
+        self.scritti = 0
+
+    def scrivi(self, blocco):
+        blocco = np.asarray(blocco, dtype=np.float32)[-len(self.dati):]
+        inizio = self.scritti % len(self.dati)
+        fine = inizio + len(blocco)
+        if fine <= len(self.dati):
+            self.dati[inizio:fine] = blocco
+        else:
+            taglio = len(self.dati) - inizio
+            self.dati[inizio:] = blocco[:taglio]
+            self.dati[:fine - len(self.dati)] = blocco[taglio:]
+        self.scritti += len(blocco)
+
+    def da(self, posizione):
+        """Campioni dalla posizione assoluta fino ad ora (troncati alla capacità)"""
+        n = min(self.scritti - posizione, len(self.dati))
+        if n <= 0:
+            return np.zeros(0, dtype=np.float32)
+        fine = self.scritti % len(self.dati)
+        return np.roll(self.dati, -fine)[-n:].copy()
+
+# --- RILEVATORE ---
+def carica_modelli(cartella):
+    modelli = []
+    for path in sorted(glob.glob(os.path.join(cartella, "*.wav"))):
+        audio = kris_vad.ascolta([kris_vad.leggi_wav(path)], listen_timeout=3)
+        if len(audio) >= WIN:
+            modelli.append(mfcc(audio))
+    return modelli
+
+def calibra_soglia(modelli, margine=1.3, default=1.6):
+    """Soglia dal costo massimo tra i modelli stessi: pronunce diverse della parola chiave"""
+    costi = [costo_dtw(a, b).min() for a, b in itertools.permutations(modelli, 2)]
+    return max(costi) * margine if costi else default
+
+class RilevatoreWake:
+    """Riceve blocchi audio dal microfono (o da file) e segnala la parola chiave.
+
+    Costo: un FFT ogni 10 ms più un DTW ogni PASSO frame, solo mentre c'è parlato.
+    """
+    PASSO = 10          # frame MFCC tra due controlli (100 ms)
+    FINESTRA_S = 1.5    # secondi di MFCC confrontati con i modelli
+    REFRATTARIO_S = 1.0
+
+    def __init__(self, modelli, soglia=None, samplerate=SAMPLERATE, buffer_s=10):
+        if not modelli:
+            raise ValueError("Nessun modello per la parola di attivazione")
+        self.modelli = modelli
+        self.soglia = soglia if soglia is not None else calibra_soglia(modelli)
+        self.buffer = BufferCircolare(int(buffer_s * samplerate))
+        self.max_frame = int(self.FINESTRA_S * samplerate / HOP)
+        self.min_parlato = min(len(m) for m in modelli) // 2
+        self.feat = np.zeros((0, N_MFCC - 1))
+        self.energia = np.zeros(0)
+        self.rumore = None
+        self.origine = 0              # campione assoluto del primo frame
+        self.frame_totali = 0         # frame MFCC calcolati da `origine`
+        self.resto = np.zeros(0)      # audio pre-enfatizzato non ancora diviso in frame
+        self.precedente = 0.0
+        self.nuovi = 0
+        self.ultimo_trigger = -10 ** 9
+        self.posizione_trigger = None  # campione assoluto di fine parola chiave
+
+    def elabora(self, blocco):
+        """Aggiunge un blocco; ritorna True se la parola chiave è appena terminata"""
+        blocco = np.asarray(blocco, dtype=np.float32).reshape(-1)
+        if not len(blocco):
+            return False
+        self.buffer.scrivi(blocco)
+        self.resto = np.concatenate([self.resto, preenfasi(blocco, self.precedente)])
+        self.precedente = float(blocco[-1])
+        frames, consumati = finestre(self.resto)
+        if not len(frames):
+            return False
+        self.resto = self.resto[consumati:]
+        energie = np.sqrt((frames ** 2).mean(axis=1))
+        self.feat = np.vstack([self.feat, mfcc_frames(frames)])[-self.max_frame:]
+        self.energia = np.concatenate([self.energia, energie])[-self.max_frame:]
+        self.frame_totali += len(frames)
+        for e in energie:
+            # Rumore di fondo: media mobile dei frame non troppo sopra il livello attuale
+            if self.rumore is None or e < self.rumore * 2:
+                self.rumore = e if self.rumore is None else 0.95 * self.rumore + 0.05 * e
+        self.nuovi += len(frames)
+        if self.nuovi < self.PASSO:
+            return False
+        self.nuovi = 0
+        return self._controlla()
+
+    def _controlla(self):
+        soglia_voce = max(0.005, (self.rumore or 0) * 3)
+        if int((self.energia > soglia_voce).sum()) < self.min_parlato:
+            return False  # niente parlato: il DTW non viene nemmeno calcolato
+        seq = self.feat
+        for modello in self.modelli:
+            if len(modello) > len(seq):
+                continue
+            # Solo i frame finali arrivati dall'ultimo controllo
+            costi = costo_dtw(modello, seq)[-(self.PASSO + 1):]
+            j = int(np.argmin(costi))
+            if costi[j] >= self.soglia:
+                continue
+            frame = self.frame_totali - len(costi) + j
+            posizione = self.origine + frame * HOP + WIN
+            if posizione - self.ultimo_trigger < self.REFRATTARIO_S * SAMPLERATE:
+                return False
+            self.ultimo_trigger = self.posizione_trigger = posizione
+            return True
+        return False
+
+    def riprendi(self):
+        """Riallinea l'analisi al buffer dopo un comando (blocchi passati senza elabora)"""
+        self.origine = self.buffer.scritti
+        self.frame_totali = self.nuovi = 0
+        self.resto = np.zeros(0)
+        self.feat = np.zeros((0, N_MFCC - 1))
+        self.energia = np.zeros(0)
+
+def crea_rilevatore(config):
+    opz = {k: config.get(k, v) for k, v in WAKE_DEFAULT.items()}
+    modelli = carica_modelli(opz["wake_modelli"])
+    return RilevatoreWake(modelli, opz["wake_soglia"], buffer_s=opz["wake_buffer"])
+
+def ascolta_wake(blocchi, rilevatore, stop=None, **parametri_vad):
+    """Ciclo continuo: per ogni attivazione produce l'audio del comando che segue la parola chiave.
+    `blocchi` resta aperto tra un comando e l'altro (microfono o file); `stop` è un threading.Event."""
+    blocchi = iter(blocchi)
+    for blocco in blocchi:
+        if stop is not None and stop.is_set():
+            return
+        if rilevatore.elabora(blocco):
+            coda = rilevatore.buffer.da(rilevatore.posizione_trigger)
+            comando = kris_vad.ascolta(itertools.chain([coda], _inoltra(blocchi, rilevatore)), **parametri_vad)
+            rilevatore.riprendi()
+            yield rilevatore.posizione_trigger / SAMPLERATE, comando
+
+def _inoltra(blocchi, rilevatore):
+    # Anche durante il comando il buffer circolare resta allineato al microfono
+    for blocco in blocchi:
+        rilevatore.buffer.scrivi(blocco)
+        yield blocco
+
+def registra_modello(path, samplerate=SAMPLERATE):
+    """Registra una pronuncia della parola chiave dal microfono (silenzi tagliati)"""
+    audio = kris_vad.ascolta(kris_vad.blocchi_microfono(samplerate), samplerate, listen_timeout=3, vad_silenzio=0.4)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(samplerate)
+        wf.writeframes((np.clip(audio, -1, 1) * 32767).astype("<i2").tobytes())
+    return len(audio) / samplerate
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args[:1] == ["--registra"]:
+        print("Pronuncia la parola chiave...")
+        print(f"Salvato {args[1]} ({registra_modello(args[1]):.2f}s)")
+        sys.exit(0)
+    cartella = WAKE_DEFAULT["wake_modelli"]
+    if args[:1] == ["--modelli"]:
+        cartella, args = args[1], args[2:]
+    for path in args:
+        rilevatore = RilevatoreWake(carica_modelli(cartella))
+        for t, comando in ascolta_wake(kris_vad.blocchi_da_wav(path), rilevatore):
+            print(f"{path}: attivazione a {t:.2f}s, comando di {len(comando) / SAMPLERATE:.2f}s")
@@ -4,45 +4,39 @@ import os
 import json
 import threading
 import time
-import whisper
-import torch
-import subprocess
 import sys
 import sounddevice as sd
 import numpy as np
-import scipy.io.wavfile
-import pyautogui
+import kris_vad
+import kris_wake
+import kris_comandi
+import kris_voce
+import kris_log
+import kris_note
+import kris_buffer
+import kris_app
+import kris_modalita
+import kris_trascrizione
+import kris_risposte
+import kris_config
+import kris_ui
+import kris_digitazione
 import webbrowser
 import coqui_tts
 
 CONFIG_FILE = "config.json"
 NOTE_DIR = "note"
-LOG_FILE = "logs/kris_log.txt"
-
-# --- CONFIGURAZIONE DI DEFAULT ---
-default_config = {
-    "blacklist": [],
-    "voice": None,
-    "rate": 150,
-    "volume": 1.0,
-    "note_dir": NOTE_DIR,
-    "browser": "brave",
-    "nome_utente": "Kris",
-    "wake_enabled": True,
-    "custom_commands": {}
-}
-
-# --- CARICAMENTO/CREAZIONE CONFIGURAZIONE ---
+LOG_FILE = "logs/kris_log.jsonl"
+
+# --- CARICAMENTO/CREAZIONE CONFIGURAZIONE (schema e validazione comuni: kris_config.py) ---
 def load_config():
-    if not os.path.exists(CONFIG_FILE):
-        save_config(default_config)
-        return default_config.copy()
-    with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    config, avvisi = kris_config.carica(CONFIG_FILE)
+    for avviso in avvisi:
+        print("Config:", avviso)
+    return config
 
 def save_config(cfg):
-    with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-        json.dump(cfg, f, indent=2)
+    kris_config.salva(CONFIG_FILE, cfg)
 
 # --- CREA CARTELLE ---
 config = load_config()
@@ -51,84 +45,130 @@ if not os.path.exists(config["note_dir"]):
 if not os.path.exists("logs"):
     os.makedirs("logs")
 
-lock = threading.Lock()
-current_text = ""
+# Testo dettato a segmenti con diario su disco: ripreso dopo un crash, "salva nota" sposta il diario fra le note
+dettato = kris_buffer.BufferDettatura(config.get("dettatura_diario", kris_buffer.DIARIO_DEFAULT))
 reading_emails = True
 last_command = ""
 wake_enabled = config.get("wake_enabled", True)
 
 # --- PARLA ---
-def speak(text):
+# Un solo worker vocale con coda a priorità, invece di un processo pyttsx3 per ogni frase
+voce = kris_voce.VoceWorker(kris_voce.SinkPyttsx3(config.get("voice"), config.get("rate", 150), config.get("volume", 1.0)))
+
+def speak(text, priorita=kris_voce.PRIORITA_CONFERMA, interrompi=False):
     print(f"[SPEAK] {text}")
-    threading.Thread(target=lambda: os.system(f"echo {text} | python3 -m pyttsx3 > nul"), daemon=True).start()
+    voce.parla(text, priorita, interrompi)
 
-# --- INIZIALIZZA WHISPER ---
+# --- INIZIALIZZA WHISPER (modello, backend e precisione da config: kris_trascrizione.py) ---
 try:
-    model = whisper.load_model("base")
+    model = kris_trascrizione.crea_backend(config)
+    print("Modello vocale:", model.descrizione())
 except Exception as e:
     print("Errore nel caricamento di Whisper:", e)
     sys.exit(1)
 
+# Modello piccolo per i comandi brevi (kris_modalita.py); se non si carica, i comandi usano il principale
+model_comandi = model
+parametri_comandi = kris_trascrizione.parametri_comandi(config)
+if parametri_comandi != kris_trascrizione.parametri_da_config(config):
+    try:
+        model_comandi = kris_trascrizione.crea_backend({**config, **parametri_comandi})
+    except Exception as e:
+        print("Errore nel caricamento del modello dei comandi, uso quello principale:", e)
+
 # --- TRASCRIZIONE AUDIO ---
-def trascrivi_audio():
-    samplerate = 16000
-    duration = 5
+SAMPLERATE = 16000  # Whisper lavora a 16 kHz mono
+
+def audio_per_whisper(audio):
+    """Buffer float32 mono contiguo: Whisper calcola il log-mel direttamente dall'array"""
+    audio = np.squeeze(np.asarray(audio))
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    return np.ascontiguousarray(audio, dtype=np.float32)
+
+def _decodifica(audio, modalita, **opzioni):
+    modello = model_comandi if modalita == "comando" else model
+    return modello.trascrivi(audio, config.get("language", "it"), **opzioni)
+
+def trascrivi(audio):
+    if audio.size == 0:
+        return ""
+    # Niente temp.wav: il buffer in memoria va a Whisper senza passare da disco e ffmpeg
+    testo, _, _ = kris_modalita.trascrivi(audio_per_whisper(audio), _decodifica, registro,
+                                          config["trascrizione_modalita"], SAMPLERATE)
+    return testo
+
+def trascrivi_audio(sorgente=None, audio=None):
+    """Ascolta e trascrive; con `audio` (es. il comando dopo la parola di attivazione) trascrive soltanto"""
     try:
-        speak("Dimmi " + config.get("nome_utente", "Kris"))
-        audio = sd.rec(int(samplerate * duration), samplerate=samplerate, channels=1, dtype='float32')
-        sd.wait()
-        audio = np.squeeze(audio)
-        audio_path = "temp.wav"
-        scipy.io.wavfile.write(audio_path, samplerate, audio)
-        result = model.transcribe(audio_path, language='it')
-        os.remove(audio_path)
-        return result["text"]
+        if audio is None:
+            speak("Dimmi " + config.get("nome_utente", "Kris"), interrompi=True)
+            voce.attendi_silenzio(10)  # la voce non deve finire nell'ascolto
+            if sorgente is None:
+                sorgente = kris_vad.blocchi_microfono(SAMPLERATE)
+            audio = kris_vad.ascolta(sorgente, SAMPLERATE, **kris_vad.parametri_da_config(config))
+        return trascrivi(audio)
     except Exception as e:
         return f"[Errore audio: {e}]"
 
-# --- SALVA NOTA ---
+# --- SALVA NOTA (nomi univoci, indice di ricerca aggiornato a ogni salvataggio) ---
+archivio_note = kris_note.ArchivioNote(config["note_dir"])
+
 def salva_nota(text):
-    fname = time.strftime("%Y%m%d_%H%M%S.txt")
-    fpath = os.path.join(config["note_dir"], fname)
-    with open(fpath, "w", encoding="utf-8") as f:
-        f.write(text)
-    return fpath
+    return archivio_note.salva(text)
+
+def cerca_note(query, n=3):
+    """[(punteggio, path, anteprima)] delle note più pertinenti"""
+    return archivio_note.cerca(query, n)
+
+# --- APRI APP (indice delle applicazioni installate, aggiornato in background) ---
+indice_app = kris_app.IndiceApp(config.get("app_indice", kris_app.INDICE_DEFAULT),
+                                alias={"browser": config["browser"], **config.get("app_alias", {})}).avvia()
 
-# --- APRI APP ---
 def apri_app(nome):
-    nome = nome.lower()
-    if "notepad" in nome or "blocco" in nome:
-        subprocess.Popen(["notepad.exe"])
-        return "Blocco note aperto."
-    elif "calcolatrice" in nome:
-        subprocess.Popen(["calc.exe"])
-        return "Calcolatrice aperta."
-    elif "thunderbird" in nome:
-        subprocess.Popen(["C:\\Program Files\\Mozilla Thunderbird\\thunderbird.exe"])
-        return "Thunderbird avviato."
-    elif "brave" in nome:
-        subprocess.Popen(["C:\\Program Files\\BraveSoftware\\Brave-Browser\\Application\\brave.exe"])
-        return "Brave avviato."
-    elif "prompt" in nome or "cmd" in nome:
-        subprocess.Popen(["cmd.exe"])
-        return "Prompt dei comandi aperto."
-    elif "esplora" in nome or "cartella" in nome:
-        subprocess.Popen(["explorer.exe"])
-        return "Esplora file aperto."
-    else:
-        return "Applicazione non riconosciuta."
-
-# --- RICERCA WEB ---
+    return indice_app.apri(nome)
+
+# --- DIGITA (testo dettato nella finestra attiva: appunti o battitura a blocchi, kris_digitazione.py) ---
+_iniettore = None
+
+def digita(testo):
+    global _iniettore
+    if _iniettore is None:
+        _iniettore = kris_digitazione.crea_iniettore(config)
+    _iniettore.scrivi(testo)
+
+# --- RICERCA (risposte offline: modello locale o note, kris_risposte.py) ---
+risponditore = kris_risposte.Risponditore(config, archivio_note)
+
+def _rispondi(query):
+    # Ogni frase è letta appena il modello la completa, senza aspettare la risposta intera
+    try:
+        risponditore.rispondi(query, lambda frase: speak(frase, kris_voce.PRIORITA_LETTURA))
+    except Exception as e:
+        speak(f"Errore nella risposta: {e}", kris_voce.PRIORITA_ERRORE)
+
 def ricerca_web(query):
-    speak("Sto cercando...")
-    # Simulazione AI come Siri: solo feedback vocale, no browser
-    # TODO: Integrare con LLM se disponibile offline
-    return f"Ho cercato: {query}. Vuoi che continui a cercare o va bene così?"
+    if not query:
+        return "Cosa cerco?"
+    pronta = risponditore.in_cache(query)
+    if pronta is not None:
+        return " ".join(pronta)
+    threading.Thread(target=_rispondi, args=(query,), daemon=True).start()
+    return "Sto cercando..."
+
+# --- GRAMMATICA COMANDI ---
+registro = kris_comandi.RegistroComandi()
+kris_comandi.registra_predefiniti(registro)
+registro.registra("scrivi", ["mi digiti"], kris_comandi.OVUNQUE)
+registro.registra("ripeti", ["ripeti"], kris_comandi.OVUNQUE)
+registro.imposta_blacklist(config.get("blacklist", []))
+registro.imposta_personalizzati(config.get("custom_commands", {}))
 
 # --- LOG ---
-def log_command(cmd):
-    with open(LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(f"[{time.strftime('%H:%M:%S')}] {cmd}\n")
+eventi = kris_log.crea_registro({"log_file": LOG_FILE, **config})
+
+def log_command(cmd, intento=None, latenze=None, esito=None):
+    eventi.registra(testo=cmd, intento=intento, latenze=latenze or {}, esito=esito)
 
 # --- UI PRINCIPALE ---
 class KITTUI(tk.Tk):
@@ -142,9 +182,11 @@ class KITTUI(tk.Tk):
         self.display.pack(fill="both", padx=10, pady=10)
         self.display.insert("end", ">>> KRIS ASSISTANT ALPHA <<<\n")
         self.display.configure(state="disabled")
+        self.trascritto = kris_ui.Trascritto(self.display, config.get("display_max_righe", kris_ui.MAX_RIGHE))
         self.led_canvas = tk.Canvas(self, width=400, height=30, bg="#111", highlightthickness=0)
         self.led_canvas.pack(pady=5)
         self.leds = [self.led_canvas.create_oval(10+40*i,5,40+40*i,25,fill="#222",outline="#39ff14",width=2) for i in range(10)]
+        self.barra_led = kris_ui.BarraLED(self.led_canvas, self.leds)
         btn_frame = tk.Frame(self, bg="#111")
         btn_frame.pack()
         tk.Button(btn_frame, text="Parla", font=("Consolas", 12), command=self.comando_vocale).pack(side="left", padx=7)
@@ -153,15 +195,41 @@ class KITTUI(tk.Tk):
         self.toggle_btn = tk.Button(btn_frame, text="Wake On" if wake_enabled else "Wake Off", font=("Consolas", 12), command=self.toggle_wake)
         self.toggle_btn.pack(side="left", padx=7)
         tk.Button(btn_frame, text="Esci", font=("Consolas", 12), command=self.destroy).pack(side="left", padx=7)
-        self.after(100, self.anim_led)
-        self.anim_idx = 0
+        # Wake e comandi girano in thread separati: i widget si aggiornano solo dagli eventi in coda
+        self.fase = None
+        self.parlando = False
+        self.eventi_ui = kris_ui.CodaUI(self, {
+            "riga": self.mostra,
+            "fase": self.imposta_fase,
+            "voce": self.imposta_voce,
+            "esci": self.quit
+        }).avvia()
+        voce.al_cambio_voce = lambda parlando: self.eventi_ui.posta("voce", parlando)
+        self.wake_stop = None
+        if wake_enabled:
+            self.avvia_wake()
 
-    def anim_led(self):
-        for i, led in enumerate(self.leds):
-            color = "#39ff14" if i == self.anim_idx else "#222"
-            self.led_canvas.itemconfig(led, fill=color)
-        self.anim_idx = (self.anim_idx + 1) % len(self.leds)
-        self.after(120, self.anim_led)
+    def mostra(self, riga):
+        self.trascritto.aggiungi(riga)
+
+    # LED animati solo durante ascolto, trascrizione e voce; a riposo spenti
+    def aggiorna_led(self):
+        if self.fase == "ascolto":
+            self.barra_led.imposta("#39ff14", "scansione")
+        elif self.fase == "trascrizione":
+            self.barra_led.imposta("#ffbf00", "scansione")
+        elif self.parlando:
+            self.barra_led.imposta("#39ff14", "lampeggio")
+        else:
+            self.barra_led.imposta(None)
+
+    def imposta_fase(self, fase):
+        self.fase = fase
+        self.aggiorna_led()
+
+    def imposta_voce(self, parlando):
+        self.parlando = parlando
+        self.aggiorna_led()
 
     def toggle_wake(self):
         global wake_enabled
@@ -169,87 +237,134 @@ class KITTUI(tk.Tk):
         config["wake_enabled"] = wake_enabled
         save_config(config)
         self.toggle_btn.config(text="Wake On" if wake_enabled else "Wake Off")
+        if wake_enabled:
+            self.avvia_wake()
+        elif self.wake_stop:
+            self.wake_stop.set()
+
+    # --- PAROLA DI ATTIVAZIONE: Whisper parte solo dopo "KIT"/"Kris" ---
+    def avvia_wake(self):
+        try:
+            rilevatore = kris_wake.crea_rilevatore(config)
+        except ValueError:
+            self.mostra("[KRIS] Nessun modello wake: python kris_wake.py --registra wake/kit_1.wav")
+            return
+        if self.wake_stop:
+            self.wake_stop.set()
+        self.wake_stop = threading.Event()
+        threading.Thread(target=self._ascolto_wake, args=(rilevatore, self.wake_stop), daemon=True).start()
+
+    def _ascolto_wake(self, rilevatore, stop):
+        blocchi = kris_vad.blocchi_microfono(SAMPLERATE)
+        try:
+            for _, audio in kris_wake.ascolta_wake(blocchi, rilevatore, stop, **kris_vad.parametri_da_config(config)):
+                self.eventi_ui.posta("fase", "trascrizione")
+                self._process_comando(audio)
+        finally:
+            blocchi.close()
 
     def comando_vocale(self):
-        self.display.configure(state="normal")
-        self.display.insert("end", f"\n[KRIS] In ascolto...\n")
-        self.display.see("end")
-        self.display.configure(state="disabled")
+        voce.interrompi()  # barge-in: un nuovo comando zittisce la lettura in corso
+        self.mostra("\n[KRIS] In ascolto...")
+        self.imposta_fase("ascolto")
+        self.eventi_ui.sveglia()
         threading.Thread(target=self._process_comando, daemon=True).start()
 
-    def _process_comando(self):
-        global current_text, last_command
-        text = trascrivi_audio().strip().lower()
+    def _process_comando(self, audio=None):
+        global last_command
+        t_inizio = time.perf_counter()
+        latenze = {}
+        self.ultimo_intento = None
+        text = trascrivi_audio(audio=audio).strip().lower()
+        latenze["trascrizione"] = time.perf_counter() - t_inizio
         if not text:
             r = "[Nessun comando rilevato]"
         else:
             last_command = text
+            t0 = time.perf_counter()
             r = self.processa_comando(text)
-        log_command(text)
-        self.display.configure(state="normal")
-        self.display.insert("end", f"> {text}\n{r}\n")
-        self.display.see("end")
-        self.display.configure(state="disabled")
+            latenze["comando"] = time.perf_counter() - t0
+        latenze["totale"] = time.perf_counter() - t_inizio
+        log_command(text, self.ultimo_intento, latenze, r)
+        self.eventi_ui.posta("fase", None)
+        self.eventi_ui.posta("riga", f"> {text}\n{r}")
         speak(r)
 
     def processa_comando(self, text):
-        global current_text, reading_emails
-        if any(b in text for b in config["blacklist"]):
-            return "[Comando bloccato]"
-        if text.startswith("scrivi") or "mi digiti" in text:
-            content = text.split("scrivi", 1)[-1] if "scrivi" in text else text.split("digiti", 1)[-1]
-            pyautogui.typewrite(content.strip())
-            return "Testo digitato."
-        elif text.startswith("salva nota"):
-            with lock:
-                if not current_text.strip():
-                    return "Nessun testo da salvare."
-                path = salva_nota(current_text)
-                current_text = ""
-            return f"Nota salvata in {path}"
-        elif text.startswith("apri "):
-            return apri_app(text[5:])
-        elif text.startswith("fai una ricerca") or text.startswith("kit cerca"):
-            query = text.split("cerca", 1)[-1].strip()
-            return ricerca_web(query)
-        elif text in config.get("custom_commands", {}):
-            return config["custom_commands"][text]
-        elif "non leggere le email" in text:
-            reading_emails = False
-            return "Lettura email disattivata."
-        elif "leggi tutto" in text:
-            with lock:
-                if not current_text.strip():
-                    speak("Nessun testo da leggere.")
-                    return ""
-                speak(current_text)
-                return "[Sintesi vocale avviata]"
-        elif "ripeti" in text:
-            speak(last_command)
-            return f"[Ultimo comando: {last_command}]"
-        elif "esci" in text:
-            self.quit()
-            return "Arrivederci!"
-        else:
+        intento = registro.riconosci(text)
+        self.ultimo_intento = intento.nome if intento else None
+        if intento is None:
             return "[Comando non riconosciuto]"
+        if intento.nome == kris_comandi.BLOCCATO:
+            return "[Comando bloccato]"
+        if intento.nome == kris_comandi.PERSONALIZZATO:
+            return intento.argomenti
+        return getattr(self, "cmd_" + intento.nome)(intento.argomenti)
+
+    # --- GESTORI DEI COMANDI ---
+    def cmd_scrivi(self, argomenti):
+        dettato.aggiungi(argomenti)
+        try:
+            digita(argomenti)
+        except Exception as e:   # DigitazioneNonDisponibile, appunti occupati, xdotool fallito...
+            return f"[Testo non digitato: {e}]"
+        return "Testo digitato."
+
+    def cmd_salva_nota(self, argomenti):
+        path = dettato.finalizza(archivio_note)
+        if path is None:
+            return "Nessun testo da salvare."
+        return f"Nota salvata in {path}"
+
+    def cmd_annulla_ultimo(self, argomenti):
+        tolto = dettato.annulla_ultimo()
+        return "Niente da annullare." if tolto is None else f"Tolto: {tolto}"
+
+    def cmd_apri(self, argomenti):
+        return apri_app(argomenti)
+
+    def cmd_cerca(self, argomenti):
+        return ricerca_web(argomenti)
+
+    def cmd_cerca_note(self, argomenti):
+        if not argomenti:
+            return "Cosa cerco nelle note?"
+        risultati = cerca_note(argomenti)
+        if not risultati:
+            return f"Nessuna nota trovata per: {argomenti}"
+        righe = [f"{os.path.basename(path)}: {anteprima}" for _, path, anteprima in risultati]
+        return f"Note trovate: {len(risultati)}.\n" + "\n".join(righe)
+
+    def cmd_non_leggere_email(self, argomenti):
+        global reading_emails
+        reading_emails = False
+        return "Lettura email disattivata."
+
+    def cmd_leggi_tutto(self, argomenti):
+        testo = dettato.testo()
+        if not testo:
+            speak("Nessun testo da leggere.")
+            return ""
+        speak(testo, kris_voce.PRIORITA_LETTURA)
+        return "[Sintesi vocale avviata]"
+
+    def cmd_ripeti(self, argomenti):
+        speak(last_command)
+        return f"[Ultimo comando: {last_command}]"
+
+    def cmd_esci(self, argomenti):
+        self.eventi_ui.posta("esci")
+        return "Arrivederci!"
 
     def leggi_tutto(self):
-        global current_text
-        with lock:
-            if not current_text.strip():
-                speak("Nessun testo da leggere.")
-            else:
-                speak(current_text)
+        self.cmd_leggi_tutto("")
 
     def salva_nota(self):
-        global current_text
-        with lock:
-            if not current_text.strip():
-                messagebox.showinfo("KRIS", "Nessun testo da salvare.")
-            else:
-                path = salva_nota(current_text)
-                messagebox.showinfo("KRIS", f"Nota salvata in\n{path}")
-                current_text = ""
+        path = dettato.finalizza(archivio_note)
+        if path is None:
+            messagebox.showinfo("KRIS", "Nessun testo da salvare.")
+        else:
+            messagebox.showinfo("KRIS", f"Nota salvata in\n{path}")
 
 if __name__ == "__main__":
     app = KITTUI()
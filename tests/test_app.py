@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+import kris_app
+
+def _desktop(cartella, nome_file, **campi):
+    righe = ["[Desktop Entry]", "Type=Application"] + [f"{k.replace('_it', '[it]')}={v}" for k, v in campi.items()]
+    (cartella / nome_file).write_text("\n".join(righe) + "\n", encoding="utf-8")
+
+def _eseguibile(cartella, nome):
+    path = cartella / nome
+    path.write_text("#!/bin/sh\n", encoding="utf-8")
+    path.chmod(0o755)
+
+@pytest.fixture
+def cartelle(tmp_path):
+    applicazioni, binari = tmp_path / "applications", tmp_path / "bin"
+    applicazioni.mkdir()
+    binari.mkdir()
+    _desktop(applicazioni, "org.gnome.Calculator.desktop", Name="Calculator", Name_it="Calcolatrice",
+             Exec="gnome-calculator")
+    _desktop(applicazioni, "thunderbird.desktop", Name="Thunderbird", Exec="thunderbird %u")
+    _desktop(applicazioni, "meteo.desktop", Name_it="Città e Meteo", Name="Weather", Exec="meteo")
+    _desktop(applicazioni, "nascosta.desktop", Name="Nascosta", Exec="nascosta", NoDisplay="true")
+    for nome in ("node", "reboot", "notepad"):
+        _eseguibile(binari, nome)
+    return tmp_path
+
+def _indice(cartelle, alias=None):
+    sorgenti = [("desktop", str(cartelle / "applications"), True), ("eseguibili", str(cartelle / "bin"), False)]
+    return kris_app.IndiceApp(str(cartelle / "indice.json"), sorgenti, alias)
+
+def _trovata(indice, nome):
+    trovate = indice.trova(nome, 1)
+    return trovate[0][1]["nome"] if trovate else None
+
+@pytest.mark.skipif(os.name == "nt", reason="eseguibili col bit x")
+def test_ricerca(cartelle):
+    indice = _indice(cartelle)
+    indice.aggiorna()
+    assert _trovata(indice, "calcolatrice") == "Calcolatrice"
+    assert _trovata(indice, "calcolatrise") == "Calcolatrice"       # errore di trascrizione
+    assert _trovata(indice, "tunderbird") == "Thunderbird"
+    assert _trovata(indice, "nascosta") is None
+
+@pytest.mark.parametrize("detto", ["città e meteo", "citta e meteo", "CITTÀ E METEO"])
+def test_accenti(cartelle, detto):
+    indice = _indice(cartelle)
+    indice.aggiorna()
+    assert _trovata(indice, detto) == "Città e Meteo"
+
+@pytest.mark.skipif(os.name == "nt", reason="eseguibili col bit x")
+def test_eseguibili_solo_da_alias(cartelle):
+    indice = _indice(cartelle)
+    indice.aggiorna()
+    assert _trovata(indice, "note") is None          # niente /usr/bin/node per somiglianza
+    assert _trovata(indice, "node") is None          # nemmeno col nome esatto, se non è in un alias
+    assert _trovata(indice, "reboot") is None
+    assert _trovata(indice, "blocco note") == "notepad"
+    assert _trovata(indice, "notepad") == "notepad"  # destinazione di un alias predefinito
+    assert _trovata(indice, "notepat") is None       # ma solo col nome esatto
+    indice.imposta_alias({"javascript": "node"})
+    assert _trovata(indice, "javascript") == "node"
+    assert _trovata(indice, "node") == "node"
+
+def test_aggiornamento_incrementale(cartelle):
+    indice = _indice(cartelle)
+    assert indice.aggiorna() == 2
+    assert indice.aggiorna() == 0                    # niente cambiato: solo stat
+    applicazioni = cartelle / "applications"
+    _desktop(applicazioni, "gimp.desktop", Name="GIMP", GenericName_it="Editor di immagini", Exec="gimp %U")
+    st = os.stat(applicazioni)
+    os.utime(applicazioni, (st.st_atime, st.st_mtime + 1))
+    assert indice.aggiorna() == 1                    # riletta solo la cartella cambiata
+    assert _trovata(indice, "gimp") == "GIMP"
+    # L'indice salvato risponde subito al prossimo avvio, prima dell'aggiornamento
+    riaperto = _indice(cartelle)
+    assert riaperto.pronto.is_set()
+    assert _trovata(riaperto, "editor di immagini") == "GIMP"
@@ -0,0 +1,31 @@
+"""Un modello che non si carica ferma la trascrizione in blocco con un solo messaggio, senza eccezioni
+e senza toccare il manifesto."""
+import json
+import os
+
+import numpy as np
+
+import kris_batch
+import kris_voce
+
+def _wav(path, secondi):
+    pcm = (np.sin(np.arange(int(secondi * 16000)) / 8) * 8000).astype("<i2").tobytes()
+    kris_voce.scrivi_wav(str(path), pcm, 16000)
+
+def test_modello_non_caricato(tmp_path, capsys):
+    cartella = tmp_path / "registrazioni"
+    cartella.mkdir()
+    for i in range(4):
+        _wav(cartella / f"r{i}.wav", 2)
+    fatto = cartella / "fatto.wav"
+    _wav(fatto, 1)
+    manifesto = kris_batch.Manifesto(str(cartella))
+    manifesto.segna(str(fatto), None, 1.0)
+    config = {"whisper_backend": "nessuno", "note_dir": str(tmp_path / "note")}
+    assert kris_batch.trascrivi_cartella(str(cartella), config, processi=2, lotto=1) is False
+    uscita = capsys.readouterr().out
+    assert uscita.count("Interrotto:") == 1
+    assert "whisper_backend non valido" in uscita
+    with open(cartella / kris_batch.MANIFESTO, encoding="utf-8") as f:
+        assert list(json.load(f)) == ["fatto.wav"]
+    assert not os.path.exists(tmp_path / "note") or not os.listdir(tmp_path / "note")
@@ -0,0 +1,89 @@
+"""Una dettatura in tempo reale arriva a pezzi ma è un segmento solo: una riga del diario e un solo
+"annulla ultima frase"."""
+import time
+
+import kris_buffer
+
+def _buffer(tmp_path):
+    return kris_buffer.BufferDettatura(str(tmp_path / "dettatura.journal"), intervallo_fsync=0)
+
+def _diario(buffer):
+    buffer.chiudi()
+    with open(buffer.path, encoding="utf-8") as f:
+        return f.read()
+
+def test_segmento_aperto_allungato_e_chiuso(tmp_path):
+    buffer = _buffer(tmp_path)
+    buffer.aggiungi("prima frase")
+    for pezzo in ("oggi ho", "comprato il", "pane"):
+        buffer.aggiungi(pezzo, continua=True)
+    buffer.chiudi_segmento()
+    buffer.aggiungi("ultima", continua=True)
+    buffer.chiudi_segmento()
+    assert buffer.segmenti == ["prima frase", "oggi ho comprato il pane", "ultima"]
+    assert _diario(buffer) == "prima frase\noggi ho comprato il pane\nultima\n"
+
+def test_annulla_toglie_tutta_la_dettatura(tmp_path):
+    buffer = _buffer(tmp_path)
+    buffer.aggiungi("prima frase")
+    for pezzo in ("oggi ho", "comprato il", "pane"):
+        buffer.aggiungi(pezzo, continua=True)
+    buffer.chiudi_segmento()
+    assert buffer.annulla_ultimo() == "oggi ho comprato il pane"
+    assert buffer.testo() == "prima frase"
+    assert _diario(buffer) == "prima frase\n"
+
+def test_annulla_durante_la_dettatura(tmp_path):
+    buffer = _buffer(tmp_path)
+    buffer.aggiungi("oggi ho", continua=True)
+    assert buffer.annulla_ultimo() == "oggi ho"
+    buffer.aggiungi("di nuovo", continua=True)
+    buffer.chiudi_segmento()
+    assert buffer.segmenti == ["di nuovo"]
+    assert _diario(buffer) == "di nuovo\n"
+
+def test_scrivi_chiude_il_segmento_aperto(tmp_path):
+    buffer = _buffer(tmp_path)
+    buffer.aggiungi("oggi ho", continua=True)
+    buffer.aggiungi("scritto a parte")
+    assert buffer.segmenti == ["oggi ho", "scritto a parte"]
+    assert _diario(buffer) == "oggi ho\nscritto a parte\n"
+
+def test_ripresa_di_un_segmento_aperto(tmp_path):
+    buffer = _buffer(tmp_path)
+    buffer.aggiungi("chiusa")
+    buffer.aggiungi("oggi ho", continua=True)
+    buffer.aggiungi("comprato", continua=True)
+    buffer.chiudi()   # crash durante la dettatura: la riga aperta resta senza "\n"
+    ripreso = _buffer(tmp_path)
+    assert ripreso.recuperati == 2
+    assert ripreso.segmenti == ["chiusa", "oggi ho comprato"]
+    assert _diario(ripreso) == "chiusa\noggi ho comprato\n"
+
+def test_finalizza_con_segmento_aperto(tmp_path):
+    buffer = _buffer(tmp_path)
+    buffer.aggiungi("oggi ho", continua=True)
+
+    class Archivio:
+        def importa(self, sorgente, testo):
+            with open(sorgente, encoding="utf-8") as f:
+                self.contenuto, self.testo = f.read(), testo
+            return "nota.txt"
+    archivio = Archivio()
+    assert buffer.finalizza(archivio) == "nota.txt"
+    assert archivio.contenuto == archivio.testo == "oggi ho\n"
+    buffer.aggiungi("dopo", continua=True)
+    assert buffer.testo() == "dopo" and not buffer.vuoto()
+    buffer.chiudi()
+
+def test_dettatura_lunga_in_tempo_lineare(tmp_path):
+    buffer = kris_buffer.BufferDettatura(str(tmp_path / "dettatura.journal"))
+    parole = [f"parola{i}" for i in range(50000)]
+    t0 = time.perf_counter()
+    for parola in parole:
+        buffer.aggiungi(parola, continua=True)
+    assert time.perf_counter() - t0 < 5   # ricostruendo il segmento a ogni parola sono decine di GB copiati
+    assert not buffer.vuoto()
+    buffer.chiudi_segmento()
+    assert buffer.segmenti == [" ".join(parole)]
+    assert _diario(buffer) == " ".join(parole) + "\n"
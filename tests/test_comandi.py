@@ -0,0 +1,42 @@
+import pytest
+
+import kris_comandi
+
+@pytest.fixture(scope="module")
+def registro():
+    registro = kris_comandi.RegistroComandi()
+    kris_comandi.registra_predefiniti(registro)
+    return registro
+
+def _nome(registro, testo):
+    intento = registro.riconosci(testo)
+    return intento.nome if intento else None
+
+@pytest.mark.parametrize("testo", [
+    "io esco",
+    "non so se esce",
+    "esca dal file",
+    "la ricerca esce domani",
+    "non so se esci",
+    "esci dal file",
+])
+def test_esci_non_scatta_nel_parlato(registro, testo):
+    assert _nome(registro, testo) != "esci"
+
+@pytest.mark.parametrize("testo", ["esci", "Esci.", "kit esci"])
+def test_esci(registro, testo):
+    assert _nome(registro, testo) == "esci"
+
+@pytest.mark.parametrize("testo", ["salva notta", "salve nota"])
+def test_salva_nota_solo_esatto(registro, testo):
+    assert _nome(registro, testo) != "salva_nota"
+
+def test_correzione_per_gli_altri_comandi(registro):
+    assert _nome(registro, "salva nota") == "salva_nota"
+    intento = registro.riconosci("apre blocco note")
+    assert intento.nome == "apri" and intento.argomenti == "blocco note"
+    assert _nome(registro, "cerca nele note gatto") == "cerca_note"
+
+def test_ovunque_senza_correzione(registro):
+    assert _nome(registro, "adesso leggi tutto") == "leggi_tutto"
+    assert _nome(registro, "adesso leggi tuto") is None
@@ -0,0 +1,115 @@
+"""Config: migrazione dal formato vecchio, unione in profondità, validazione, ricarica a caldo."""
+import json
+import os
+import threading
+
+import pytest
+
+import kris_config
+
+def _scrivi(path, dati):
+    path.write_text(json.dumps(dati), encoding="utf-8")
+
+def test_migrazione_voice_settings(tmp_path):
+    path = tmp_path / "config.json"
+    _scrivi(path, {"voice_settings": {"rate": 180, "volume": 0.8, "voice_index": 2},
+                   "directories": {"notes_dir": "appunti"},
+                   "blacklist": ["spegni"], "blacklist_commands": ["spegni", "formatta"]})
+    config, avvisi = kris_config.carica(str(path))
+    assert config["rate"] == 180 and config["volume"] == 0.8 and config["note_dir"] == "appunti"
+    assert config["blacklist"] == ["spegni", "formatta"]
+    assert config["versione"] == kris_config.VERSIONE
+    assert "voice_settings" not in config and "directories" not in config
+    assert any("convertito" in a for a in avvisi)
+    # Il file è riscritto nel formato nuovo: al prossimo avvio niente da migrare
+    salvata = json.loads(path.read_text(encoding="utf-8"))
+    assert salvata["rate"] == 180 and "voice_settings" not in salvata
+    assert kris_config.carica(str(path))[1] == []
+
+def test_migrazione_non_tocca_i_valori_nuovi():
+    migrata = kris_config.migra({"rate": 200, "voice_settings": {"rate": 120}})
+    assert migrata["rate"] == 200
+
+def test_unione_in_profondita():
+    base = kris_config.predefinita()
+    unita = kris_config.unisci_profondo(base, {"response_timing": {"vad_silenzio": 1.2}, "rate": 170})
+    assert unita["response_timing"]["vad_silenzio"] == 1.2
+    assert unita["response_timing"]["listen_timeout"] == base["response_timing"]["listen_timeout"]
+    assert unita["rate"] == 170
+    assert base["rate"] == 150 and base["response_timing"]["vad_silenzio"] == 0.7   # base non modificata
+
+def test_validazione_con_default_e_avvisi():
+    config, avvisi = kris_config.valida(kris_config.unisci_profondo(kris_config.predefinita(), {
+        "rate": 9999, "volume": 1, "voice": None, "blacklist": ["a", 3], "pipeline_politica": "boh",
+        "response_timing": {"vad_silenzio": -1}, "chiave_mia": "resta"}))
+    assert config["rate"] == 150
+    assert config["volume"] == 1.0 and isinstance(config["volume"], float)
+    assert config["voice"] is None
+    assert config["blacklist"] == []
+    assert config["pipeline_politica"] == "annulla"
+    assert config["response_timing"]["vad_silenzio"] == 0.7
+    assert config["chiave_mia"] == "resta"
+    assert len(avvisi) == 4 and any(a.startswith("response_timing.vad_silenzio") for a in avvisi)
+
+def test_sotto_schema_non_oggetto():
+    config, avvisi = kris_config.valida({"response_timing": 5})
+    assert config["response_timing"] == kris_config.predefinita()["response_timing"]
+    assert avvisi
+
+def test_json_illeggibile(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text("{rotto", encoding="utf-8")
+    with pytest.raises(ValueError):
+        kris_config.carica(str(path))
+
+def test_osservatore_applica_le_modifiche(tmp_path):
+    path = tmp_path / "config.json"
+    config, _ = kris_config.carica(str(path))
+    applicate = []
+    osservatore = kris_config.OsservatoreConfig(str(path), config, lambda c, cambiate: applicate.append(cambiate))
+    assert not osservatore.controlla()
+    kris_config.salva(str(path), {**config, "rate": 175})
+    os.utime(path, ns=(1, 1))   # la data cambia anche se il file è scritto nello stesso istante
+    assert osservatore.controlla()
+    assert applicate == [{"rate"}] and osservatore.config["rate"] == 175
+    assert not osservatore.controlla()
+
+def test_osservatore_applica_una_volta_da_due_thread(tmp_path, monkeypatch):
+    path = tmp_path / "config.json"
+    config, _ = kris_config.carica(str(path))
+    applicate = []
+    partenza = threading.Barrier(2)
+    carica, differenze = kris_config.carica, kris_config.differenze
+
+    def _insieme(barriera, funzione):
+        # Senza lock i due thread arrivano qui insieme, leggono la stessa firma e vedono entrambi la modifica
+        def _attende(*args, **kwargs):
+            try:
+                barriera.wait()
+            except threading.BrokenBarrierError:
+                pass
+            return funzione(*args, **kwargs)
+        return _attende
+    monkeypatch.setattr(kris_config, "carica", _insieme(threading.Barrier(2, timeout=0.2), carica))
+    monkeypatch.setattr(kris_config, "differenze", _insieme(threading.Barrier(2, timeout=0.2), differenze))
+    osservatore = kris_config.OsservatoreConfig(str(path), config, lambda nuova, cambiate: applicate.append(cambiate))
+    kris_config.salva(str(path), {**config, "whisper_model": "small"})
+    os.utime(path, ns=(2, 2))
+
+    def _controlla():
+        partenza.wait()
+        osservatore.controlla()
+    thread = [threading.Thread(target=_controlla) for _ in range(2)]
+    for t in thread:
+        t.start()
+    for t in thread:
+        t.join()
+    assert applicate == [{"whisper_model"}]
+
+def test_osservatore_tiene_la_config_se_il_file_e_rotto(tmp_path):
+    path = tmp_path / "config.json"
+    config, _ = kris_config.carica(str(path))
+    osservatore = kris_config.OsservatoreConfig(str(path), config, lambda c, cambiate: None)
+    path.write_text("{rotto", encoding="utf-8")
+    assert not osservatore.controlla()
+    assert osservatore.config is config
@@ -0,0 +1,121 @@
+import json
+import socket
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import kris_config
+import kris_daemon
+
+TOKEN = "segreto"
+
+class MotoreFinto:
+    def __init__(self):
+        self.config = kris_config.predefinita()
+        self.comandi = []
+
+    def gestisci(self, testo=None, audio=None):
+        self.comandi.append(testo)
+        return {"trascrizione": testo, "risposta": "ok", "intento": None, "latenze": {}}
+
+    def aggiorna_config(self, config):
+        self.config = config
+
+    def stato(self):
+        return {"pronto": True}
+
+@pytest.fixture
+def demone():
+    motore = MotoreFinto()
+    server = kris_daemon.crea_server(motore, 0, TOKEN)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield motore, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+def _post(url, corpo, intestazioni):
+    richiesta = urllib.request.Request(url, data=corpo, headers=intestazioni)
+    try:
+        with urllib.request.urlopen(richiesta, timeout=5) as r:
+            return r.status, json.loads(r.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+def test_serve_un_token():
+    with pytest.raises(ValueError):
+        kris_daemon.crea_server(MotoreFinto(), 0, None)
+
+def test_comando_col_token(demone):
+    motore, url = demone
+    stato, _ = _post(url + "/comando", b'{"testo": "apri blocco note"}',
+                     {"Content-Type": "application/json", "X-Kris-Token": TOKEN})
+    assert stato == 200
+    assert motore.comandi == ["apri blocco note"]
+
+@pytest.mark.parametrize("intestazioni, atteso", [
+    ({"Content-Type": "application/json"}, 403),                                        # senza token
+    ({"Content-Type": "application/json", "X-Kris-Token": "sbagliato"}, 403),
+    ({"Content-Type": "text/plain", "X-Kris-Token": TOKEN}, 415),                       # POST "semplice"
+    ({"Content-Type": "application/json", "X-Kris-Token": TOKEN, "Origin": "https://esempio.it"}, 403),
+])
+def test_comando_rifiutato(demone, intestazioni, atteso):
+    motore, url = demone
+    stato, _ = _post(url + "/comando", b'{"testo": "apri calcolatrice"}', intestazioni)
+    assert stato == atteso
+    assert motore.comandi == []
+
+def test_config_parziale(demone):
+    motore, url = demone
+    motore.config["blacklist"] = ["spegni"]
+    intestazioni = {"Content-Type": "application/json", "X-Kris-Token": TOKEN}
+    stato, _ = _post(url + "/config", b'{"custom_commands": {"ciao": "Ciao!"}}', intestazioni)
+    assert stato == 200
+    assert motore.config["custom_commands"] == {"ciao": "Ciao!"}
+    assert motore.config["blacklist"] == ["spegni"]
+
+def test_config_non_cambia_percorsi(demone):
+    motore, url = demone
+    intestazioni = {"Content-Type": "application/json", "X-Kris-Token": TOKEN}
+    stato, risposta = _post(url + "/config", b'{"note_dir": "/tmp/altrove"}', intestazioni)
+    assert stato == 400 and "note_dir" in risposta["errore"]
+    assert motore.config["note_dir"] == "note"
+    # La config completa inviata dalla GUI, con gli stessi percorsi, passa
+    stato, _ = _post(url + "/config", json.dumps(motore.config).encode("utf-8"), intestazioni)
+    assert stato == 200
+
+def test_token_generato_e_salvato(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text('{"rate": 170}', encoding="utf-8")
+    config = {"daemon_token": None}
+    token = kris_daemon.assicura_token(config, str(path))
+    salvata = json.loads(path.read_text(encoding="utf-8"))
+    assert token and salvata == {"rate": 170, "daemon_token": token}
+    assert kris_daemon.assicura_token(config, str(path)) == token
+
+@pytest.mark.parametrize("corpo", [b"[]", b'"x"', b"3", b"{non json"])
+def test_comando_non_oggetto(demone, corpo):
+    motore, url = demone
+    stato, risposta = _post(url + "/comando", corpo, {"Content-Type": "application/json", "X-Kris-Token": TOKEN})
+    assert stato == 400 and risposta["errore"]
+    assert motore.comandi == []
+
+def test_errore_del_motore(demone):
+    motore, url = demone
+
+    def _guasto(testo=None, audio=None):
+        raise RuntimeError("modello guasto")
+    motore.gestisci = _guasto
+    stato, risposta = _post(url + "/comando", b'{"testo": "ciao"}',
+                            {"Content-Type": "application/json", "X-Kris-Token": TOKEN})
+    assert stato == 500 and "modello guasto" in risposta["errore"]
+
+def test_content_length_negativo(demone):
+    _, url = demone
+    host, porta = url.rsplit("/", 1)[1].split(":")
+    with socket.create_connection((host, int(porta)), timeout=5) as s:
+        s.sendall(f"POST /comando HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                  f"X-Kris-Token: {TOKEN}\r\nContent-Length: -1\r\n\r\n".encode("ascii"))
+        risposta = s.recv(4096)   # senza il controllo, il gestore resterebbe bloccato in read(-1)
+    assert risposta.startswith(b"HTTP/1.0 400")
@@ -0,0 +1,80 @@
+"""Dettatura in streaming con un decodificatore finto: ogni parola è 0,5 s di un livello costante
+diverso, il decodificatore legge i livelli del buffer. Così si controlla il meccanismo (conferme,
+accorciamento del buffer, consegna delle parole) senza modello."""
+import numpy as np
+import pytest
+
+import kris_dettatura
+
+SR = 16000
+DURATA_PAROLA = SR // 2
+PAROLE = ("oggi ho comprato il pane perché la città era quasi vuota e più tranquilla del solito "
+          "poi sono andato al mercato dove ho trovato frutta fresca verdura pesce e tante altre cose "
+          "buone che porterò a casa per la cena di stasera con tutta la famiglia riunita dopo una lunga "
+          "settimana di lavoro in ufficio e di corse tra una riunione e l'altra").split()
+
+def _livello(k):
+    return 0.2 + 0.005 * k
+
+def _audio(parole):
+    return np.concatenate([np.full(DURATA_PAROLA, _livello(k), dtype=np.float32) for k in range(len(parole))])
+
+def decodificatore(parole, con_segmenti=True):
+    """decodifica(buffer, prompt) come kris_trascrizione; l'ultima parola è scartata finché non è intera"""
+    chiamate = []
+
+    def decodifica(buffer, prompt):
+        chiamate.append(len(buffer))
+        indici = np.rint((buffer - 0.2) / 0.005).astype(int)
+        indici[buffer < 0.1] = -1
+        testo, segmenti, inizio = [], [], 0
+        while inizio < len(indici):
+            fine = inizio
+            while fine < len(indici) and indici[fine] == indici[inizio]:
+                fine += 1
+            if indici[inizio] >= 0 and (fine - inizio >= DURATA_PAROLA or fine < len(indici)):
+                testo.append(parole[indici[inizio]])
+                # Un segmento ogni tre parole, che finisce dove finisce la parola
+                if len(testo) % 3 == 0:
+                    segmenti.append({"text": " ".join(testo[-3:]), "start": 0.0, "end": fine / SR})
+            inizio = fine
+        return {"text": " ".join(testo), "segments": segmenti if con_segmenti else []}
+    return decodifica, chiamate
+
+@pytest.mark.parametrize("con_segmenti", [True, False])
+def test_streaming_consegna_tutto(con_segmenti):
+    decodifica, _ = decodificatore(PAROLE, con_segmenti)
+    audio = _audio(PAROLE)                       # 31,5 s: oltre MAX_BUFFER_S senza segmenti
+    offline = decodifica(audio, "")["text"]
+    streaming = kris_dettatura.DettaturaStreaming(decodifica)
+    consegnate = []
+    for i in range(0, len(audio), SR // 10):
+        nuove = streaming.aggiungi(audio[i:i + SR // 10])
+        if nuove is not None:
+            consegnate += nuove
+    consegnate += streaming.fine()
+    assert streaming.testo == offline
+    assert consegnate == offline.split()
+
+def test_buffer_accorciato():
+    decodifica, chiamate = decodificatore(PAROLE)
+    audio = _audio(PAROLE)
+    streaming = kris_dettatura.DettaturaStreaming(decodifica)
+    for i in range(0, len(audio), SR // 10):
+        streaming.aggiungi(audio[i:i + SR // 10])
+    streaming.fine()
+    # Con i segmenti confermati il buffer resta intorno a TAGLIO_S invece di crescere fino a 30 s
+    assert max(chiamate) < (kris_dettatura.TAGLIO_S + 2 * kris_dettatura.PASSO_S) * SR
+
+@pytest.mark.parametrize("con_segmenti", [True, False])
+def test_detta_inserisce_tutto(con_segmenti):
+    decodifica, _ = decodificatore(PAROLE, con_segmenti)
+    silenzio = np.zeros(SR, dtype=np.float32)
+    audio = np.concatenate([silenzio, _audio(PAROLE), silenzio, silenzio])
+    offline = decodifica(audio, "")["text"]
+    blocchi = (audio[i:i + 1600] for i in range(0, len(audio), 1600))
+    inserite = []
+    streaming = kris_dettatura.DettaturaStreaming(decodifica)
+    finale = kris_dettatura.detta(blocchi, streaming, inserite.extend, SR)
+    assert finale == offline
+    assert inserite == offline.split()       # tutto ciò che è confermato arriva a aggiungi_testo
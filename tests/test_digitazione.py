@@ -0,0 +1,116 @@
+"""Iniettori con appunti e tasti finti: salvataggio e ripristino degli appunti, blocchi Unicode."""
+import threading
+import time
+
+import kris_digitazione
+
+RIPRISTINO_S = 0.05
+
+class Appunti:
+    """Appunti di sistema finti; `incolla` ricorda cosa c'era negli appunti a ogni Ctrl+V"""
+
+    def __init__(self, contenuto="di prima"):
+        self.contenuto = contenuto
+        self.incollati = []
+        self.scritture = 0
+
+    def leggi(self):
+        return self.contenuto
+
+    def scrivi(self, testo):
+        self.contenuto = testo
+        self.scritture += 1
+
+    def incolla(self):
+        self.incollati.append(self.contenuto)
+
+def _iniettore(appunti):
+    return kris_digitazione.IniettoreAppunti((appunti.leggi, appunti.scrivi), appunti.incolla, RIPRISTINO_S)
+
+def _dopo_il_ripristino():
+    time.sleep(RIPRISTINO_S * 4)
+
+def test_appunti_salvati_e_ripristinati():
+    appunti = Appunti()
+    _iniettore(appunti).scrivi("Perché è già lì")
+    assert appunti.incollati == ["Perché è già lì"]
+    assert appunti.contenuto == "Perché è già lì"   # l'applicazione legge dopo Ctrl+V
+    _dopo_il_ripristino()
+    assert appunti.contenuto == "di prima"
+
+def test_utente_ha_copiato_nel_frattempo():
+    appunti = Appunti()
+    _iniettore(appunti).scrivi("dettato")
+    appunti.contenuto = "copiato dall'utente"
+    _dopo_il_ripristino()
+    assert appunti.contenuto == "copiato dall'utente"
+
+def test_incolla_consecutivi():
+    appunti = Appunti()
+    iniettore = _iniettore(appunti)
+    for frase in ("prima", "seconda", "terza"):
+        iniettore.scrivi(frase)
+    assert appunti.incollati == ["prima", "seconda", "terza"]
+    _dopo_il_ripristino()
+    # L'originale, non il testo di una frase precedente; un solo ripristino
+    assert appunti.contenuto == "di prima"
+    assert appunti.scritture == 4
+    iniettore.scrivi("dopo")
+    _dopo_il_ripristino()
+    assert appunti.incollati[-1] == "dopo"
+    assert appunti.contenuto == "di prima"
+
+def test_incolla_da_thread_diversi():
+    appunti = Appunti()
+    iniettore = _iniettore(appunti)
+    thread = [threading.Thread(target=iniettore.scrivi, args=(f"frase {i}",)) for i in range(8)]
+    for t in thread:
+        t.start()
+    for t in thread:
+        t.join()
+    assert sorted(appunti.incollati) == sorted(f"frase {i}" for i in range(8))
+    _dopo_il_ripristino()
+    assert appunti.contenuto == "di prima"
+
+def test_appunti_illeggibili():
+    appunti = Appunti()
+
+    def _leggi():
+        raise OSError("appunti occupati")
+    iniettore = kris_digitazione.IniettoreAppunti((_leggi, appunti.scrivi), appunti.incolla, RIPRISTINO_S)
+    iniettore.scrivi("dettato")
+    _dopo_il_ripristino()
+    assert appunti.incollati == ["dettato"]
+    assert appunti.contenuto == "dettato"   # niente da rimettere
+
+def _battuti(testo, blocco):
+    battuti = []
+    kris_digitazione.IniettoreTasti(("finto", battuti.append), blocco).scrivi(testo)
+    return battuti
+
+def test_tasti_a_blocchi():
+    testo = "Perché è già lì, città più bella. " * 20
+    battuti = _battuti(testo, 50)
+    assert "".join(battuti) == testo
+    assert all(len(b) <= 50 for b in battuti)
+    assert len(battuti) == -(-len(testo) // 50)
+
+def test_tasti_accenti_combinanti_ed_emoji():
+    decomposto = "perché è già"   # accenti come caratteri combinanti
+    emoji = "ciao 👋🏽 👩‍💻 ❤️ fine"
+    for testo in (decomposto, emoji):
+        for blocco in range(3, 8):   # 👩‍💻 sono tre caratteri
+            battuti = _battuti(testo, blocco)
+            assert "".join(battuti) == testo
+            assert all(len(b) <= blocco for b in battuti)
+            tagli = [sum(map(len, battuti[:k])) for k in range(1, len(battuti))]
+            assert not any(kris_digitazione._attaccato(testo, t) for t in tagli), (testo, blocco, battuti)
+
+def test_tasti_segni_piu_lunghi_del_blocco():
+    testo = "a" + "\u0301" * 5 + "b"
+    battuti = _battuti(testo, 3)
+    assert "".join(battuti) == testo
+    assert all(len(b) <= 3 for b in battuti)
+
+def test_tasti_testo_vuoto():
+    assert _battuti("", 10) == []
@@ -0,0 +1,76 @@
+"""Registro eventi: rotazione per dimensione ed età, archivi compressi e consultazione (anche da riga di
+comando)."""
+import os
+import sys
+import gzip
+import json
+import time
+import subprocess
+from datetime import datetime, timedelta
+
+import kris_log
+
+RADICE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _scrivi(path, *eventi, **opzioni):
+    """Un registro per blocco di eventi: ogni chiusura è un flush, e il flush successivo può ruotare"""
+    registro = kris_log.RegistroEventi(path, intervallo=0, **opzioni)
+    for evento in eventi:
+        registro.registra(**evento)
+    registro.chiudi()
+    time.sleep(0.002)   # gli archivi hanno i millisecondi nel nome
+
+def test_eventi_scritti_come_jsonl(tmp_path):
+    path = str(tmp_path / "logs" / "kris.jsonl")
+    _scrivi(path, {"testo": "apri note", "intento": "apri_app", "latenze": {"totale": 0.2}})
+    with open(path, encoding="utf-8") as f:
+        righe = [json.loads(r) for r in f]
+    assert len(righe) == 1
+    assert righe[0]["testo"] == "apri note" and righe[0]["latenze"] == {"totale": 0.2}
+    assert datetime.fromisoformat(righe[0]["ts"]).tzinfo is not None
+
+def test_rotazione_per_dimensione_conserva_gli_ultimi_archivi(tmp_path):
+    path = str(tmp_path / "kris.jsonl")
+    for i in range(6):
+        _scrivi(path, {"n": i, "testo": "x" * 100}, max_mb=0.0001, archivi=3)
+    archivi = kris_log.archivi(path)
+    assert len(archivi) == 3 and all(a.endswith(".jsonl.gz") for a in archivi)
+    with gzip.open(archivi[-1], "rt", encoding="utf-8") as f:
+        assert json.loads(f.readline())["n"] == 4
+    # I più vecchi sono stati cancellati; la consultazione legge archivi e file corrente in ordine
+    assert [e["n"] for e in kris_log.leggi_eventi(path)] == [2, 3, 4, 5]
+
+def test_rotazione_per_eta(tmp_path):
+    path = str(tmp_path / "kris.jsonl")
+    ieri = (datetime.now().astimezone() - timedelta(hours=30)).isoformat()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"ts": ieri, "n": 0}) + "\n")
+    _scrivi(path, {"n": 1}, max_ore=24, comprimi=False)
+    archivi = kris_log.archivi(path)
+    assert len(archivi) == 1 and archivi[0].endswith(".jsonl")
+    with open(path, encoding="utf-8") as f:
+        assert [json.loads(r)["n"] for r in f] == [1]
+    _scrivi(path, {"n": 2}, max_ore=24, comprimi=False)
+    assert len(kris_log.archivi(path)) == 1     # file nuovo: niente altra rotazione
+
+def test_consultazione_ultimi_e_piu_lenti(tmp_path):
+    path = str(tmp_path / "kris.jsonl")
+    _scrivi(path, *({"n": i, "latenze": {"totale": t, "trascrizione": t / 2}} for i, t in enumerate([0.3, 1.2, 0.1])),
+            max_mb=0.0001)
+    _scrivi(path, {"n": 3, "latenze": {"totale": 0.8}}, {"n": 4}, max_mb=0.0001)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"n": 5, "latenze": {"tot')    # riga troncata da un arresto improvviso
+    assert [e["n"] for e in kris_log.ultimi(2, path)] == [3, 4]
+    assert [e["n"] for e in kris_log.piu_lenti(2, path=path)] == [1, 3]
+    assert [e["n"] for e in kris_log.piu_lenti(5, "trascrizione", path)] == [1, 0, 2]
+
+def test_riga_di_comando(tmp_path):
+    path = str(tmp_path / "kris.jsonl")
+    _scrivi(path, {"testo": "apri note", "intento": "apri_app", "esito": "ok", "latenze": {"totale": 0.25}},
+            {"testo": "cerca meteo", "intento": "cerca", "esito": "ok", "latenze": {"totale": 1.5}})
+    uscita = subprocess.run([sys.executable, "kris_log.py", "--lenti", "1", "--file", path], cwd=RADICE,
+                            capture_output=True, text=True, check=True).stdout
+    assert "cerca: 'cerca meteo'" in uscita and "totale=1500ms" in uscita and "apri note" not in uscita
+    uscita = subprocess.run([sys.executable, "kris_log.py", "--ultimi", "5", "--file", path], cwd=RADICE,
+                            capture_output=True, text=True, check=True).stdout
+    assert uscita.index("apri note") < uscita.index("cerca meteo")
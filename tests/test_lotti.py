@@ -0,0 +1,133 @@
+"""Servizio a lotti con un backend finto che resta fermo a ogni passaggio finché il test non lo lascia
+andare: le richieste arrivate nel frattempo formano il lotto successivo."""
+import threading
+
+import numpy as np
+import pytest
+
+import kris_lotti
+from kris_trascrizione import Annullato
+
+class BackendFinto:
+    def __init__(self, errore=None):
+        self.passi = threading.Semaphore(0)
+        self.iniziato = threading.Semaphore(0)
+        self.lotti = []          # (clip, opzioni) per ogni passaggio
+        self.annullati = []      # annulla.is_set() alla fine di ogni passaggio
+        self.errore = errore
+
+    def lascia(self, passaggi=10):
+        for _ in range(passaggi):
+            self.passi.release()
+
+    def __call__(self, audios, annulla, **opzioni):
+        self.lotti.append(([int(a[0]) for a in audios], opzioni))
+        self.iniziato.release()
+        self.passi.acquire(timeout=5)
+        self.annullati.append(annulla.is_set())
+        if self.errore is not None:
+            raise self.errore
+        return [{"text": f"clip {int(a[0])}"} for a in audios]
+
+def _clip(n):
+    return np.full(160, n, dtype=np.float32)
+
+def _servizio(backend, dimensione=4, attesa_ms=0):
+    servizio = kris_lotti.ServizioLotti(backend, dimensione, attesa_ms)
+    # La prima richiesta occupa il decoder: le altre si accumulano
+    primo = servizio.invia(_clip(0))
+    assert backend.iniziato.acquire(timeout=5)
+    return servizio, primo
+
+def test_richieste_in_attesa_raggruppate_fino_alla_dimensione():
+    backend = BackendFinto()
+    servizio, primo = _servizio(backend, dimensione=4)
+    futuri = [servizio.invia(_clip(i)) for i in range(1, 6)]
+    diverso = servizio.invia(_clip(6), beam_size=5)
+    backend.lascia()
+    assert primo.result(5) == {"text": "clip 0"}
+    assert [f.result(5)["text"] for f in futuri] == [f"clip {i}" for i in range(1, 6)]
+    assert diverso.result(5) == {"text": "clip 6"}
+    # Al massimo 4 per passaggio, e in un lotto solo richieste con le stesse opzioni
+    assert backend.lotti == [([0], {}), ([1, 2, 3, 4], {}), ([5], {}), ([6], {"beam_size": 5})]
+
+def test_dimensione_uno_una_clip_per_passaggio():
+    backend = BackendFinto()
+    servizio, primo = _servizio(backend, dimensione=1)
+    futuri = [servizio.invia(_clip(i)) for i in (1, 2)]
+    backend.lascia()
+    [f.result(5) for f in [primo] + futuri]
+    assert [clip for clip, _ in backend.lotti] == [[0], [1], [2]]
+
+def test_attesa_raccoglie_richieste_vicine():
+    backend = BackendFinto()
+    backend.lascia()
+    servizio = kris_lotti.ServizioLotti(backend, dimensione=4, attesa_ms=2000)
+    futuri = [servizio.invia(_clip(i)) for i in range(4)]    # il lotto pieno non aspetta la scadenza
+    assert [f.result(5)["text"] for f in futuri] == [f"clip {i}" for i in range(4)]
+    assert [clip for clip, _ in backend.lotti] == [[0, 1, 2, 3]]
+
+def test_annullata_in_coda_non_arriva_al_backend():
+    backend = BackendFinto()
+    servizio, primo = _servizio(backend)
+    annulla = threading.Event()
+    annullata = servizio.invia(_clip(1), annulla)
+    altra = servizio.invia(_clip(2))
+    annulla.set()
+    backend.lascia()
+    with pytest.raises(Annullato):
+        annullata.result(5)
+    assert altra.result(5) == {"text": "clip 2"}
+    assert [clip for clip, _ in backend.lotti] == [[0], [2]]
+
+def test_annullata_durante_il_passaggio_non_ferma_le_altre():
+    backend = BackendFinto()
+    servizio, primo = _servizio(backend)
+    annulla = threading.Event()
+    annullata = servizio.invia(_clip(1), annulla)
+    altra = servizio.invia(_clip(2))
+    backend.lascia(1)
+    primo.result(5)
+    assert backend.iniziato.acquire(timeout=5)
+    # Il secondo passaggio ({1, 2}) è già partito: lo annulla solo la richiesta 1
+    annulla.set()
+    backend.lascia(1)
+    with pytest.raises(Annullato):
+        annullata.result(5)
+    assert altra.result(5) == {"text": "clip 2"}
+    assert backend.annullati[-1] is False     # il backend si ferma solo se lo annullano tutti
+
+def test_lotto_annullato_da_tutti_ferma_il_backend():
+    backend = BackendFinto()
+    servizio, primo = _servizio(backend)
+    eventi = [threading.Event(), threading.Event()]
+    futuri = [servizio.invia(_clip(i + 1), e) for i, e in enumerate(eventi)]
+    backend.lascia(1)
+    primo.result(5)
+    assert backend.iniziato.acquire(timeout=5)
+    for evento in eventi:
+        evento.set()
+    backend.lascia(1)
+    for futuro in futuri:
+        with pytest.raises(Annullato):
+            futuro.result(5)
+    assert backend.annullati[-1] is True
+
+def test_errore_del_backend_a_tutto_il_lotto():
+    backend = BackendFinto(errore=RuntimeError("modello rotto"))
+    servizio, primo = _servizio(backend)
+    futuri = [servizio.invia(_clip(i)) for i in (1, 2)]
+    backend.lascia()
+    for futuro in [primo] + futuri:
+        with pytest.raises(RuntimeError, match="modello rotto"):
+            futuro.result(5)
+    # Il servizio resta vivo dopo l'errore
+    backend.errore = None
+    assert servizio.trascrivi(_clip(3)) == {"text": "clip 3"}
+
+def test_imposta_config():
+    servizio = kris_lotti.ServizioLotti(BackendFinto())
+    servizio.imposta_config({"lotto_dimensione": 0, "lotto_attesa_ms": -5})
+    assert (servizio.dimensione, servizio.attesa_ms) == (1, 0.0)
+    servizio.imposta_config({})
+    assert (servizio.dimensione, servizio.attesa_ms) == (kris_lotti.DIMENSIONE_DEFAULT, kris_lotti.ATTESA_MS_DEFAULT)
@@ -0,0 +1,86 @@
+"""Scelta fra modalità comando e dettatura con un backend finto: quale modello viene chiamato, con quali
+opzioni, e perché si passa alla dettatura."""
+import numpy as np
+import pytest
+
+import kris_comandi
+import kris_modalita
+
+SR = 16000
+
+@pytest.fixture(scope="module")
+def registro():
+    registro = kris_comandi.RegistroComandi()
+    kris_comandi.registra_predefiniti(registro)
+    return registro
+
+def _segmento(testo, **campi):
+    return {"text": testo, "tokens": list(range(len(testo.split()) + 2)), "avg_logprob": -0.2,
+            "compression_ratio": 1.2, "no_speech_prob": 0.01, **campi}
+
+class DecodificaFinta:
+    """Un risultato per modalità; registra le chiamate (modalità, opzioni)"""
+
+    def __init__(self, comando, dettatura="testo dettato con il modello grande"):
+        self.risultati = {"comando": comando, "dettatura": {"text": dettatura, "segments": [_segmento(dettatura)]}}
+        self.chiamate = []
+
+    def __call__(self, audio, modalita, **opzioni):
+        self.chiamate.append((modalita, opzioni))
+        return self.risultati[modalita]
+
+def _comando(testo, **campi):
+    return {"text": testo, "segments": [_segmento(testo, **campi)] if testo else [{**_segmento(""), **campi}]}
+
+def _audio(secondi):
+    return np.zeros(int(secondi * SR), dtype=np.float32)
+
+def test_comando_breve_resta_al_modello_piccolo(registro):
+    decodifica = DecodificaFinta(_comando(" Salva nota."))
+    assert kris_modalita.trascrivi(_audio(1.5), decodifica, registro) == (" Salva nota.", "comando", None)
+    [(modalita, opzioni)] = decodifica.chiamate
+    assert modalita == "comando"
+    assert opzioni["beam_size"] == 1 and opzioni["max_token"] == kris_modalita.MAX_TOKEN_COMANDO
+    assert opzioni["initial_prompt"].startswith("Kris, ") and "salva nota" in opzioni["initial_prompt"]
+
+def test_audio_lungo_va_subito_in_dettatura(registro):
+    decodifica = DecodificaFinta(_comando("salva nota"))
+    testo, modalita, motivo = kris_modalita.trascrivi(_audio(kris_modalita.DURATA_COMANDO_S + 1), decodifica,
+                                                      registro)
+    assert (modalita, motivo) == ("dettatura", "lunga")
+    assert [m for m, _ in decodifica.chiamate] == ["dettatura"]
+    assert decodifica.chiamate[0][1] == kris_modalita.OPZIONI_DETTATURA
+
+@pytest.mark.parametrize("comando, motivo", [
+    (_comando("salva nota", avg_logprob=-1.5), "confidenza"),
+    (_comando("salva salva salva salva", compression_ratio=3.0), "ripetizioni"),
+    (_comando("apri", tokens=list(range(kris_modalita.MAX_TOKEN_COMANDO))), "troncata"),
+    (_comando("oggi piove sul mare"), "non_riconosciuto"),
+    (_comando("scrivi ciao a tutti quanti voi amici"), "testo_libero"),
+    (_comando("", no_speech_prob=0.1), "vuota"),
+])
+def test_risultato_incerto_ridecodificato_in_dettatura(registro, comando, motivo):
+    decodifica = DecodificaFinta(comando)
+    risultato = kris_modalita.trascrivi(_audio(2), decodifica, registro)
+    assert risultato == ("testo dettato con il modello grande", "dettatura", motivo)
+    assert [m for m, _ in decodifica.chiamate] == ["comando", "dettatura"]
+
+def test_silenzio_non_ridecodificato(registro):
+    decodifica = DecodificaFinta(_comando("", no_speech_prob=0.9))
+    assert kris_modalita.trascrivi(_audio(2), decodifica, registro) == ("", "comando", None)
+
+def test_argomento_breve_resta_comando(registro):
+    decodifica = DecodificaFinta(_comando("apri calcolatrice"))
+    assert kris_modalita.trascrivi(_audio(2), decodifica, registro)[1:] == ("comando", None)
+
+@pytest.mark.parametrize("modalita", ["comando", "dettatura"])
+def test_modalita_forzata(registro, modalita):
+    # Forzata da config: un solo passaggio, anche se lungo o non riconosciuto
+    decodifica = DecodificaFinta(_comando("oggi piove sul mare"))
+    _, usata, motivo = kris_modalita.trascrivi(_audio(8), decodifica, registro, modalita)
+    assert (usata, motivo) == (modalita, None)
+    assert [m for m, _ in decodifica.chiamate] == [modalita]
+
+def test_prompt_troncato(registro):
+    prompt = kris_modalita.prompt_comandi(registro)
+    assert len(prompt) <= kris_modalita.PROMPT_CARATTERI + 1 and prompt.endswith(".")
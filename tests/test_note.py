@@ -0,0 +1,82 @@
+"""Archivio note: ordinamento BM25 e riallineamento incrementale dell'indice salvato."""
+import os
+
+import kris_note
+
+def _nota(cartella, nome, testo, mtime=None):
+    path = os.path.join(cartella, nome)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(testo)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+def _nomi(risultati):
+    return [os.path.basename(path) for _, path, _ in risultati]
+
+def test_termini_senza_stopword_con_radice():
+    assert kris_note.termini("Il gatto e le gatte della città") == ["gatt", "gatt", "citt"]
+
+def test_ordinamento_bm25(tmp_path):
+    cartella = str(tmp_path)
+    _nota(cartella, "spesa.txt", "lista della spesa: latte pane uova latte")
+    _nota(cartella, "riunione.txt", "riunione con il cliente, portare il latte per il caffè")
+    _nota(cartella, "lungo.txt", "latte " + "appunti vari di lavoro " * 40)
+    _nota(cartella, "viaggio.txt", "biglietti del treno per Roma")
+    archivio = kris_note.ArchivioNote(cartella)
+    # Più occorrenze e nota più corta vengono prima; chi non contiene il termine non c'è
+    assert _nomi(archivio.cerca("latte")) == ["spesa.txt", "riunione.txt", "lungo.txt"]
+    # Un termine raro pesa più di uno comune a molte note
+    assert _nomi(archivio.cerca("latte cliente"))[0] == "riunione.txt"
+    punteggi = [p for p, _, _ in archivio.cerca("latte cliente")]
+    assert punteggi == sorted(punteggi, reverse=True)
+    assert archivio.cerca("treni roma", n=1)[0][2] == "biglietti del treno per Roma"
+    assert archivio.cerca("della per") == []
+
+def test_salvataggi_nello_stesso_secondo_non_collidono(tmp_path):
+    archivio = kris_note.ArchivioNote(str(tmp_path))
+    paths = [archivio.salva(f"nota numero {i} sul progetto") for i in range(3)]
+    assert len(set(paths)) == 3
+    assert sorted(_nomi(archivio.cerca("progetto"))) == sorted(os.path.basename(p) for p in paths)
+
+def test_indice_riallineato_solo_per_i_file_cambiati(tmp_path, monkeypatch):
+    cartella = str(tmp_path)
+    _nota(cartella, "a.txt", "ricetta della torta di mele", mtime=1000)
+    _nota(cartella, "b.txt", "appunti sul motore elettrico", mtime=1000)
+    _nota(cartella, "c.txt", "numero di telefono del dentista", mtime=1000)
+    archivio = kris_note.ArchivioNote(cartella)
+    archivio.allinea()
+    assert os.path.exists(archivio.path_indice)
+
+    # Fuori da KRIS: una nota cambiata, una cancellata, una nuova
+    _nota(cartella, "b.txt", "appunti sul motore diesel", mtime=2000)
+    os.remove(os.path.join(cartella, "c.txt"))
+    _nota(cartella, "d.txt", "torta al cioccolato per la festa")
+    riletti = []
+    originale = kris_note.ArchivioNote._indicizza
+    monkeypatch.setattr(kris_note.ArchivioNote, "_indicizza",
+                        lambda self, nome, testo, mtime: riletti.append(nome) or originale(self, nome, testo, mtime))
+    archivio = kris_note.ArchivioNote(cartella)
+    assert set(archivio.documenti) == {"a.txt", "b.txt", "c.txt"}    # indice salvato, prima di allinea()
+    assert sorted(_nomi(archivio.cerca("torta"))) == ["a.txt", "d.txt"]
+    assert sorted(riletti) == ["b.txt", "d.txt"]
+    assert _nomi(archivio.cerca("diesel")) == ["b.txt"]
+    assert archivio.cerca("elettrico") == [] and archivio.cerca("dentista") == []
+    assert "elettric" not in archivio.postings
+    assert archivio.lunghezza_totale == sum(d["lunghezza"] for d in archivio.documenti.values())
+
+def test_indice_di_altra_versione_ricostruito(tmp_path):
+    cartella = str(tmp_path)
+    _nota(cartella, "a.txt", "ricetta della torta di mele")
+    with open(os.path.join(cartella, ".indice.json"), "w", encoding="utf-8") as f:
+        f.write('{"versione": 0, "documenti": {"fantasma.txt": {}}}')
+    archivio = kris_note.ArchivioNote(cartella)
+    assert archivio.documenti == {}
+    assert _nomi(archivio.cerca("torta")) == ["a.txt"]
+
+def test_importa_sposta_il_file(tmp_path):
+    archivio = kris_note.ArchivioNote(str(tmp_path / "note"))
+    sorgente = _nota(str(tmp_path), "diario.journal", "dettatura sulla revisione del bilancio")
+    path = archivio.importa(sorgente, "dettatura sulla revisione del bilancio")
+    assert not os.path.exists(sorgente) and os.path.exists(path)
+    assert _nomi(archivio.cerca("bilancio")) == [os.path.basename(path)]
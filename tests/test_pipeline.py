@@ -0,0 +1,126 @@
+"""Pipeline senza hardware: un motore finto che trascrive solo quando il test lo lascia andare, e
+blocchi audio sintetici al posto del microfono."""
+import os
+import sys
+import threading
+import subprocess
+
+import numpy as np
+
+import kris_metriche
+import kris_pipeline
+from kris_trascrizione import Annullato
+
+SR = 16000
+
+class MotoreFinto:
+    """trascrivi() resta bloccata su `via` (o finché la richiesta non è annullata)"""
+
+    def __init__(self, blocca=True):
+        self.via = threading.Event()
+        if not blocca:
+            self.via.set()
+        self.in_trascrizione = threading.Event()
+        self.eseguiti = []
+
+    def trascrivi(self, audio, latenze=None, annulla=None):
+        self.in_trascrizione.set()
+        while not self.via.wait(0.01):
+            if annulla is not None and annulla.is_set():
+                raise Annullato()
+        return f"comando di {len(audio) / SR:.1f} s"
+
+    def gestisci(self, testo=None, audio=None, latenze=None):
+        self.eseguiti.append(testo)
+        return {"trascrizione": testo, "risposta": "ok", "intento": None, "latenze": {}}
+
+def _pipeline(motore, politica, **kwargs):
+    eventi = []
+    pipeline = kris_pipeline.PipelineKris(motore, {"pipeline_politica": politica}, kris_metriche.Metriche(),
+                                          notifica=lambda evento, r: eventi.append((evento, r.n)), **kwargs)
+    return pipeline, eventi
+
+def _audio(secondi):
+    return np.full(int(secondi * SR), 0.1, dtype=np.float32)
+
+def _attendi(*richieste):
+    for r in richieste:
+        assert r.fatta.wait(5)
+
+def test_annulla_ferma_quella_in_corso():
+    motore = MotoreFinto()
+    pipeline, eventi = _pipeline(motore, "annulla")
+    prima = pipeline.invia(audio=_audio(1))
+    assert motore.in_trascrizione.wait(5)
+    seconda = pipeline.invia(audio=_audio(2))
+    _attendi(prima)
+    assert ("annullata", prima.n) in eventi and prima.risultato is None
+    motore.via.set()
+    _attendi(seconda)
+    assert motore.eseguiti == ["comando di 2.0 s"]
+    assert seconda.risultato["trascrizione"] == "comando di 2.0 s"
+    assert not pipeline.occupata()
+
+def test_accoda_esegue_tutto_in_ordine():
+    motore = MotoreFinto()
+    pipeline, _ = _pipeline(motore, "accoda")
+    richieste = [pipeline.invia(audio=_audio(s)) for s in (1, 2, 3)]
+    motore.via.set()
+    _attendi(*richieste)
+    assert motore.eseguiti == ["comando di 1.0 s", "comando di 2.0 s", "comando di 3.0 s"]
+
+def test_accoda_limitata():
+    motore = MotoreFinto()
+    pipeline, _ = _pipeline(motore, "accoda")
+    accettate = [pipeline.invia(audio=_audio(1)) for _ in range(kris_pipeline.MAX_IN_ATTESA + 1)]
+    assert all(accettate)
+    assert pipeline.invia(audio=_audio(1)) is None   # coda piena: scartata
+    motore.via.set()
+    _attendi(*accettate)
+    assert len(motore.eseguiti) == kris_pipeline.MAX_IN_ATTESA + 1
+
+def test_unisci_pressioni_durante_l_elaborazione():
+    motore = MotoreFinto()
+    pipeline, _ = _pipeline(motore, "unisci")
+    prima = pipeline.invia(audio=_audio(1))
+    assert motore.in_trascrizione.wait(5)
+    seconda = pipeline.invia(audio=_audio(2))
+    assert pipeline.invia(audio=_audio(3)) is seconda
+    assert pipeline.invia(audio=_audio(4)) is seconda
+    motore.via.set()
+    _attendi(prima, seconda)
+    assert motore.eseguiti == ["comando di 1.0 s", "comando di 2.0 s"]
+
+def test_annulla_tutto():
+    motore = MotoreFinto()
+    interrotta = []
+    pipeline, eventi = _pipeline(motore, "accoda", interrompi_voce=lambda: interrotta.append(True))
+    richieste = [pipeline.invia(audio=_audio(1)) for _ in range(3)]
+    assert motore.in_trascrizione.wait(5)
+    pipeline.annulla_tutto()
+    _attendi(*richieste)
+    assert motore.eseguiti == []
+    assert [e for e, _ in eventi if e == "annullata"] == ["annullata"] * 3
+    assert interrotta
+
+def test_ascolto_da_blocchi_sintetici():
+    """Dal "microfono" finto: silenzio, 1 s di parlato, silenzio fino alla chiusura del VAD"""
+    def _blocchi():
+        rng = np.random.default_rng(0)
+        segnale = np.concatenate([np.zeros(SR // 2), 0.3 * np.sin(np.arange(SR) / 5), np.zeros(3 * SR)])
+        segnale = (segnale + rng.normal(0, 0.001, len(segnale))).astype(np.float32)
+        for i in range(0, len(segnale), 480):
+            yield segnale[i:i + 480]
+    motore = MotoreFinto(blocca=False)
+    pipeline, eventi = _pipeline(motore, "annulla", fabbrica_blocchi=_blocchi)
+    richiesta = pipeline.invia()
+    _attendi(richiesta)
+    assert [e for e, _ in eventi][:2] == ["ascolto", "trascrizione"]
+    assert motore.eseguiti == ["comando di 1.3 s"]   # il parlato più i margini del VAD
+
+def test_config_non_carica_la_pipeline():
+    """kris_config valida pipeline_politica senza importare pipeline, motore e modelli"""
+    codice = "import sys, kris_config; print(' '.join(sorted(sys.modules)))"
+    uscita = subprocess.run([sys.executable, "-c", codice], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(kris_pipeline.__file__))).stdout
+    assert not {"kris_pipeline", "kris_motore", "kris_risposte", "kris_modalita", "numpy"} & set(uscita.split())
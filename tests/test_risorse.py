@@ -0,0 +1,127 @@
+"""Rilascio per inattività: il controllo con un orologio finto (`controlla(adesso=...)`) e il motore con un
+backend di trascrizione finto, senza Whisper."""
+import threading
+
+import numpy as np
+import pytest
+
+import kris_config
+import kris_motore
+import kris_risorse
+import kris_trascrizione
+
+class RisorsaFinta:
+    def __init__(self, uso, rilasciabile=True):
+        self.uso = uso
+        self.rilasciabile = rilasciabile
+        self.chiamate = []
+
+    def rilascia(self, usato_prima_di=None):
+        self.chiamate.append(usato_prima_di)
+        if not self.rilasciabile:
+            return False
+        self.uso = None
+
+def _gestore(minuti=1, **risorse):
+    rilasci = []
+    gestore = kris_risorse.GestoreRisorse({"inattivita_minuti": minuti},
+                                          al_rilascio=lambda nomi, prima, dopo: rilasci.append(nomi))
+    for nome, risorsa in risorse.items():
+        gestore.registra(nome, lambda r=risorsa: r.uso, risorsa.rilascia)
+    return gestore, rilasci
+
+def test_rilascia_solo_le_risorse_inattive():
+    vecchia, recente, scarica = RisorsaFinta(100.0), RisorsaFinta(150.0), RisorsaFinta(None)
+    gestore, rilasci = _gestore(vecchia=vecchia, recente=recente, scarica=scarica)
+    assert gestore.controlla(adesso=170.0) == ["vecchia"]
+    assert vecchia.chiamate == [110.0]     # il limite d'uso passato alla risorsa: adesso - 60 s
+    assert recente.chiamate == [] and scarica.chiamate == []
+    assert rilasci == [["vecchia"]]
+    assert gestore.controlla(adesso=170.0) == []
+
+def test_rifiuto_e_errori_non_contano_come_rilascio():
+    occupata = RisorsaFinta(0.0, rilasciabile=False)
+    rotta = RisorsaFinta(0.0)
+    rotta.rilascia = lambda usato_prima_di=None: 1 / 0
+    gestore, rilasci = _gestore(occupata=occupata, rotta=rotta)
+    assert gestore.controlla(adesso=1000.0) == []
+    assert rilasci == []
+
+def test_inattivita_zero_non_rilascia_mai():
+    vecchia = RisorsaFinta(0.0)
+    gestore, _ = _gestore(minuti=0, vecchia=vecchia)
+    assert gestore.controlla(adesso=10 ** 9) == []
+    assert vecchia.chiamate == []
+
+class BackendFinto(kris_trascrizione.BackendTrascrizione):
+    nome = "finto"
+    creati = 0
+
+    def __init__(self, *args):
+        super().__init__("tiny", "fp32", 1)
+        BackendFinto.creati += 1
+
+    def trascrivi(self, audio, language="it", annulla=None, **opzioni):
+        return {"text": f"{len(audio)} campioni", "segments": [], "language": language}
+
+@pytest.fixture
+def motore(tmp_path, monkeypatch):
+    BackendFinto.creati = 0
+    monkeypatch.setattr(kris_trascrizione, "crea_backend", lambda config: BackendFinto())
+    config = {**kris_config.predefinita(), "note_dir": str(tmp_path / "note"),
+              "dettatura_diario": str(tmp_path / "diario.txt"), "app_indice": str(tmp_path / "app.json")}
+    motore = kris_motore.MotoreKris(config)
+    assert motore.carica_modello()
+    return motore
+
+def test_uso_dopo_il_controllo_tiene_il_modello(motore):
+    # Il controllo ha letto un uso vecchio; intanto "Parla" ha risvegliato il modello
+    usato_prima_di = motore.ultimo_uso - 1
+    motore.risveglia()
+    assert motore.rilascia_modello(usato_prima_di) is False
+    assert motore.model is not None and not motore.scaricato
+    assert motore.rilascia_modello(motore.ultimo_uso) is True
+    assert motore.model is None and motore.scaricato
+
+def test_rilascio_non_aspetta_una_decodifica_in_corso(motore):
+    with motore._lock_modello:
+        assert motore.rilascia_modello() is False
+    assert motore.model is not None
+
+def test_decodifica_dopo_il_rilascio_ricarica_il_modello(motore):
+    creati = BackendFinto.creati
+    assert motore.rilascia_modello()
+    risultato = motore._decodifica_lotto([np.zeros(1600, dtype=np.float32)])
+    assert risultato[0]["text"] == "1600 campioni"
+    assert motore.model is not None and BackendFinto.creati > creati
+
+def test_decodifica_senza_modello_fallisce_pulita(motore, monkeypatch):
+    assert motore.rilascia_modello()
+
+    def _rotto(config):
+        raise OSError("pesi mancanti")
+    monkeypatch.setattr(kris_trascrizione, "crea_backend", _rotto)
+    with pytest.raises(RuntimeError, match="pesi mancanti"):
+        motore._decodifica_lotto([np.zeros(160, dtype=np.float32)])
+
+def test_rilascio_e_risveglio_concorrenti(motore):
+    # Risvegli e rilasci in gara: un rilascio con un limite già superato non scarica mai un modello risvegliato
+    limite = motore.ultimo_uso - 1
+    errori = []
+
+    def _risveglia():
+        for _ in range(200):
+            motore.risveglia()
+            motore.model_pronto.wait(1)
+
+    def _rilascia():
+        for _ in range(200):
+            if motore.rilascia_modello(limite):
+                errori.append("rilasciato un modello usato dopo il controllo")
+    thread = [threading.Thread(target=_risveglia), threading.Thread(target=_rilascia)]
+    for t in thread:
+        t.start()
+    for t in thread:
+        t.join()
+    assert errori == []
+    assert motore.model is not None
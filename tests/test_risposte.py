@@ -0,0 +1,101 @@
+"""Risposte offline: frasi dai pezzi in streaming, cache delle risposte, annullamento."""
+import threading
+
+import pytest
+
+import kris_risposte
+from kris_trascrizione import Annullato
+
+def test_frasi_da_pezzi():
+    pezzi = ["Roma è la cap", "itale. Milano", " no! Davvero?", " Sì", "\nFine"]
+    assert list(kris_risposte.frasi(pezzi)) == ["Roma è la capitale.", "Milano no!", "Davvero?", "Sì", "Fine"]
+
+def test_frasi_consegnate_appena_finite():
+    consegnate = []
+
+    def pezzi():
+        yield "Prima frase. Sec"
+        consegnate.append("dopo il primo pezzo")
+        yield "onda."
+    generatore = kris_risposte.frasi(pezzi())
+    assert next(generatore) == "Prima frase."
+    assert consegnate == []   # la prima frase esce prima che arrivi il resto
+    assert list(generatore) == ["Seconda."]
+
+def test_frase_lunga_senza_punteggiatura():
+    testo = " ".join(["parola"] * 100)
+    uscite = list(kris_risposte.frasi([testo]))
+    assert " ".join(uscite) == testo
+    assert all(len(f) <= kris_risposte.MAX_FRASE for f in uscite)
+
+def test_chiave_normalizzata():
+    assert kris_risposte.chiave("Chi è il Presidente?") == kris_risposte.chiave("chi e presidente")
+
+class Contatore(kris_risposte.RisposteFinte):
+    def __init__(self):
+        super().__init__()
+        self.domande = []
+
+    def genera(self, domanda, annulla=None):
+        self.domande.append(domanda)
+        yield from super().genera(domanda, annulla)
+
+@pytest.fixture
+def risponditore(tmp_path, monkeypatch):
+    backend = Contatore()
+    creati = []
+
+    def _crea(config, archivio):
+        creati.append(config["risposte_backend"])
+        return backend
+    monkeypatch.setattr(kris_risposte, "crea_backend", _crea)
+    cache = kris_risposte.CacheRisposte(str(tmp_path / "cache.json"))
+    r = kris_risposte.Risponditore({"risposte_backend": "finto"}, None, cache)
+    return r, backend, creati
+
+def test_cache_della_risposta(risponditore, tmp_path):
+    r, backend, _ = risponditore
+    dette = []
+    prima = r.rispondi("Chi ha scritto la Divina Commedia?", dette.append)
+    assert len(dette) == 3 and prima == " ".join(dette)
+    assert r.in_cache("chi ha scritto la divina commedia") == dette
+    assert r.rispondi("chi ha scritto divina commedia") == prima
+    assert len(backend.domande) == 1
+    # La cache è su disco: vale anche dopo un riavvio
+    ricaricata = kris_risposte.CacheRisposte(str(tmp_path / "cache.json"))
+    assert ricaricata.leggi(f"finto:{kris_risposte.chiave('Chi ha scritto la Divina Commedia?')}") == dette
+
+def test_in_cache_non_crea_il_backend(risponditore):
+    r, _, creati = risponditore
+    assert r.in_cache("domanda mai fatta") is None
+    assert creati == []
+    r.rispondi("domanda mai fatta")
+    assert creati == ["finto"]
+
+def test_in_cache_con_auto_senza_backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(kris_risposte, "crea_backend", lambda config, archivio: pytest.fail("backend creato"))
+    cache = kris_risposte.CacheRisposte(str(tmp_path / "cache.json"))
+    cache.aggiungi(f"ollama:{kris_risposte.chiave('capitale della Francia')}", ["Parigi."])
+    config = {"risposte_backend": "auto", "risposte_modello": "llama3"}
+    assert kris_risposte.Risponditore(config, None, cache).in_cache("capitale della francia?") == ["Parigi."]
+    config = {"risposte_backend": "auto", "risposte_modello": ""}   # solo note: mai in cache
+    assert kris_risposte.Risponditore(config, None, cache).in_cache("capitale della francia?") is None
+
+def test_cache_limitata(tmp_path):
+    cache = kris_risposte.CacheRisposte(str(tmp_path / "cache.json"), max_voci=2)
+    for k in ("a", "b", "c"):
+        cache.aggiungi(k, [k])
+    assert cache.leggi("a") is None and cache.leggi("c") == ["c"]
+
+def test_annullata_non_va_in_cache(risponditore):
+    r, _, _ = risponditore
+    annulla = threading.Event()
+    dette = []
+
+    def _al_frase(frase):
+        dette.append(frase)
+        annulla.set()   # barge-in dopo la prima frase
+    with pytest.raises(Annullato):
+        r.rispondi("domanda interrotta", _al_frase, annulla)
+    assert len(dette) == 1
+    assert r.in_cache("domanda interrotta") is None
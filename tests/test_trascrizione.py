@@ -0,0 +1,12 @@
+"""Quali clip del lotto decodificato insieme vanno ridecodificate da sole col fallback di transcribe."""
+import kris_trascrizione
+
+def test_soglie_di_default():
+    assert not kris_trascrizione.da_ridecodificare(1.8, -0.4, {})
+    assert kris_trascrizione.da_ridecodificare(2.6, -0.4, {})      # testo ripetitivo
+    assert kris_trascrizione.da_ridecodificare(1.8, -1.3, {})      # poco probabile
+
+def test_soglie_dalle_opzioni():
+    assert not kris_trascrizione.da_ridecodificare(2.6, -0.4, {"compression_ratio_threshold": 3.0})
+    assert not kris_trascrizione.da_ridecodificare(1.8, -1.3, {"logprob_threshold": None})
+    assert kris_trascrizione.da_ridecodificare(1.8, -0.6, {"logprob_threshold": -0.5})
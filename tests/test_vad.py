@@ -0,0 +1,92 @@
+"""VAD su WAV sintetici (rumore di fondo, un tono come parlato, silenzio) passati da leggi_wav/blocchi_da_wav,
+lo stesso percorso delle registrazioni di prova."""
+import wave
+
+import numpy as np
+import pytest
+
+import kris_vad
+
+SR = kris_vad.SAMPLERATE
+FRAME_S = kris_vad.FRAME_MS / 1000
+
+def _segnale(*tratti, sr=SR):
+    """tratti: (secondi, parlato?) -> float32; il rumore di fondo c'è sempre"""
+    rng = np.random.default_rng(0)
+    parti = []
+    for secondi, parlato in tratti:
+        n = int(secondi * sr)
+        parte = rng.normal(0, 0.002, n)
+        if parlato:
+            parte += 0.3 * np.sin(2 * np.pi * 220 * np.arange(n) / sr)
+        parti.append(parte)
+    return np.concatenate(parti).astype(np.float32)
+
+def _scrivi_wav(path, audio, sr=SR, canali=1):
+    pcm = (np.clip(audio, -1, 1) * 32767).astype("<i2")
+    if canali > 1:
+        pcm = np.repeat(pcm[:, None], canali, axis=1)
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(canali)
+        wf.setsampwidth(2)
+        wf.setframerate(sr)
+        wf.writeframes(pcm.tobytes())
+    return str(path)
+
+class Contatore:
+    """Blocchi consumati dal VAD: dice dove si è chiuso l'ascolto"""
+
+    def __init__(self, blocchi):
+        self.blocchi = blocchi
+        self.campioni = 0
+
+    def __iter__(self):
+        for blocco in self.blocchi:
+            self.campioni += len(blocco)
+            yield blocco
+
+@pytest.fixture
+def frase_wav(tmp_path):
+    # 0.6 s di fondo, 1 s di "parlato", 3 s di fondo
+    return _scrivi_wav(tmp_path / "frase.wav", _segnale((0.6, False), (1.0, True), (3.0, False)))
+
+def test_silenzio_finale_chiude_l_ascolto(frase_wav):
+    sorgente = Contatore(kris_vad.blocchi_da_wav(frase_wav))
+    kris_vad.ascolta(sorgente, **kris_vad.VAD_DEFAULT)
+    # Chiuso dopo vad_silenzio (0.7 s) dalla fine del parlato, non alla fine del file
+    assert sorgente.campioni / SR == pytest.approx(0.6 + 1.0 + 0.7, abs=2 * FRAME_S)
+
+def test_taglia_silenzio_iniziale_e_finale(frase_wav):
+    audio = kris_vad.ascolta(kris_vad.blocchi_da_wav(frase_wav), **kris_vad.VAD_DEFAULT)
+    margine = kris_vad.VAD_DEFAULT["vad_margine"]
+    assert len(audio) / SR == pytest.approx(1.0 + 2 * margine, abs=2 * FRAME_S)
+    # Il margine prima del parlato è fondo, il resto è il tono
+    n_margine = int((margine - FRAME_S) * SR)
+    assert kris_vad.rms(audio[:n_margine]) < 0.01
+    assert kris_vad.rms(audio[n_margine + int(2 * FRAME_S * SR):-n_margine - int(2 * FRAME_S * SR)]) > 0.1
+
+def test_durata_massima_rispettata(tmp_path):
+    path = _scrivi_wav(tmp_path / "lungo.wav", _segnale((0.3, False), (10.0, True)))
+    parametri = {**kris_vad.VAD_DEFAULT, "listen_timeout": 2}
+    sorgente = Contatore(kris_vad.blocchi_da_wav(path))
+    audio = kris_vad.ascolta(sorgente, **parametri)
+    assert sorgente.campioni / SR <= 2 + FRAME_S
+    assert 0 < len(audio) / SR <= 2
+
+def test_solo_silenzio_non_produce_audio(tmp_path):
+    path = _scrivi_wav(tmp_path / "vuoto.wav", _segnale((1.0, False)))
+    assert len(kris_vad.ascolta(kris_vad.blocchi_da_wav(path), **kris_vad.VAD_DEFAULT)) == 0
+
+def test_wav_stereo_48k_come_mono_16k(tmp_path):
+    mono = _scrivi_wav(tmp_path / "mono.wav", _segnale((0.6, False), (1.0, True), (2.0, False)))
+    stereo = _scrivi_wav(tmp_path / "stereo.wav", _segnale((0.6, False), (1.0, True), (2.0, False), sr=48000),
+                         sr=48000, canali=2)
+    assert len(kris_vad.leggi_wav(stereo)) == len(kris_vad.leggi_wav(mono))
+    a = kris_vad.ascolta(kris_vad.blocchi_da_wav(mono), **kris_vad.VAD_DEFAULT)
+    b = kris_vad.ascolta(kris_vad.blocchi_da_wav(stereo), **kris_vad.VAD_DEFAULT)
+    assert abs(len(a) - len(b)) <= kris_vad.EnergyVAD().frame_len
+
+def test_parametri_da_config():
+    parametri = kris_vad.parametri_da_config({"response_timing": {"listen_timeout": "8", "vad_silenzio": 1}})
+    assert parametri["listen_timeout"] == 8.0 and parametri["vad_silenzio"] == 1.0
+    assert parametri["vad_soglia"] == kris_vad.VAD_DEFAULT["vad_soglia"]
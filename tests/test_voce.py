@@ -0,0 +1,63 @@
+"""La richiesta vocale ("Dimmi Kris") deve finire prima che si apra il microfono, altrimenti il VAD
+la prende per parlato."""
+import threading
+import time
+
+import pytest
+
+import kris_metriche
+import kris_pipeline
+import kris_voce
+from kris_trascrizione import Annullato
+
+def _worker(secondi_per_carattere=0.01):
+    sink = kris_voce.SinkNullo(secondi_per_carattere)
+    return kris_voce.VoceWorker(sink).avvia(), sink
+
+def test_attendi_silenzio_dopo_la_frase():
+    worker, sink = _worker()
+    t0 = time.perf_counter()
+    worker.parla("Dimmi Kris", interrompi=True)
+    assert worker.attendi_silenzio(5)
+    assert sink.detti == ["Dimmi Kris"]
+    assert time.perf_counter() - t0 >= 0.09
+
+def test_attendi_silenzio_senza_voce():
+    worker, _ = _worker()
+    assert worker.attendi_silenzio(0.1)
+
+def test_attendi_silenzio_annullato_o_scaduto():
+    worker, _ = _worker(0.05)
+    worker.parla("Una frase lunga che dura parecchio.")
+    annulla = threading.Event()
+    annulla.set()
+    assert not worker.attendi_silenzio(5, annulla)
+    assert not worker.attendi_silenzio(0.1)
+    worker.interrompi()
+    assert worker.attendi_silenzio(5)
+
+def test_microfono_aperto_dopo_la_voce():
+    worker, sink = _worker()
+    aperto = []
+
+    def _blocchi():
+        aperto.append(list(sink.detti))
+        yield from ()
+
+    pipeline = kris_pipeline.PipelineKris(None, {}, kris_metriche.Metriche(), fabbrica_blocchi=_blocchi,
+                                          attendi_voce=lambda annulla: worker.attendi_silenzio(5, annulla))
+    richiesta = kris_pipeline.Richiesta(1)
+    worker.parla("Dimmi Kris", interrompi=True)
+    list(pipeline._microfono(richiesta))
+    assert aperto == [["Dimmi Kris"]]
+
+def test_microfono_non_aperto_se_annullato():
+    worker, _ = _worker(0.05)
+    pipeline = kris_pipeline.PipelineKris(None, {}, kris_metriche.Metriche(),
+                                          fabbrica_blocchi=lambda: pytest.fail("microfono aperto"),
+                                          attendi_voce=lambda annulla: worker.attendi_silenzio(5, annulla))
+    richiesta = kris_pipeline.Richiesta(1)
+    worker.parla("Una frase lunga che dura parecchio.")
+    threading.Timer(0.1, richiesta.annulla.set).start()
+    with pytest.raises(Annullato):
+        pipeline._microfono(richiesta)
@@ -0,0 +1,96 @@
+"""Parola di attivazione senza microfono: una "parola" sintetica (due glissandi) fa da modello, i blocchi
+arrivano come dal microfono e un Whisper finto conta quando viene chiamato."""
+import numpy as np
+
+import kris_vad
+import kris_wake
+
+SR = kris_wake.SAMPLERATE
+BLOCCO = 480
+
+def _glissando(secondi, f0, f1, ampiezza=0.3):
+    t = np.arange(int(secondi * SR)) / SR
+    frequenza = f0 + (f1 - f0) * t / secondi
+    return (ampiezza * np.sin(2 * np.pi * np.cumsum(frequenza) / SR)).astype(np.float32)
+
+def _parola(secondi=0.5):
+    return np.concatenate([_glissando(secondi / 2, 300, 1500), _glissando(secondi / 2, 1500, 600)])
+
+def _fondo(secondi, seme=0):
+    return np.random.default_rng(seme).normal(0, 0.002, int(secondi * SR)).astype(np.float32)
+
+def _rilevatore():
+    # Pronunce a velocità diverse, come i WAV registrati con --registra
+    return kris_wake.RilevatoreWake([kris_wake.mfcc(_parola(s)) for s in (0.45, 0.5, 0.55)])
+
+class MicrofonoFinto:
+    """Blocchi da 30 ms di `audio`; `consumati` dice fin dove è arrivato l'ascolto"""
+
+    def __init__(self, audio):
+        self.audio = audio
+        self.consumati = 0
+
+    def __iter__(self):
+        for i in range(0, len(self.audio), BLOCCO):
+            self.consumati = i + BLOCCO
+            yield self.audio[i:i + BLOCCO]
+
+class WhisperFinto:
+    def __init__(self, microfono):
+        self.microfono = microfono
+        self.chiamate = []   # (secondi di audio ricevuti, secondi di microfono già letti)
+
+    def trascrivi(self, audio):
+        self.chiamate.append((len(audio) / SR, self.microfono.consumati / SR))
+
+def _ascolta(audio, rilevatore=None):
+    """Lo stesso ciclo della GUI: ogni comando dopo la parola chiave va a Whisper"""
+    microfono = MicrofonoFinto(audio)
+    whisper = WhisperFinto(microfono)
+    attivazioni = []
+    for t, comando in kris_wake.ascolta_wake(microfono, rilevatore or _rilevatore(), **kris_vad.VAD_DEFAULT):
+        attivazioni.append(t)
+        whisper.trascrivi(comando)
+    return attivazioni, whisper.chiamate
+
+def test_whisper_solo_dopo_la_parola_chiave():
+    distrattori = [_fondo(1.5), _glissando(0.6, 2500, 3500), _fondo(1.0, 1), _glissando(0.5, 1500, 300),
+                   _fondo(1.0, 2)]
+    fine_parola = sum(len(d) for d in distrattori) / SR + 0.5
+    audio = np.concatenate(distrattori + [_parola(0.5), _fondo(0.2, 3), _glissando(1.0, 200, 250), _fondo(2.0, 4)])
+    attivazioni, chiamate = _ascolta(audio)
+    assert len(attivazioni) == 1
+    assert abs(attivazioni[0] - fine_parola) < 0.1
+    durata, letti = chiamate[0]
+    assert letti > fine_parola
+    # Whisper riceve solo il comando che segue la parola chiave, non i distrattori né la parola stessa
+    assert 1.0 <= durata <= 1.0 + 0.2 + 2 * kris_vad.VAD_DEFAULT["vad_margine"] + 0.05
+
+def test_suoni_diversi_non_arrivano_a_whisper():
+    audio = np.concatenate([_fondo(1.0), _glissando(0.6, 2500, 3500), _fondo(0.5, 1),
+                            _glissando(0.5, 1500, 300), _fondo(1.0, 2), _glissando(1.0, 200, 250), _fondo(1.0, 3)])
+    assert _ascolta(audio) == ([], [])
+
+def test_silenzio_non_calcola_il_dtw(monkeypatch):
+    calcoli = []
+    originale = kris_wake.costo_dtw
+    monkeypatch.setattr(kris_wake, "costo_dtw", lambda m, s: calcoli.append(1) or originale(m, s))
+    rilevatore = _rilevatore()   # la soglia calibrata usa il DTW: si conta da qui
+    calcoli.clear()
+    assert _ascolta(_fondo(5.0), rilevatore) == ([], [])
+    assert calcoli == []
+
+def test_due_comandi_di_seguito():
+    comando = np.concatenate([_fondo(0.2, 1), _glissando(0.8, 200, 250), _fondo(1.5, 2)])
+    audio = np.concatenate([_fondo(1.0), _parola(0.5), comando, _parola(0.52), comando])
+    attivazioni, chiamate = _ascolta(audio)
+    assert len(attivazioni) == len(chiamate) == 2
+    assert attivazioni[1] - attivazioni[0] > 2.0
+
+def test_buffer_circolare_rigira():
+    buffer = kris_wake.BufferCircolare(10)
+    buffer.scrivi(np.arange(7))
+    buffer.scrivi(np.arange(7, 14))
+    assert buffer.da(6).tolist() == list(range(6, 14))
+    assert buffer.da(0).tolist() == list(range(4, 14))   # oltre la capacità: solo gli ultimi 10
+    assert len(buffer.da(14)) == 0